@@ -3,7 +3,7 @@ API客户端模块
 封装所有HTTP请求到后端API
 """
 import requests
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, Iterator, List, Any
 from .config import config
 from .utils.token_manager import token_manager
 
@@ -100,6 +100,28 @@ class APIClient:
         except Exception as e:
             raise APIError(f"未知错误: {str(e)}", None)
     
+    def _iter_pages(self, endpoint: str, params: Optional[Dict] = None, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        逐条遍历游标分页列表接口（?limit=&after=），按需请求下一页
+        
+        Args:
+            endpoint: 列表接口路径
+            params: 其他查询参数
+            page_size: 每页条数（服务端有上限）
+        
+        Yields:
+            列表中的每一条记录
+        """
+        query = dict(params or {})
+        query["limit"] = page_size
+        while True:
+            response = self._make_request("GET", endpoint, data=query)
+            yield from response.get("data", [])
+            next_cursor = response.get("next_cursor")
+            if not next_cursor:
+                return
+            query["after"] = next_cursor
+    
     # ==================== 用户相关API ====================
     
     def register(
@@ -217,6 +239,18 @@ class APIClient:
     
     # ==================== 作业相关API ====================
     
+    def iter_assignments(self, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        按截止时间倒序逐条遍历当前用户的作业（分页请求）
+        
+        Args:
+            page_size: 每页条数
+        
+        Yields:
+            作业（不含描述，描述见 get_assignment_detail）
+        """
+        return self._iter_pages("/api/assignment/", page_size=page_size)
+    
     def get_assignments(self) -> List[Dict[str, Any]]:
         """
         获取当前用户的所有作业
@@ -224,8 +258,7 @@ class APIClient:
         Returns:
             作业列表
         """
-        response = self._make_request("GET", "/api/assignment/")
-        return response.get("data", [])
+        return list(self.iter_assignments())
     
     def get_assignment_detail(self, assignment_id: int) -> Dict[str, Any]:
         """
@@ -282,6 +315,43 @@ class APIClient:
             data["cas_password"] = cas_password
         return self._make_request("POST", "/api/assignment/sync/all", data=data)
     
+    def quick_sync(self, school_username: str = None, school_password: str = None, cas_password: str = None) -> Dict[str, Any]:
+        """
+        快速同步（只刷新待办作业的提交状态、截止时间和最新公告，一两次请求）
+        
+        Args:
+            school_username: 学校账号（学号），如果为None则使用已绑定账户
+            school_password: 学校密码，如果为None则使用已绑定账户
+            cas_password: CAS密码（用于验证已绑定账户）
+        
+        Returns:
+            同步结果（包含作业和公告的统计信息）
+        """
+        data = {}
+        if school_username:
+            data["school_username"] = school_username
+        if school_password:
+            data["school_password"] = school_password
+        if cas_password:
+            data["cas_password"] = cas_password
+        return self._make_request("POST", "/api/sync/quick", data=data)
+    
+    def iter_course_assignments(self, course_name: str, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        按截止时间倒序逐条遍历某个课程的作业（分页请求）
+        
+        Args:
+            course_name: 课程名称
+            page_size: 每页条数
+        
+        Yields:
+            作业（不含描述，描述见 get_assignment_detail）
+        """
+        # URL编码课程名称
+        from urllib.parse import quote
+        encoded_course_name = quote(course_name, safe='')
+        return self._iter_pages(f"/api/assignment/course/{encoded_course_name}", page_size=page_size)
+    
     def get_course_assignments(self, course_name: str) -> List[Dict[str, Any]]:
         """
         获取某个课程的所有作业
@@ -292,11 +362,7 @@ class APIClient:
         Returns:
             作业列表
         """
-        # URL编码课程名称
-        from urllib.parse import quote
-        encoded_course_name = quote(course_name, safe='')
-        response = self._make_request("GET", f"/api/assignment/course/{encoded_course_name}")
-        return response.get("data", [])
+        return list(self.iter_course_assignments(course_name))
     
     def submit_assignment(self, assignment_id: int, file_path: str) -> Dict[str, Any]:
         """
@@ -387,6 +453,19 @@ class APIClient:
     
     # ==================== 讨论相关API ====================
     
+    def iter_course_discussions(self, course_id: int, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        按发帖时间倒序逐条遍历课程讨论（分页请求）
+        
+        Args:
+            course_id: 课程ID
+            page_size: 每页条数
+        
+        Yields:
+            讨论主题
+        """
+        return self._iter_pages("/api/discussion/list", params={"course_id": course_id}, page_size=page_size)
+    
     def get_course_discussions(self, course_id: int) -> List[Dict[str, Any]]:
         """
         获取课程讨论列表
@@ -397,8 +476,7 @@ class APIClient:
         Returns:
             讨论列表
         """
-        response = self._make_request("GET", "/api/discussion/list", data={"course_id": course_id})
-        return response.get("data", [])
+        return list(self.iter_course_discussions(course_id))
     
     def get_discussion_detail(self, topic_id: int) -> Dict[str, Any]:
         """
@@ -436,6 +514,18 @@ class APIClient:
     
     # ==================== 公告相关API ====================
     
+    def iter_notifications(self, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        按发布时间倒序逐条遍历公告（分页请求），只需要最近几条时不必取完全部
+        
+        Args:
+            page_size: 每页条数
+        
+        Yields:
+            公告
+        """
+        return self._iter_pages("/api/notification/", page_size=page_size)
+    
     def get_notifications(self) -> List[Dict[str, Any]]:
         """
         获取公告列表
@@ -443,8 +533,7 @@ class APIClient:
         Returns:
             公告列表
         """
-        response = self._make_request("GET", "/api/notification/")
-        return response.get("data", [])
+        return list(self.iter_notifications())
     
     def sync_notifications(self, school_username: str = None, school_password: str = None, cas_password: str = None) -> Dict[str, Any]:
         """
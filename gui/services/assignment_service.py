@@ -97,6 +97,25 @@ class AssignmentService(QObject):
         stats = response.get("stats", {})
         return (msg, stats)
 
+    def quick_sync(
+        self, school_username: str = None, school_password: str = None, cas_password: str = None
+    ) -> tuple[str, dict]:
+        """
+        快速同步（待办作业 + 最新公告）
+
+        Args:
+            school_username: 学校账号（学号），如果为None则使用已绑定账户
+            school_password: 学校密码，如果为None则使用已绑定账户
+            cas_password: CAS密码（用于验证已绑定账户）
+
+        Returns:
+            (消息, 统计信息字典)
+        """
+        response = api_client.quick_sync(school_username, school_password, cas_password)
+        msg = response.get("msg", "同步完成")
+        stats = response.get("stats", {})
+        return (msg, stats)
+
     def submit_assignment(self, assignment_id: int, file_path: str) -> None:
         """
         提交作业
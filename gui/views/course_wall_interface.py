@@ -44,6 +44,7 @@ class CourseWallInterface(QWidget):
         self.auth_service = AuthService()
         self._courses: list[Course] = []
         self._course_cards: dict[str, CourseCard] = {}  # 存储课程卡片，key为课程名称
+        self._full_sync = False  # False：快速同步（待办作业 + 最新公告）；True：完整同步（课程 + 作业）
         self._setup_ui()
         self._connect_signals()
         self._load_courses()
@@ -60,11 +61,16 @@ class CourseWallInterface(QWidget):
         title_layout.addWidget(self.title_label)
         title_layout.addStretch(1)
         
-        # 同步按钮
+        # 同步按钮（默认快速同步，只刷新提交状态、截止时间和最新公告）
         self.sync_button = PrimaryPushButton("同步", self)
-        self.sync_button.clicked.connect(self._on_sync_click)
+        self.sync_button.clicked.connect(lambda: self._on_sync_click(full=False))
         title_layout.addWidget(self.sync_button)
         
+        # 完整同步按钮（重新抓取课程、作业详情，耗时较长）
+        self.full_sync_button = PushButton("完整同步", self)
+        self.full_sync_button.clicked.connect(lambda: self._on_sync_click(full=True))
+        title_layout.addWidget(self.full_sync_button)
+        
         # 刷新按钮
         self.refresh_button = PushButton("刷新", self)
         self.refresh_button.clicked.connect(self._load_courses)
@@ -161,8 +167,9 @@ class CourseWallInterface(QWidget):
             self.flow_layout.addWidget(card)
             self._course_cards[course.name] = card
 
-    def _on_sync_click(self) -> None:
-        """同步按钮点击"""
+    def _on_sync_click(self, full: bool = False) -> None:
+        """同步按钮点击（full=True 时完整同步）"""
+        self._full_sync = full
         # 获取当前用户信息
         user = self.auth_service.get_current_user()
         if not user or not user.cas_is_bound:
@@ -218,15 +225,10 @@ class CourseWallInterface(QWidget):
     def _sync_with_bound_account(self, cas_password: str) -> None:
         """使用已绑定账户同步"""
         # 显示加载提示
-        InfoBar.info("提示", "正在同步所有内容，请稍候...", duration=3000, parent=self)
+        InfoBar.info("提示", self._sync_hint(), duration=3000, parent=self)
         
         def sync_func():
-            try:
-                return self.assignment_service.sync_all(
-                    cas_password=cas_password
-                )
-            except Exception as e:
-                raise
+            return self._run_sync(cas_password)
 
         def on_success(result: tuple[str, dict]):
             msg, stats = result
@@ -245,15 +247,10 @@ class CourseWallInterface(QWidget):
             return
         
         # 显示加载提示
-        InfoBar.info("提示", "正在同步所有内容，请稍候...", duration=3000, parent=self)
+        InfoBar.info("提示", self._sync_hint(), duration=3000, parent=self)
         
         def sync_func():
-            try:
-                return self.assignment_service.sync_all(
-                    cas_password=password
-                )
-            except Exception as e:
-                raise
+            return self._run_sync(password)
 
         def on_success(result: tuple[str, dict]):
             msg, stats = result
@@ -263,6 +260,18 @@ class CourseWallInterface(QWidget):
             sync_func, on_success, self._on_sync_failed
         )
 
+    def _sync_hint(self) -> str:
+        """同步开始时的提示文字"""
+        if self._full_sync:
+            return "正在同步所有内容，请稍候..."
+        return "正在刷新待办作业和最新公告..."
+
+    def _run_sync(self, cas_password: str) -> tuple[str, dict]:
+        """执行同步（在后台线程中调用）：默认快速同步，完整同步按钮触发时同步课程和作业"""
+        if self._full_sync:
+            return self.assignment_service.sync_all(cas_password=cas_password)
+        return self.assignment_service.quick_sync(cas_password=cas_password)
+
     def _on_sync_success(self, msg: str, stats: dict) -> None:
         """同步成功"""
         # 构建详细的消息
@@ -280,6 +289,10 @@ class CourseWallInterface(QWidget):
             new_assignments = assignment_stats.get("new_added", 0)
             total_assignments = assignment_stats.get("total_fetched", 0)
             
+            # 公告统计（快速同步）
+            notification_stats = stats.get("notifications", {})
+            new_notifications = notification_stats.get("new_added", 0)
+            
             detail_parts = []
             if total_courses > 0:
                 detail_parts.append(f"课程{total_courses}门")
@@ -293,6 +306,8 @@ class CourseWallInterface(QWidget):
                 detail_parts.append(f"作业{total_assignments}个")
             if new_assignments > 0:
                 detail_parts.append(f"新增作业{new_assignments}个")
+            if new_notifications > 0:
+                detail_parts.append(f"新公告{new_notifications}条")
             
             if detail_parts:
                 detail_msg = f"{msg}（{', '.join(detail_parts)}）"
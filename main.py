@@ -7,7 +7,8 @@ from werkzeug.exceptions import HTTPException
 
 from src.edu_cloud.common.config import settings
 from src.edu_cloud.common.database import engine, Base, SessionLocal
-from src.edu_cloud.common.token_manager import is_token_revoked
+from src.edu_cloud.common.token_manager import revocation_cache
+from src.edu_cloud.common.request_db import RequestDB, request_db_stats
 from src.edu_cloud.user.api import user_bp
 # 导入模型以确保表被创建
 from src.edu_cloud.user.models import *  # 这会导入User和TokenBlacklist模型
@@ -15,10 +16,14 @@ from src.edu_cloud.notification.models import *
 from src.edu_cloud.discussion.models import *
 from src.edu_cloud.course.models import *
 from src.edu_cloud.assignment.models import *
+from src.edu_cloud.common.models import *
+from src.edu_cloud.sync.models import *
 
 from src.edu_cloud.course.api import course_bp
 from src.edu_cloud.discussion.api import discussion_bp
 from src.edu_cloud.notification.api import notification_bp
+from src.edu_cloud.sync.api import sync_bp
+from src.edu_cloud.sync.worker import start_embedded_workers
 
 
 # 配置日志
@@ -41,25 +46,24 @@ def create_app():
     # 初始化JWT
     jwt = JWTManager(app)
     
+    # 请求级数据库会话：认证和视图共用，请求结束时自动关闭
+    RequestDB(app)
+    
     # Token黑名单检查回调
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """
         检查token是否已被撤销
-        这个回调函数会在每次验证token时被调用
+        这个回调函数会在每次验证token时被调用，只查询进程内撤销缓存（定期从数据库刷新）
         """
         jti = jwt_payload.get("jti")
         if not jti:
             return True  # 如果没有JTI，认为token无效
         
-        db = SessionLocal()
-        try:
-            return is_token_revoked(db, jti)
-        except Exception as e:
-            logger.error(f"Error checking token revocation: {str(e)}")
-            return True  # 发生错误时，为了安全起见，认为token已被撤销
-        finally:
-            db.close()
+        return revocation_cache.is_revoked(
+            jti, jwt_payload.get("sub"), jwt_payload.get("token_generation", 0),
+            user_id=jwt_payload.get("uid"), issued_at=jwt_payload.get("iat")
+        )
     
     # 配置CORS - 支持环境变量配置
     cors_origins = settings.cors_origins.split(",") if "," in settings.cors_origins else [settings.cors_origins]
@@ -69,7 +73,7 @@ def create_app():
                  "origins": cors_origins,  # 从配置读取，生产环境应限制具体域名
                  "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
                  "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-                 "expose_headers": ["X-Total-Count"],
+                 "expose_headers": ["X-Total-Count", "X-DB-Connections", "X-DB-Statements"],
                  "supports_credentials": settings.cors_supports_credentials
              }
          })
@@ -88,6 +92,12 @@ def create_app():
     app.register_blueprint(course_bp, url_prefix='/api/course')
     app.register_blueprint(discussion_bp, url_prefix='/api/discussion')
     app.register_blueprint(notification_bp, url_prefix='/api/notification')
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
+    
+    # 后台同步 worker：SYNC_WORKER_EMBEDDED=true 时在 Web 进程内启动；
+    # 未设置时只在 python main.py 单进程运行时启动（见文件末尾），gunicorn 等多进程部署用 scripts/run_sync_worker.py
+    if not app.config.get("TESTING"):
+        start_embedded_workers()
     
     # 根路径
     @app.route('/')
@@ -196,13 +206,18 @@ def create_app():
     
     @app.after_request
     def log_response_info(response):
-        logger.info(f"Response: {response.status_code} {request.method} {request.path}")
+        stats = request_db_stats()
+        logger.info(f"Response: {response.status_code} {request.method} {request.path} "
+                    f"(db connections={stats.get('connections', 0)}, statements={stats.get('statements', 0)})")
         return response
     
     return app
 
 if __name__ == '__main__':
     app = create_app()
+    # 单进程运行，默认在本进程内执行同步任务；debug 模式下只在 reloader 的子进程中启动，避免同一主机两份 worker
+    if not settings.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_embedded_workers(single_process=True)
     app.run(
         host=settings.host,
         port=settings.port,
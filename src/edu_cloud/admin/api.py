@@ -9,8 +9,13 @@ from sqlalchemy.exc import SQLAlchemyError
 from typing import Dict, Any, List
 import logging
 
-from ..common.database import SessionLocal, engine
+from ..common.database import engine
+from ..common.request_db import get_request_db
 from ..common.auth import admin_required
+from ..common.write_queue import write_queue
+from ..common.rate_limit import upstream_limiter
+from ..common.cas_auth import cas_admission
+from ..common.token_manager import add_user_tombstone, revocation_cache
 from ..user import models as user_models
 from ..course import models as course_models
 from ..assignment import models as assignment_models
@@ -48,7 +53,10 @@ def get_database_tables(current_user):
         'cas_password_encrypted',
         'password',
         'password_hash',
-        'password_encrypted'
+        'password_encrypted',
+        'access_token',  # UCloud 会话缓存
+        'cookies',
+        'credential_hash'
     }
     
     try:
@@ -95,8 +103,7 @@ def get_database_stats(current_user):
     需要管理员权限
     """
     try:
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             stats = {}
             
             # 用户统计
@@ -208,8 +215,6 @@ def get_database_stats(current_user):
             
             return jsonify(success_response(stats))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Error getting database stats: {str(e)}")
@@ -235,7 +240,10 @@ def get_table_data(current_user, table_name: str):
         'cas_password_encrypted',
         'password',  # 通用密码字段
         'password_hash',
-        'password_encrypted'
+        'password_encrypted',
+        'access_token',  # UCloud 会话缓存
+        'cookies',
+        'credential_hash'
     }
     
     try:
@@ -250,8 +258,7 @@ def get_table_data(current_user, table_name: str):
         limit = min(int(request.args.get('limit', 100)), 1000)  # 最大1000条
         offset = int(request.args.get('offset', 0))
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 获取表的所有列名
             columns_info = inspector.get_columns(table_name)
             all_columns = [col['name'] for col in columns_info]
@@ -308,8 +315,6 @@ def get_table_data(current_user, table_name: str):
             
             return jsonify(success_response(response_data))
             
-        finally:
-            db.close()
             
     except SQLAlchemyError as e:
         logger.error(f"Database error getting table data: {str(e)}")
@@ -338,8 +343,7 @@ def get_all_users(current_user):
         role_filter = request.args.get('role')
         is_active_filter = request.args.get('is_active')
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             query = db.query(user_models.User)
             
             # 应用筛选条件
@@ -378,8 +382,6 @@ def get_all_users(current_user):
                 "has_more": offset + len(users_data) < total
             }))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Error getting all users: {str(e)}")
@@ -403,8 +405,7 @@ def get_token_blacklist(current_user):
         offset = int(request.args.get('offset', 0))
         username_filter = request.args.get('username')
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             query = db.query(user_models.TokenBlacklist)
             
             # 应用筛选条件
@@ -436,8 +437,6 @@ def get_token_blacklist(current_user):
                 "has_more": offset + len(tokens_data) < total
             }))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Error getting token blacklist: {str(e)}")
@@ -457,7 +456,7 @@ def delete_user(current_user, user_id: int):
     """
     logger.info(f"删除用户请求: 管理员={current_user.username}, 目标用户ID={user_id}")
     try:
-        db = SessionLocal()
+        db = get_request_db()
         try:
             # 检查不能删除自己
             if current_user.id == user_id:
@@ -518,10 +517,13 @@ def delete_user(current_user, user_id: int):
                 user_models.TokenBlacklist.username == user.username
             ).delete()
             
-            # 6. 最后删除用户本身
+            # 6. 最后删除用户本身，同一事务写入墓碑记录撤销其已签发的 token
+            #    （所有 worker 的撤销缓存都会加载；不带 uid 声明的旧 token 由身份查询拒绝）
             username = user.username
+            tombstone = add_user_tombstone(db, user_id, username)
             db.delete(user)
             db.commit()
+            revocation_cache.add_tombstone(user_id, tombstone.revoked_at, tombstone.expires_at)
             
             logger.info(f"管理员 {current_user.username} 删除了用户 {username} (ID: {user_id})")
             
@@ -539,14 +541,36 @@ def delete_user(current_user, user_id: int):
             db.rollback()
             logger.error(f"删除用户时数据库错误: {str(e)}")
             return error_response(f"删除用户失败: {str(e)}", 500)
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"删除用户错误: {str(e)}")
         return error_response(f"删除用户失败: {str(e)}", 500)
 
 
+@admin_bp.route("/write-queue/stats", methods=["GET"])
+@admin_required
+def get_write_queue_stats(current_user):
+    """
+    获取同步写入队列统计（写锁持有时间、排队时间、队列深度）
+    需要管理员权限
+    """
+    return jsonify(success_response(write_queue.stats()))
+
+
+@admin_bp.route("/upstream/stats", methods=["GET"])
+@admin_required
+def get_upstream_stats(current_user):
+    """
+    获取 UCloud 请求限流统计（各主机请求数、重试、429 次数、当前速率、在途请求数）
+    以及 CAS 登录准入统计（排队数、排队时间、拒绝次数、打开的熔断器数）
+    需要管理员权限
+    """
+    return jsonify(success_response({
+        **upstream_limiter.stats(),
+        "cas": cas_admission.stats()
+    }))
+
+
 @admin_bp.route("/health", methods=["GET"])
 @admin_required
 def admin_health_check(current_user):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Optional
@@ -9,10 +9,19 @@ from ..common.database import Base
 # ==========================================
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        # 同一用户下按上游作业 ID 唯一（旧数据 upstream_id 为空，不受约束）
+        Index("ux_assignments_owner_upstream", "owner_id", "upstream_id", unique=True),
+        # 作业列表：按用户（及课程）过滤、按截止时间排序
+        Index("ix_assignments_owner_deadline", "owner_id", "deadline"),
+        Index("ix_assignments_owner_course_deadline", "owner_id", "course_name", "deadline"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     # 归属权
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # 学校侧的作业 ID (id / assignmentId / workId)，作为作业的稳定标识
+    upstream_id = Column(String, nullable=True)
     
     # 业务字段
     course_name = Column(String, index=True)
@@ -41,8 +50,11 @@ class ScrapedAssignmentData:
     deadline: Optional[datetime]
     is_submitted: bool
     score: str
+    upstream_id: Optional[str] = None  # 学校侧的作业 ID
     
-    # 唯一标识符生成逻辑 (用于去重)
+    # 唯一标识符生成逻辑 (用于去重)：优先使用上游 ID，没有时退回 课程名_标题
     @property
     def unique_key(self) -> str:
+        if self.upstream_id:
+            return self.upstream_id
         return f"{self.course_name}_{self.title}"
\ No newline at end of file
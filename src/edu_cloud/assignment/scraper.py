@@ -1,12 +1,14 @@
 import time
 from datetime import datetime
-from typing import List, Dict
-from buptmw import BUPT_Auth
+from typing import List, Dict, Optional
+from ..common.ucloud_session import UCloudSession, session_cache
+from ..common.fetcher import fetch_ordered, paginate, parse_page
 from .models import ScrapedAssignmentData
 
 # ================= 配置区 =================
 # 修正后的 API 前缀
 API_BASE = "https://apiucloud.bupt.edu.cn/ykt-site"
+PAGE_SIZE = 50  # 列表接口每页条数（超过一页时自动翻页）
 # ==========================================
 
 class AssignmentScraper:
@@ -14,28 +16,23 @@ class AssignmentScraper:
     作业抓取器
     职责：CAS登录验证 + 爬取原始数据 + 转换为 ScrapedAssignmentData
     """
-    def __init__(self, username, password):
+    def __init__(self, username=None, password=None, ucloud: Optional[UCloudSession] = None):
         self.username = username
         self.password = password
+        # 可传入已登录的共享会话，避免每个爬虫各自登录 CAS
+        self.ucloud = ucloud
         self.session = None
         self.user_id = None
+        # 最近一次待办抓取中因课程名无效被跳过的条数（>0 时待办列表不完整，不能据此推断已提交）
+        self.undone_skipped = 0
 
     def _login(self):
-        """初始化 buptmw 并获取 UCloud Session"""
+        """获取 UCloud Session（优先复用共享会话）"""
         try:
-            # 1. 初始化认证
-            auth = BUPT_Auth(cas={"username": self.username, "password": self.password})
-            # 2. 获取 Session (buptmw 自动处理 OAuth 换 Token)
-            self.session = auth.get_UCloud()
-            
-            # 3. 提取身份标识 (UserId)
-            self.user_id = self.session.cookies.get("iClass-uuid") or \
-                           self.session.cookies.get("userId") or \
-                           getattr(self.session, "user_id", None)
-            
-            if not self.user_id:
-                raise ValueError("登录成功但未能提取 UserID")
-                
+            if self.ucloud is None:
+                self.ucloud = session_cache.acquire(self.username, self.password)
+            self.session = self.ucloud
+            self.user_id = self.ucloud.user_id
         except Exception as e:
             # 向上层抛出异常，不在此处打印
             raise RuntimeError(f"学校认证服务连接失败: {str(e)}")
@@ -73,16 +70,15 @@ class AssignmentScraper:
     def _fetch_courses(self) -> List[Dict]:
         """获取本学期课程列表"""
         url = f"{API_BASE}/site/list/student/current"
-        params = {"userId": self.user_id, "current": 1, "size": 50, "siteRoleCode": 2}
         
-        resp = self.session.get(url, params=params, headers=self._get_headers())
-        resp.raise_for_status()
+        def fetch_page(current, size):
+            params = {"userId": self.user_id, "current": current, "size": size, "siteRoleCode": 2}
+            resp = self.session.get(url, params=params, headers=self._get_headers())
+            resp.raise_for_status()
+            return parse_page(resp.json())
         
         courses = []
-        data = resp.json().get("data", [])
-        if isinstance(data, dict): data = data.get("records", [])
-        
-        for c in data:
+        for c in paginate(fetch_page, PAGE_SIZE):
             course_name = c.get("name") or c.get("siteName") or ""
             course_id = c.get("id") or c.get("siteId")
             
@@ -99,32 +95,37 @@ class AssignmentScraper:
         return courses
 
     def _fetch_undone(self) -> List[ScrapedAssignmentData]:
-        """抓取待办事项中的作业"""
+        """
+        抓取待办事项中的作业（一次请求）
+        请求失败时抛出异常：快速同步会根据待办列表推断提交状态，不能把失败当成"没有待办"
+        """
         url = f"{API_BASE}/site/student/undone"
         results = []
         
-        try:
-            resp = self.session.get(url, params={"userId": self.user_id}, headers=self._get_headers())
-            if resp.status_code == 200:
-                records = resp.json().get("data", {}).get("undoneList", [])
-                for item in records:
-                    # 处理课程名称：如果siteName为空、None或包含"未分类"等无效值，则跳过
-                    site_name = item.get("siteName") or ""
-                    if not site_name or "未分类" in site_name or "待办事项" in site_name:
-                        # 尝试从其他字段获取课程信息，如果都没有则跳过这条记录
-                        # 因为未分类的作业无法关联到具体课程，不应该存储
-                        continue
-                    
-                    results.append(ScrapedAssignmentData(
-                        course_name=site_name,
-                        title=item.get("activityName") or "无标题",
-                        description="",
-                        deadline=self._parse_time(item.get("endTime")),
-                        is_submitted=False,
-                        score=""
-                    ))
-        except:
-            pass # 待办抓取失败不影响主流程
+        resp = self.session.get(url, params={"userId": self.user_id}, headers=self._get_headers())
+        if resp.status_code != 200:
+            raise RuntimeError(f"获取待办事项失败: HTTP {resp.status_code}")
+        records = (resp.json().get("data") or {}).get("undoneList") or []
+        self.undone_skipped = 0
+        for item in records:
+            # 处理课程名称：如果siteName为空、None或包含"未分类"等无效值，则跳过
+            site_name = item.get("siteName") or ""
+            if not site_name or "未分类" in site_name or "待办事项" in site_name:
+                # 尝试从其他字段获取课程信息，如果都没有则跳过这条记录
+                # 因为未分类的作业无法关联到具体课程，不应该存储
+                self.undone_skipped += 1
+                continue
+            
+            # 待办接口的 ID 与作业列表接口不一定一致，不作为 upstream_id，
+            # 入库时按 (课程名, 标题) 匹配，完整同步时再回填 upstream_id
+            results.append(ScrapedAssignmentData(
+                course_name=site_name,
+                title=item.get("activityName") or "无标题",
+                description="",
+                deadline=self._parse_time(item.get("endTime")),
+                is_submitted=False,
+                score=""
+            ))
         return results
 
     def _fetch_assignment_detail(self, assignment_id: str) -> str:
@@ -149,75 +150,101 @@ class AssignmentScraper:
             print(f"获取作业详情失败 (ID: {assignment_id}): {str(e)}")
         return ""
 
-    def _fetch_course_details(self, site_id, course_name) -> List[ScrapedAssignmentData]:
-        """抓取特定课程的所有作业（包含详情描述）"""
+    def _fetch_course_records(self, site_id, course_name) -> List[Dict]:
+        """抓取特定课程的作业列表（原始记录，不含详情请求）"""
+        # 确保课程名称有效（二次检查，防止传入无效值）
+        if not course_name or "未分类" in course_name or "待办事项" in course_name:
+            return []
+        
         url = f"{API_BASE}/work/student/list"
-        payload = {"siteId": site_id, "userId": self.user_id, "current": 1, "size": 50}
-        results = []
         
-        try:
+        def fetch_page(current, size):
+            # 失败时抛出异常：返回空页会让这门课的作业列表被静默截断
+            payload = {"siteId": site_id, "userId": self.user_id, "current": current, "size": size}
             resp = self.session.post(url, json=payload, headers=self._get_headers())
-            if resp.status_code == 200:
-                records = resp.json().get("data", {}).get("records", [])
-                for item in records:
-                    # 判断是否提交
-                    submit_time = item.get("submitTime")
-                    is_submitted = bool(submit_time and str(submit_time).strip())
-                    
-                    # 确保课程名称有效（二次检查，防止传入无效值）
-                    if not course_name or "未分类" in course_name or "待办事项" in course_name:
-                        continue
-                    
-                    # 获取作业ID（用于获取详情）
-                    assignment_id = item.get("id") or item.get("assignmentId") or item.get("workId")
-                    
-                    # 先从列表接口获取description（尝试多个可能的字段名）
-                    description = (
-                        item.get("description") or 
-                        item.get("content") or 
-                        item.get("detail") or 
-                        item.get("assignmentDescription") or
-                        item.get("workDescription") or
-                        ""
-                    )
-                    
-                    # 如果列表接口没有description，且作业ID存在，则调用详情接口
-                    if not description and assignment_id:
-                        print(f"  [调试] 列表接口无description，尝试获取详情 (作业ID: {assignment_id}, 标题: {item.get('assignmentTitle') or item.get('title')})")
-                        description = self._fetch_assignment_detail(str(assignment_id))
-                        if description:
-                            print(f"  [调试] 成功获取详情，长度: {len(description)}")
-                    
-                    results.append(ScrapedAssignmentData(
-                        course_name=course_name,
-                        title=item.get("assignmentTitle") or item.get("title"),
-                        description=description,
-                        deadline=self._parse_time(item.get("assignmentEndTime")),
-                        is_submitted=is_submitted,
-                        score=str(item.get("score") or "")
-                    ))
-        except Exception as e:
-            print(f"抓取课程作业失败 (课程: {course_name}): {str(e)}")
-        return results
+            if resp.status_code != 200:
+                raise RuntimeError(f"抓取课程作业失败 (课程: {course_name}, 第{current}页): HTTP {resp.status_code}")
+            return parse_page(resp.json())
+        
+        return list(paginate(fetch_page, PAGE_SIZE))
+
+    def _assignment_id(self, item: Dict):
+        """获取作业ID（不同接口字段名不同）"""
+        return item.get("id") or item.get("assignmentId") or item.get("workId")
+
+    def _list_description(self, item: Dict) -> str:
+        """从列表接口记录中获取description（尝试多个可能的字段名）"""
+        return (
+            item.get("description") or 
+            item.get("content") or 
+            item.get("detail") or 
+            item.get("assignmentDescription") or
+            item.get("workDescription") or
+            ""
+        )
+
+    def _build_assignment(self, item: Dict, course_name: str, description: str) -> ScrapedAssignmentData:
+        """把原始记录转换为 ScrapedAssignmentData"""
+        # 判断是否提交
+        submit_time = item.get("submitTime")
+        is_submitted = bool(submit_time and str(submit_time).strip())
+        upstream_id = self._assignment_id(item)
+        
+        return ScrapedAssignmentData(
+            course_name=course_name,
+            title=item.get("assignmentTitle") or item.get("title"),
+            description=description,
+            deadline=self._parse_time(item.get("assignmentEndTime")),
+            is_submitted=is_submitted,
+            score=str(item.get("score") or ""),
+            upstream_id=str(upstream_id) if upstream_id else None
+        )
+
+    def run_undone(self) -> List[ScrapedAssignmentData]:
+        """
+        [对外接口] 快速抓取：只请求待办事项接口，用于刷新提交状态和新截止时间
+        """
+        self._login()
+        return self._fetch_undone()
 
     def run(self) -> List[ScrapedAssignmentData]:
         """
         [对外接口] 执行完整抓取流程
+        课程列表和作业详情均并发抓取（并发上限 settings.scraper_max_workers），输出顺序与串行抓取一致
         """
         self._login() # 1. 登录
         
         all_data = {} # 使用字典去重: key=unique_key, value=ScrapedAssignmentData
         
-        # # 2. 先抓待办 (速度快)
-        # for item in self._fetch_undone():
-        #     all_data[item.unique_key] = item
-            
-        # 3. 再抓课程详情 (数据全)
+        # 2. 抓课程详情 (数据全；只刷新待办见 run_undone)
         courses = self._fetch_courses()
-        for course in courses:
-            details = self._fetch_course_details(course["id"], course["name"])
-            for item in details:
-                # 课程详情的数据更准确，直接覆盖待办的数据
-                all_data[item.unique_key] = item
+        
+        # 3.1 并发抓取每门课的作业列表
+        records_per_course = fetch_ordered(
+            lambda course: self._fetch_course_records(course["id"], course["name"]),
+            courses
+        )
+        
+        # 3.2 列表接口没有 description 的作业，统一并发调用详情接口
+        #     （两阶段而不是嵌套线程池，保证全局并发上限）
+        pending_details = []  # (课程序号, 记录序号, 作业ID)
+        for c_idx, records in enumerate(records_per_course):
+            for r_idx, item in enumerate(records):
+                # 获取作业ID（用于获取详情）
+                assignment_id = self._assignment_id(item)
+                if not self._list_description(item) and assignment_id:
+                    pending_details.append((c_idx, r_idx, str(assignment_id)))
+        
+        if pending_details:
+            print(f"  [调试] {len(pending_details)} 个作业列表接口无description，并发获取详情")
+        details = fetch_ordered(self._fetch_assignment_detail, [d[2] for d in pending_details])
+        detail_map = {(c_idx, r_idx): desc for (c_idx, r_idx, _), desc in zip(pending_details, details)}
+        
+        # 3.3 按课程顺序组装结果
+        for c_idx, (course, records) in enumerate(zip(courses, records_per_course)):
+            for r_idx, item in enumerate(records):
+                description = self._list_description(item) or detail_map.get((c_idx, r_idx), "")
+                data = self._build_assignment(item, course["name"], description)
+                all_data[data.unique_key] = data
                 
         return list(all_data.values())
\ No newline at end of file
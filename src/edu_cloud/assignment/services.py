@@ -1,25 +1,36 @@
 # src/edu_cloud/assignment/services.py
 import logging
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, defer
+from ..common.bulk import bulk_insert, bulk_upsert
+from ..common.pagination import Page, keyset_page
+from ..common.ucloud_session import UCloudSession
+from ..common.write_queue import write_queue
 from . import models
 from .scraper import AssignmentScraper
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 已有作业同步时会被覆盖的字段
+UPDATE_COLUMNS = ["course_name", "title", "description", "deadline", "is_submitted", "score"]
+
 class AssignmentService:
     """
     业务逻辑层：负责协调 爬虫 和 数据库
     """
     
     @staticmethod
-    def sync_assignments(db: Session, user_id: int, cas_user: str, cas_pass: str):
+    def sync_assignments(db: Session, user_id: int, cas_user: str, cas_pass: str,
+                         ucloud: Optional[UCloudSession] = None):
         """
         核心同步逻辑
+        ucloud: 可选的共享 UCloud 会话，传入时不再单独登录 CAS
         """
         # 1. 调用 Scraper 抓数据
         print(f"--- [Service] 开始为用户(ID:{user_id}) 同步作业 ---")
-        scraper = AssignmentScraper(cas_user, cas_pass)
+        scraper = AssignmentScraper(cas_user, cas_pass, ucloud=ucloud)
         data_list = scraper.run()
         
         # 2. 【详细日志】在这里打印抓取到的所有内容
@@ -31,45 +42,205 @@ class AssignmentService:
             print(f"{item.course_name[:12]:<15} | {status:<8} | {item.score:<5} | {item.title}")
         print("-" * 60 + "\n")
 
-        # 3. 存入数据库 (逻辑从 api.py 移过来)
-        new_count = 0
-        update_count = 0
-        
-        for item in data_list:
-            # 查重
-            exists = db.query(models.Assignment).filter(
-                models.Assignment.owner_id == user_id,
-                models.Assignment.course_name == item.course_name,
-                models.Assignment.title == item.title
-            ).first()
-            
-            if exists:
-                # 更新
-                if (exists.is_submitted != item.is_submitted or 
-                    exists.score != item.score or 
-                    exists.description != item.description): # 描述变了也更新
-                    
-                    exists.is_submitted = item.is_submitted
-                    exists.score = item.score
-                    exists.deadline = item.deadline
-                    exists.description = item.description
-                    update_count += 1
-            else:
-                # 新增
-                new_assign = models.Assignment(
+        # 3. 存入数据库 (逻辑从 api.py 移过来)：交给写线程用短事务执行
+        new_count, update_count = write_queue.run(
+            lambda wdb: AssignmentService.save_assignments(wdb, user_id, data_list),
+            label="assignments"
+        )
+        return new_count, update_count, len(data_list)
+
+    @staticmethod
+    def quick_sync(db: Session, user_id: int, cas_user: str, cas_pass: str,
+                   ucloud: Optional[UCloudSession] = None):
+        """
+        快速同步：只请求待办事项接口（一次请求），刷新提交状态和截止时间
+        描述、分数等完整数据仍由 sync_assignments 抓取
+        """
+        print(f"--- [Service] 开始为用户(ID:{user_id}) 快速同步作业（待办） ---")
+        scraper = AssignmentScraper(cas_user, cas_pass, ucloud=ucloud)
+        undone = scraper.run_undone()
+        print(f"  待办作业 {len(undone)} 条（跳过 {scraper.undone_skipped} 条）")
+        complete = scraper.undone_skipped == 0
+
+        new_count, update_count = write_queue.run(
+            lambda wdb: AssignmentService.save_undone(wdb, user_id, undone, datetime.now(), complete=complete),
+            label="assignments_quick"
+        )
+        return new_count, update_count, len(undone)
+
+    @staticmethod
+    def save_undone(db: Session, user_id: int, undone: List[models.ScrapedAssignmentData],
+                    now: datetime, complete: bool = True) -> Tuple[int, int]:
+        """
+        把待办列表写入数据库，返回 (新增数, 更新数)
+
+        - 待办中的作业按 (课程名, 标题) 匹配：更新截止时间，标记为未提交
+        - 待办中的新作业直接插入（不带 upstream_id，完整同步时按 (课程名, 标题) 回填）
+        - 本地未提交、未截止、但已不在待办中的作业视为已提交，只在以下条件都满足时推断：
+          待办列表完整（complete，抓取时没有跳过记录）、该课程在待办中出现过、
+          本地没有同名作业（同名作业无法确定哪一条还在待办中）；
+          其他情况保持原状态，由完整同步修正
+        now: 与截止时间比较用的本地时间（截止时间按本地时间保存）
+        """
+        rows = {}     # 作业ID -> 行
+        by_key = {}   # (课程名, 标题) -> 行列表
+        for row in db.query(
+            models.Assignment.id,
+            models.Assignment.course_name,
+            models.Assignment.title,
+            models.Assignment.deadline,
+            models.Assignment.is_submitted,
+        ).filter(models.Assignment.owner_id == user_id):
+            row = row._asdict()
+            rows[row["id"]] = row
+            by_key.setdefault((row["course_name"], row["title"]), []).append(row)
+
+        pending_ids = set()
+        updates = {}
+        inserts = {}
+        for item in undone:
+            candidates = [r for r in by_key.get((item.course_name, item.title), []) if r["id"] not in pending_ids]
+            # 同名作业优先匹配截止时间相同的那一条
+            exists = next((r for r in candidates if r["deadline"] == item.deadline), None) \
+                or (candidates[0] if candidates else None)
+            if exists is None:
+                if (item.course_name, item.title) in by_key:
+                    continue  # 同名作业都已匹配过，无法判断是否新作业，留给完整同步
+                inserts[(item.course_name, item.title)] = dict(
                     owner_id=user_id,
+                    upstream_id=None,
                     course_name=item.course_name,
                     title=item.title,
-                    description=item.description, # 详情存这里
+                    description=item.description,
                     deadline=item.deadline,
-                    is_submitted=item.is_submitted,
-                    score=item.score
+                    is_submitted=False,
+                    score=item.score,
+                    created_at=datetime.now(timezone.utc)
                 )
-                db.add(new_assign)
-                new_count += 1
-                
+                continue
+            pending_ids.add(exists["id"])
+            deadline = item.deadline or exists["deadline"]
+            if exists["is_submitted"] or exists["deadline"] != deadline:
+                updates[exists["id"]] = dict(id=exists["id"], deadline=deadline, is_submitted=False)
+
+        undone_courses = {item.course_name for item in undone}
+        for key, same_title in by_key.items():
+            if not complete or key[0] not in undone_courses or len(same_title) > 1:
+                continue
+            row = same_title[0]
+            if (not row["is_submitted"] and row["id"] not in pending_ids
+                    and row["deadline"] is not None and row["deadline"] > now):
+                updates[row["id"]] = dict(id=row["id"], is_submitted=True)
+
+        bulk_insert(db, models.Assignment, list(inserts.values()))
+        if updates:
+            db.bulk_update_mappings(models.Assignment, list(updates.values()))
         db.commit()
-        return new_count, update_count, len(data_list)
+        return len(inserts), len(updates)
+
+    @staticmethod
+    def save_assignments(db: Session, user_id: int, data_list: List[models.ScrapedAssignmentData]) -> Tuple[int, int]:
+        """
+        把抓取结果写入数据库，返回 (新增数, 更新数)
+
+        一次查询取出该用户全部作业，优先按上游作业 ID 匹配；
+        还没有 upstream_id 的旧数据按 (课程名, 标题) 匹配一次并回填 upstream_id。
+        新作业按 (owner_id, upstream_id) ON CONFLICT 插入，已有作业按主键 ON CONFLICT DO UPDATE 批量写回
+        """
+        by_upstream = {}  # upstream_id -> 行
+        legacy = {}       # (课程名, 标题) -> 尚未回填 upstream_id 的旧行
+        for row in db.query(
+            models.Assignment.id,
+            models.Assignment.upstream_id,
+            models.Assignment.course_name,
+            models.Assignment.title,
+            models.Assignment.description,
+            models.Assignment.is_submitted,
+            models.Assignment.score,
+        ).filter(models.Assignment.owner_id == user_id):
+            row = row._asdict()
+            if row["upstream_id"]:
+                by_upstream[row["upstream_id"]] = row
+            else:
+                legacy.setdefault((row["course_name"], row["title"]), row)
+        
+        inserts = {}  # unique_key -> 行数据
+        updates = {}  # 作业ID -> 行数据
+        update_count = 0
+        
+        for item in data_list:
+            row = dict(
+                upstream_id=item.upstream_id,
+                course_name=item.course_name,
+                title=item.title,
+                description=item.description, # 详情存这里
+                deadline=item.deadline,
+                is_submitted=item.is_submitted,
+                score=item.score
+            )
+            
+            key = item.unique_key
+            if key in inserts:
+                # 本次抓取中重复出现的新作业：以后出现的为准
+                inserts[key].update(row)
+                continue
+            
+            exists = by_upstream.get(item.upstream_id) if item.upstream_id else None
+            if exists is None:
+                exists = legacy.pop((item.course_name, item.title), None)
+                if exists is not None and item.upstream_id:
+                    # 旧数据回填上游 ID，之后按 ID 匹配
+                    by_upstream[item.upstream_id] = exists
+                    updates[exists["id"]] = dict(row, id=exists["id"], owner_id=user_id)
+                elif exists is not None:
+                    # 没有上游 ID 的旧数据，下次仍按 (课程名, 标题) 匹配
+                    legacy[(item.course_name, item.title)] = exists
+            if exists is None:
+                # 新增
+                inserts[key] = dict(row, owner_id=user_id, created_at=datetime.now(timezone.utc))
+                continue
+            
+            # 更新（只比较状态、分数和描述来统计更新数；改名的作业同时更新课程名和标题）
+            changed = (exists["is_submitted"] != item.is_submitted or 
+                       exists["score"] != item.score or 
+                       exists["description"] != item.description) # 描述变了也更新
+            renamed = (exists["course_name"], exists["title"]) != (item.course_name, item.title)
+            if changed or renamed:
+                updates[exists["id"]] = dict(row, id=exists["id"], owner_id=user_id)
+            if changed:
+                update_count += 1
+            exists.update(row)
+        
+        with_upstream = [r for r in inserts.values() if r["upstream_id"]]
+        without_upstream = [r for r in inserts.values() if not r["upstream_id"]]
+        # 以 (owner_id, upstream_id) 唯一索引为冲突目标：并发同步同一用户时不会插入重复作业
+        bulk_upsert(
+            db, models.Assignment, with_upstream,
+            index_elements=["owner_id", "upstream_id"],
+            update_columns=UPDATE_COLUMNS,
+        )
+        bulk_insert(db, models.Assignment, without_upstream)
+        bulk_upsert(
+            db, models.Assignment, list(updates.values()),
+            index_elements=["id"],
+            update_columns=UPDATE_COLUMNS + ["upstream_id"],
+        )
+        db.commit()
+        return len(inserts), update_count
+
+    @staticmethod
+    def list_assignments(db: Session, user_id: int, limit: int, after: Optional[str] = None,
+                         course_name: Optional[str] = None) -> Page:
+        """
+        作业列表（按截止时间倒序游标分页），不读取大段描述 description
+        course_name: 只列出该课程的作业
+        """
+        query = db.query(models.Assignment)\
+            .options(defer(models.Assignment.description))\
+            .filter(models.Assignment.owner_id == user_id)
+        if course_name is not None:
+            query = query.filter(models.Assignment.course_name == course_name)
+        return keyset_page(query, models.Assignment.deadline, models.Assignment.id, limit, after)
 
     @staticmethod
     def get_assignment_detail(db: Session, assignment_id: int, user_id: int):
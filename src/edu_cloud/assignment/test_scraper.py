@@ -0,0 +1,124 @@
+"""
+AssignmentScraper 并发抓取测试（使用假会话，不访问网络）
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.edu_cloud.common.ucloud_session import UCloudSession
+from src.edu_cloud.assignment.scraper import AssignmentScraper
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self._data = data
+
+    def json(self):
+        return {"data": self._data}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeUCloud:
+    """按 URL 返回预设数据，并记录最大并发数"""
+
+    def __init__(self, courses, works):
+        self.courses = courses
+        self.works = works
+        self.user_id = "u1"
+        self.access_token = "t"
+        self.detail_calls = []
+        self._active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _track(self):
+        with self._lock:
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        time.sleep(0.01)
+        with self._lock:
+            self._active -= 1
+
+    def get(self, url, **kwargs):
+        self._track()
+        return FakeResponse({"records": self.courses})
+
+    def post(self, url, json=None, **kwargs):
+        self._track()
+        if url.endswith("/work/student/list"):
+            return FakeResponse({"records": self.works[json["siteId"]]})
+        self.detail_calls.append(json["id"])
+        return FakeResponse({"description": f"detail-{json['id']}"})
+
+
+def make_scraper(fake):
+    ucloud = UCloudSession(MagicMock(), "u1", "2023000000")
+    scraper = AssignmentScraper(ucloud=ucloud)
+    scraper._login = lambda: None
+    scraper.session = fake
+    scraper.user_id = fake.user_id
+    return scraper
+
+
+def test_run_is_concurrent_ordered_and_deduplicated():
+    courses = [{"id": f"s{i}", "name": f"课程{i}"} for i in range(6)]
+    works = {
+        f"s{i}": [
+            {"id": f"w{i}-{j}", "title": f"作业{j}", "description": "" if j % 2 else "列表描述"}
+            for j in range(4)
+        ]
+        for i in range(6)
+    }
+    # 同一课程下同名但 ID 不同的作业各自保留；同一 ID 重复出现时后出现的覆盖先出现的
+    works["s0"].append({"id": "w0-dup", "title": "作业0", "description": "同名作业"})
+    works["s0"].append({"id": "w0-0", "title": "作业0", "description": "新的描述"})
+    fake = FakeUCloud(courses, works)
+
+    results = make_scraper(fake).run()
+
+    expected = [(f"课程{i}", f"作业{j}") for i in range(6) for j in range(4)]
+    expected.insert(4, ("课程0", "作业0"))
+    assert [(r.course_name, r.title) for r in results] == expected
+    assert [r.upstream_id for r in results[:5]] == ["w0-0", "w0-1", "w0-2", "w0-3", "w0-dup"]
+    assert results[0].description == "新的描述"
+    assert results[1].description == "detail-w0-1"
+    assert sorted(fake.detail_calls) == sorted(f"w{i}-{j}" for i in range(6) for j in (1, 3))
+    assert fake.max_active > 1
+
+
+def test_undone_counts_skipped_records():
+    fake = MagicMock(user_id="u1")
+    fake.get.return_value = FakeResponse({"undoneList": [
+        {"siteName": "高等数学", "activityName": "作业1", "endTime": "2024-05-10 23:59:00"},
+        {"siteName": "", "activityName": "作业2"},
+        {"siteName": "未分类", "activityName": "作业3"},
+    ]})
+    scraper = make_scraper(fake)
+
+    undone = scraper.run_undone()
+
+    assert [a.title for a in undone] == ["作业1"]
+    assert scraper.undone_skipped == 2
+
+
+def test_failed_course_page_is_not_silently_dropped():
+    courses = [{"id": "s0", "name": "课程0"}, {"id": "s1", "name": "课程1"}]
+    fake = FakeUCloud(courses, {"s0": [{"id": "w0", "title": "作业0", "description": "x"}]})
+    post = fake.post
+
+    def failing_post(url, json=None, **kwargs):
+        if url.endswith("/work/student/list") and json["siteId"] == "s1":
+            response = FakeResponse(None)
+            response.status_code = 500
+            return response
+        return post(url, json=json, **kwargs)
+
+    fake.post = failing_post
+
+    with pytest.raises(RuntimeError, match="课程1"):
+        make_scraper(fake).run()
@@ -0,0 +1,209 @@
+"""
+AssignmentService 批量写库测试（内存数据库）
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.user.models import User
+from src.edu_cloud.assignment import models
+from src.edu_cloud.assignment.services import AssignmentService
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        User(id=1, username="a", email="a@example.com", hashed_password="x"),
+        User(id=2, username="b", email="b@example.com", hashed_password="x"),
+    ])
+    db.commit()
+    return db
+
+
+def item(title, submitted=False, score="", course="课程", deadline=None, upstream_id=None):
+    return models.ScrapedAssignmentData(
+        course_name=course, title=title, description=f"{title}描述",
+        deadline=deadline, is_submitted=submitted, score=score, upstream_id=upstream_id,
+    )
+
+
+def test_save_assignments_inserts_then_updates_changed_rows():
+    db = make_db()
+    # 其他用户的同名作业不应被当作已存在
+    assert AssignmentService.save_assignments(db, 2, [item("作业1")]) == (1, 0)
+
+    assert AssignmentService.save_assignments(db, 1, [item("作业1"), item("作业2")]) == (2, 0)
+
+    deadline = datetime(2024, 6, 1, 23, 59)
+    result = AssignmentService.save_assignments(db, 1, [
+        item("作业1", submitted=True, score="95", deadline=deadline),
+        item("作业2"),
+        item("作业3"),
+    ])
+    assert result == (1, 1)
+
+    db.expire_all()
+    rows = {a.title: a for a in db.query(models.Assignment).filter(models.Assignment.owner_id == 1)}
+    assert set(rows) == {"作业1", "作业2", "作业3"}
+    assert rows["作业1"].is_submitted is True
+    assert rows["作业1"].score == "95"
+    assert rows["作业1"].deadline == deadline
+    assert db.query(models.Assignment).filter(models.Assignment.owner_id == 2).one().is_submitted is False
+
+
+def test_upstream_id_backfills_legacy_rows_and_follows_renames():
+    db = make_db()
+    # 旧数据：没有 upstream_id
+    assert AssignmentService.save_assignments(db, 1, [item("作业1"), item("作业2")]) == (2, 0)
+
+    # 首次带 ID 同步：按 (课程名, 标题) 回填，不产生重复
+    assert AssignmentService.save_assignments(db, 1, [
+        item("作业1", upstream_id="w1"), item("作业2", upstream_id="w2"),
+    ]) == (0, 0)
+    db.expire_all()
+    assert {a.title: a.upstream_id for a in db.query(models.Assignment)} == {"作业1": "w1", "作业2": "w2"}
+
+    # 改名后按 ID 匹配；同名不同 ID 的作业各自保存
+    assert AssignmentService.save_assignments(db, 1, [
+        item("作业1（修订）", upstream_id="w1"), item("作业2", upstream_id="w2"), item("作业2", upstream_id="w3"),
+    ]) == (1, 1)
+    db.expire_all()
+    rows = sorted((a.upstream_id, a.title) for a in db.query(models.Assignment))
+    assert rows == [("w1", "作业1（修订）"), ("w2", "作业2"), ("w3", "作业2")]
+
+
+def test_save_undone_refreshes_status_and_deadlines():
+    db = make_db()
+    now = datetime(2024, 5, 1, 12, 0)
+    AssignmentService.save_assignments(db, 1, [
+        item("作业1", deadline=datetime(2024, 5, 10), upstream_id="w1"),
+        item("作业2", deadline=datetime(2024, 5, 10), upstream_id="w2"),
+        item("作业3", submitted=True, deadline=datetime(2024, 5, 10), upstream_id="w3"),
+        item("已截止", deadline=datetime(2024, 4, 1), upstream_id="w4"),
+    ])
+
+    undone = [
+        item("作业1", deadline=datetime(2024, 5, 12)),   # 延期
+        item("作业3", deadline=datetime(2024, 5, 10)),   # 被打回重交
+        item("新作业", deadline=datetime(2024, 5, 20)),
+    ]
+    # 作业1 截止时间、作业3 状态、作业2 不在待办中视为已提交；已截止的作业不变
+    assert AssignmentService.save_undone(db, 1, undone, now) == (1, 3)
+
+    rows = {a.title: a for a in db.query(models.Assignment).filter(models.Assignment.owner_id == 1)}
+    assert rows["作业1"].deadline == datetime(2024, 5, 12)
+    assert rows["作业2"].is_submitted is True
+    assert rows["作业3"].is_submitted is False
+    assert rows["已截止"].is_submitted is False
+    assert rows["新作业"].upstream_id is None
+
+    # 完整同步按 (课程名, 标题) 回填待办插入的作业，不产生重复
+    AssignmentService.save_assignments(db, 1, [item("新作业", deadline=datetime(2024, 5, 20), upstream_id="w5")])
+    assert db.query(models.Assignment).filter(models.Assignment.title == "新作业").one().upstream_id == "w5"
+
+
+def test_save_undone_keeps_status_when_undone_list_is_incomplete():
+    db = make_db()
+    now = datetime(2024, 5, 1, 12, 0)
+    AssignmentService.save_assignments(db, 1, [
+        item("作业1", deadline=datetime(2024, 5, 10), upstream_id="w1"),
+        item("其他课作业", course="其他", deadline=datetime(2024, 5, 10), upstream_id="w2"),
+    ])
+    undone = [item("作业1", deadline=datetime(2024, 5, 10))]
+
+    # 抓取时跳过了记录（例如 siteName 为空 / 未分类）：不推断任何作业已提交
+    assert AssignmentService.save_undone(db, 1, [], now, complete=False) == (0, 0)
+    # 待办中没有出现的课程（可能是课程名对不上）：不推断
+    assert AssignmentService.save_undone(db, 1, undone, now) == (0, 0)
+
+    rows = {a.title: a for a in db.query(models.Assignment)}
+    assert rows["作业1"].is_submitted is False
+    assert rows["其他课作业"].is_submitted is False
+
+
+def test_save_undone_does_not_flip_duplicate_titles():
+    db = make_db()
+    now = datetime(2024, 5, 1, 12, 0)
+    AssignmentService.save_assignments(db, 1, [
+        item("实验报告", deadline=datetime(2024, 5, 10), upstream_id="w1"),
+        item("实验报告", deadline=datetime(2024, 5, 20), upstream_id="w2"),
+        item("作业2", deadline=datetime(2024, 5, 10), upstream_id="w3"),
+    ])
+
+    # 待办里只有一条"实验报告"：匹配截止时间相同的那一条，另一条同名作业保持未提交
+    undone = [item("实验报告", deadline=datetime(2024, 5, 20))]
+    assert AssignmentService.save_undone(db, 1, undone, now) == (0, 1)
+
+    rows = {a.upstream_id: a for a in db.query(models.Assignment)}
+    assert rows["w1"].is_submitted is False
+    assert rows["w2"].is_submitted is False
+    assert rows["w3"].is_submitted is True
+
+
+def test_list_assignments_pages_through_ties_and_missing_deadlines():
+    db = make_db()
+    same = datetime(2024, 6, 1, 23, 59)
+    AssignmentService.save_assignments(db, 1, [
+        item("作业1", deadline=datetime(2024, 7, 1)),
+        item("作业2", deadline=same),
+        item("作业3", deadline=same),
+        item("作业4", deadline=same),
+        item("作业5"),
+        item("作业6"),
+        item("其他课程作业", course="其他", deadline=same),
+    ])
+
+    titles, after, totals = [], None, set()
+    while True:
+        page = AssignmentService.list_assignments(db, 1, limit=2, after=after)
+        titles += [a.title for a in page.items]
+        totals.add(page.total)
+        after = page.next_cursor
+        if after is None:
+            break
+
+    # 截止时间倒序、同一时间按 id 倒序，没有截止时间的排最后；每条恰好出现一次
+    assert titles == ["作业1", "其他课程作业", "作业4", "作业3", "作业2", "作业6", "作业5"]
+    assert totals == {7}
+
+    page = AssignmentService.list_assignments(db, 1, limit=10, course_name="其他")
+    assert [a.title for a in page.items] == ["其他课程作业"]
+    assert page.total == 1 and page.next_cursor is None
+
+
+def test_list_assignments_does_not_rely_on_null_ordering():
+    db = make_db()
+    AssignmentService.save_assignments(db, 1, [
+        item("作业1", deadline=datetime(2024, 7, 1)),
+        item("作业2"),
+        item("作业3", deadline=datetime(2024, 6, 1)),
+    ])
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    titles, after = [], None
+    while True:
+        page = AssignmentService.list_assignments(db, 1, limit=1, after=after)
+        titles += [a.title for a in page.items]
+        after = page.next_cursor
+        if after is None:
+            break
+
+    assert titles == ["作业1", "作业3", "作业2"]
+    # 按截止时间排序的查询都排除了空值，空截止时间只在单独的查询里按 id 取，
+    # 所以结果与数据库把 NULL 排在前面还是后面无关（PostgreSQL 的 DESC 默认 NULLS FIRST）
+    ordered = [sql for sql in statements if "ORDER BY assignments.deadline" in sql]
+    assert ordered and all("assignments.deadline IS NOT NULL" in sql for sql in ordered)
+    assert all("assignments.deadline IS NULL" in sql for sql in statements
+               if "ORDER BY" in sql and sql not in ordered)
+
+
+def test_list_assignments_rejects_bad_cursor():
+    db = make_db()
+    with pytest.raises(ValueError):
+        AssignmentService.list_assignments(db, 1, limit=10, after="not-a-cursor")
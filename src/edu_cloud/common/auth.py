@@ -1,16 +1,21 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
-from flask import jsonify
+from typing import Callable, Dict, Optional, Tuple
+from flask import jsonify, g
 from functools import wraps
 from flask_jwt_extended import (
     JWTManager, create_access_token, get_jwt_identity, jwt_required, get_jwt
 )
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from werkzeug.exceptions import HTTPException
 import logging
+import threading
+import time
 
 from .config import settings
 from .database import get_db, SessionLocal
+from .request_db import get_request_db
 from ..user.models import User
 
 logger = logging.getLogger(__name__)
@@ -22,18 +27,173 @@ class FlaskAuthError(HTTPException):
         self.code = code
         self.description = description
 
-def create_user_access_token(username: str, expires_delta: Optional[timedelta] = None):
-    """创建JWT访问令牌（保持与FastAPI版本兼容）"""
+def create_user_access_token(username: str, expires_delta: Optional[timedelta] = None,
+                             token_generation: Optional[int] = None, user: Optional[User] = None):
+    """
+    创建JWT访问令牌（保持与FastAPI版本兼容）
+    - token_generation 写入同名声明，用户的 token_generation 增加后该 token 失效（不传时取 user 的值）
+    - 传入 user 时写入 uid / role / active 声明，请求中按 uid 读取身份缓存，不再按用户名查询 users 表
+    """
     if expires_delta:
         expires = timedelta(seconds=int(expires_delta.total_seconds()))
     else:
         expires = timedelta(minutes=30)  # 默认30分钟
     
+    claims = {}
+    if user is not None:
+        claims.update(uid=user.id, role=user.role, active=bool(user.is_active))
+        if token_generation is None:
+            token_generation = user.token_generation
+    claims["token_generation"] = token_generation or 0
+    
     return create_access_token(
         identity=username,
-        expires_delta=expires
+        expires_delta=expires,
+        additional_claims=claims
     )
 
+
+@dataclass(frozen=True)
+class Identity:
+    """
+    用户身份快照（身份缓存中保存，不含密码等字段）
+    字段名与 User 一致，只读取这些字段的接口可以直接替代 ORM 对象使用
+    """
+    id: int
+    username: str
+    role: str
+    is_active: bool
+    cas_username: Optional[str]
+    cas_is_bound: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Identity":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role or "user",
+            is_active=bool(user.is_active),
+            cas_username=user.cas_username,
+            cas_is_bound=bool(user.cas_is_bound),
+        )
+
+    def is_admin(self) -> bool:
+        """检查用户是否为管理员"""
+        return self.role == 'admin'
+
+
+class IdentityCache:
+    """
+    进程内用户身份缓存（user_id -> Identity），有效期 ttl_seconds
+    - 本进程内通过 ORM 提交的用户修改 / 删除在提交后立即使缓存失效（见下方 ORM 事件）
+    - 其他 worker / 节点的修改（例如停用、改角色）最多 ttl_seconds 后生效
+    """
+
+    def __init__(self, ttl_seconds: float = settings.identity_cache_ttl_seconds,
+                 session_factory: Optional[Callable[[], Session]] = None):
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory
+        self._entries: Dict[int, Tuple[Identity, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _session(self) -> Session:
+        return (self.session_factory or SessionLocal)()
+
+    def _load(self, db: Optional[Session], query: Callable[[Session], Optional[User]]) -> Optional[Identity]:
+        """用传入的会话（请求级会话，由调用方关闭）或自建会话查询用户并写入缓存"""
+        if db is not None:
+            return self._store(query(db))
+        db = self._session()
+        try:
+            return self._store(query(db))
+        finally:
+            db.close()
+
+    def _store(self, user: Optional[User]) -> Optional[Identity]:
+        if user is None:
+            return None
+        identity = Identity.from_user(user)
+        with self._lock:
+            self._entries[identity.id] = (identity, time.monotonic())
+        return identity
+
+    def get(self, user_id: int, db: Optional[Session] = None) -> Optional[Identity]:
+        """按用户 ID 读取身份，缓存过期或不存在时查询数据库；用户不存在返回 None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return self._load(db, lambda session: session.get(User, user_id))
+
+    def get_by_username(self, username: str, db: Optional[Session] = None) -> Optional[Identity]:
+        """按用户名读取身份（不带 uid 声明的旧 token），总是查询数据库"""
+        self.misses += 1
+        return self._load(db, lambda session: session.query(User).filter(User.username == username).first())
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 全局身份缓存实例
+identity_cache = IdentityCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_identity_dirty(mapper, connection, target):
+    """记录本次事务修改 / 删除的用户，提交后使身份缓存失效"""
+    session = object_session(target)
+    if session is not None and target.id is not None:
+        session.info.setdefault("identity_dirty", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_identities(session):
+    for user_id in session.info.pop("identity_dirty", ()):
+        identity_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_identity_dirty(session):
+    session.info.pop("identity_dirty", None)
+
+
+def current_identity() -> Optional[Identity]:
+    """
+    当前请求的用户身份（需在 jwt_required 之后调用，请求内只解析一次）
+    按 JWT 中的 uid 声明读取身份缓存；旧 token 没有 uid 时按用户名查询
+    用户不存在（已删除）时返回 None；缓存未命中时用请求级会话查询，不另开连接
+    """
+    if "current_identity" in g:
+        return g.current_identity
+    
+    username = get_jwt_identity()
+    uid = get_jwt().get("uid")
+    if uid is not None:
+        identity = identity_cache.get(uid, get_request_db())
+        # 用户被删除后同名重建时，旧 token 的 uid 对应不上
+        if identity is not None and identity.username != username:
+            identity = None
+    elif username:
+        identity = identity_cache.get_by_username(username, get_request_db())
+    else:
+        identity = None
+    
+    g.current_identity = identity
+    return identity
+
 def get_current_user_identity():
     """获取当前用户身份（从JWT token中）"""
     try:
@@ -44,41 +204,29 @@ def get_current_user_identity():
         return None
 
 def get_current_user_from_db(db: Session) -> Optional[User]:
-    """从数据库获取当前用户"""
-    username = get_current_user_identity()
-    if not username:
+    """从数据库获取当前用户 ORM 对象（需要修改用户或读取完整字段时才调用，只读接口用 current_identity）"""
+    identity = current_identity()
+    if identity is None:
         return None
-    
-    user = db.query(User).filter(User.username == username).first()
-    return user
+    return db.get(User, identity.id)
 
 def get_current_active_user(db_func=None):
     """Flask装饰器版本的获取当前活跃用户"""
     def decorator(f):
         def wrapped_function(*args, **kwargs):
-            # 获取数据库会话
-            if db_func:
-                db = db_func()
-            else:
-                from .database import SessionLocal
-                db = SessionLocal()
-                close_db = True
+            # 获取数据库会话（默认用请求级会话，请求结束时自动关闭）
+            db = db_func() if db_func else get_request_db()
             
-            try:
-                current_user = get_current_user_from_db(db)
-                if not current_user:
-                    return jsonify({"error": "Could not validate credentials"}), 401
-                
-                if not current_user.is_active:
-                    return jsonify({"error": "Inactive user"}), 400
-                
-                # 将用户添加到kwargs中
-                kwargs['current_user'] = current_user
-                return f(*args, **kwargs)
+            current_user = get_current_user_from_db(db)
+            if not current_user:
+                return jsonify({"error": "Could not validate credentials"}), 401
             
-            finally:
-                if close_db:
-                    db.close()
+            if not current_user.is_active:
+                return jsonify({"error": "Inactive user"}), 400
+            
+            # 将用户添加到kwargs中
+            kwargs['current_user'] = current_user
+            return f(*args, **kwargs)
         
         return wrapped_function
     return decorator
@@ -119,26 +267,23 @@ def admin_required(f):
         if not current_username:
             return jsonify({"error": "Could not validate credentials"}), 401
         
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter(User.username == current_username).first()
-            if not user:
-                logger.warning(f"Admin required: User '{current_username}' not found in database")
-                return jsonify({"error": "User not found", "message": f"User '{current_username}' not found"}), 404
-            
-            if not user.is_active:
-                return jsonify({"error": "Inactive user"}), 400
-            
-            if not user.is_admin():
-                return jsonify({
-                    "error": "Forbidden",
-                    "message": "Admin access required"
-                }), 403
-            
-            # 将用户添加到kwargs中
-            kwargs['current_user'] = user
-            return f(*args, **kwargs)
-        finally:
-            db.close()
+        # 身份缓存命中时不查询数据库
+        user = current_identity()
+        if not user:
+            logger.warning(f"Admin required: User '{current_username}' not found in database")
+            return jsonify({"error": "User not found", "message": f"User '{current_username}' not found"}), 404
+        
+        if not user.is_active:
+            return jsonify({"error": "Inactive user"}), 400
+        
+        if not user.is_admin():
+            return jsonify({
+                "error": "Forbidden",
+                "message": "Admin access required"
+            }), 403
+        
+        # 将用户身份添加到kwargs中（id / username / role 等字段与 User 一致）
+        kwargs['current_user'] = user
+        return f(*args, **kwargs)
     
     return decorated_function
@@ -0,0 +1,96 @@
+"""
+批量写入工具
+同步服务把抓取结果与库中数据在内存中对比后，用少量批量语句写回数据库，
+避免逐条 SELECT/INSERT 长时间持有 SQLite 写锁
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, TypeVar
+
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+IN_CHUNK_SIZE = 500  # IN 查询 / 批量语句每批的行数（SQLite 绑定参数数量有限）
+
+
+def chunked(items: Sequence[T], size: int = IN_CHUNK_SIZE) -> Iterable[Sequence[T]]:
+    """按固定大小切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _dialect_insert(db: Session, model):
+    """根据当前连接的数据库方言返回支持 ON CONFLICT 的 insert 构造器，不支持时返回 None"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model)
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    return None
+
+
+def bulk_insert(db: Session, model, rows: List[Dict]) -> int:
+    """executemany 批量插入，返回插入行数"""
+    for chunk in chunked(rows):
+        db.execute(insert(model), list(chunk))
+    return len(rows)
+
+
+def bulk_upsert(db: Session, model, rows: List[Dict], index_elements: Sequence[str],
+                update_columns: Optional[Sequence[str]] = None) -> int:
+    """
+    批量 INSERT ... ON CONFLICT DO UPDATE（SQLite / PostgreSQL）
+
+    Args:
+        rows: 每行的列值字典，所有行的键需一致
+        index_elements: 冲突判定使用的唯一约束列（主键或唯一索引）
+        update_columns: 冲突时更新的列；为空列表时冲突行保持不变（DO NOTHING），
+                        为 None 时更新除 index_elements 外的全部列
+
+    其他数据库方言退化为批量 UPDATE + 批量 INSERT（此时 rows 中需包含主键列）
+    """
+    if not rows:
+        return 0
+    if update_columns is None:
+        update_columns = [k for k in rows[0] if k not in index_elements]
+
+    stmt = _dialect_insert(db, model)
+    if stmt is None:
+        return _fallback_upsert(db, model, rows, index_elements, update_columns)
+
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+
+    for chunk in chunked(rows):
+        db.execute(stmt, list(chunk))
+    return len(rows)
+
+
+def _fallback_upsert(db: Session, model, rows: List[Dict], index_elements: Sequence[str],
+                     update_columns: Sequence[str]) -> int:
+    """不支持 ON CONFLICT 的数据库：先查出已存在的键，再分别批量更新和插入"""
+    columns = [getattr(model, col) for col in index_elements]
+    existing = set()
+    for chunk in chunked(rows):
+        keys = [tuple(row[col] for col in index_elements) for row in chunk]
+        if len(columns) == 1:
+            found = db.query(columns[0]).filter(columns[0].in_([k[0] for k in keys])).all()
+        else:
+            found = db.query(*columns).filter(tuple_(*columns).in_(keys)).all()
+        existing.update(tuple(r) for r in found)
+
+    to_update = [row for row in rows if tuple(row[col] for col in index_elements) in existing]
+    to_insert = [row for row in rows if tuple(row[col] for col in index_elements) not in existing]
+    if to_update and update_columns:
+        pk_columns = [col.key for col in model.__mapper__.primary_key]
+        keep = set(pk_columns) | set(update_columns)
+        db.bulk_update_mappings(model, [{k: v for k, v in row.items() if k in keep} for row in to_update])
+    bulk_insert(db, model, to_insert)
+    return len(rows)
@@ -1,9 +1,233 @@
 """CAS 认证工具模块"""
 from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
+import logging
+import math
+import threading
+import time
 from buptmw import BUPT_Auth
+from .config import settings
 from .security import get_password_hash, verify_password
 
+logger = logging.getLogger(__name__)
+
+
+class CASUnavailable(Exception):
+    """CAS 登录被拒绝（账号熔断中或排队超时），调用方应直接失败，不再请求 CAS"""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def classify_cas_error(error_msg: str) -> Optional[str]:
+    """CAS 错误分类："locked"（账户锁定）、"credentials"（用户名或密码错误），其他返回 None"""
+    if "423" in error_msg or "Locked" in error_msg:
+        return "locked"
+    if "401" in error_msg or "Unauthorized" in error_msg:
+        return "credentials"
+    return None
+
+
+class CASAdmission:
+    """
+    CAS 登录准入控制
+    - 全局信号量限制同时进行的 CAS 登录数，其余请求排队（排队人数和等待时间有上限）
+    - 每个账号一个熔断器：账户锁定立即打开，连续密码错误达到阈值后打开；
+      打开期间直接抛出 CASUnavailable，到期后放行一次试探登录，成功则关闭
+    - 排队等待时间记录在当前线程，接口可通过 last_wait_ms() 返回给客户端
+    """
+
+    def __init__(self, max_concurrent: int = settings.cas_max_concurrent_logins,
+                 max_waiting: int = settings.cas_max_waiting_logins,
+                 wait_timeout: float = settings.cas_login_wait_seconds,
+                 failure_threshold: int = settings.cas_breaker_failure_threshold,
+                 open_seconds: int = settings.cas_breaker_open_seconds,
+                 lockout_seconds: int = settings.cas_lockout_cooldown_seconds):
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.lockout_seconds = lockout_seconds
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._breakers: Dict[str, Dict[str, Any]] = {}  # cas_username -> {failures, open_until, trial}
+        self._local = threading.local()
+
+        # 统计信息
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _check_breaker(self, cas_username: str):
+        """熔断打开时抛出 CASUnavailable；到期后只放行一个试探请求"""
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(cas_username)
+            if breaker is None or breaker["open_until"] is None:
+                return
+            retry_after = breaker["open_until"] - now
+            if retry_after <= 0 and not breaker["trial"]:
+                breaker["trial"] = True
+                return
+            self._rejected += 1
+        retry_after = max(1, math.ceil(retry_after))
+        raise CASUnavailable(f"CAS 账户 {cas_username} 近期登录失败，暂停登录，请 {retry_after} 秒后再试", retry_after)
+
+    def _record(self, cas_username: str, error_kind: Optional[str], ok: bool):
+        """登录结束：成功关闭熔断器；锁定 / 密码错误累计失败次数"""
+        with self._lock:
+            if ok:
+                self._breakers.pop(cas_username, None)
+                return
+            if error_kind is None:
+                # 网络错误、排队超时等与账号无关的失败：只结束试探，不计入失败次数
+                if cas_username in self._breakers:
+                    self._breakers[cas_username]["trial"] = False
+                return
+            breaker = self._breakers.setdefault(cas_username, {"failures": 0, "open_until": None, "trial": False})
+            breaker["trial"] = False
+            if error_kind == "locked":
+                breaker["failures"] += 1
+                breaker["open_until"] = time.monotonic() + self.lockout_seconds
+                logger.warning(f"CAS 账户 {cas_username} 已被锁定，{self.lockout_seconds} 秒内不再尝试登录")
+            elif error_kind == "credentials":
+                breaker["failures"] += 1
+                if breaker["failures"] >= self.failure_threshold:
+                    breaker["open_until"] = time.monotonic() + self.open_seconds
+                    logger.warning(f"CAS 账户 {cas_username} 连续 {breaker['failures']} 次密码错误，暂停登录 {self.open_seconds} 秒")
+
+    def _admit(self) -> float:
+        """排队取得登录名额，返回等待秒数"""
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                self._rejected += 1
+                raise CASUnavailable("CAS 登录排队人数过多，请稍后再试", retry_after=int(self.wait_timeout))
+            self._waiting += 1
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.wait_timeout)
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._rejected += 1
+        self._local.wait_ms = round(waited * 1000, 1)
+        if not acquired:
+            raise CASUnavailable(f"CAS 登录排队超过 {self.wait_timeout} 秒，请稍后再试", retry_after=int(self.wait_timeout))
+        with self._lock:
+            self._admitted += 1
+            self._in_flight += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def login(self, cas_username: str, cas_password: str) -> BUPT_Auth:
+        """在准入控制下创建 BUPT_Auth（完成 CAS 登录）"""
+        self._local.wait_ms = 0.0
+        self._check_breaker(cas_username)
+        try:
+            self._admit()
+        except CASUnavailable:
+            self._record(cas_username, None, ok=False)
+            raise
+        try:
+            # 排队期间同一账号可能已经失败，取得名额后再检查一次
+            with self._lock:
+                breaker = self._breakers.get(cas_username)
+                blocked = breaker is not None and breaker["open_until"] is not None and not breaker["trial"]
+            if blocked:
+                self._check_breaker(cas_username)
+            auth = BUPT_Auth(cas={"username": cas_username, "password": cas_password})
+        except CASUnavailable:
+            raise
+        except Exception as e:
+            self._record(cas_username, classify_cas_error(str(e)), ok=False)
+            raise
+        else:
+            self._record(cas_username, None, ok=True)
+            return auth
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._in_flight -= 1
+
+    def last_wait_ms(self) -> float:
+        """当前线程最近一次 CAS 登录的排队时间（毫秒）"""
+        return getattr(self._local, "wait_ms", 0.0)
+
+    def reset(self, cas_username: Optional[str] = None):
+        """清除熔断状态（不传账号时清除全部）"""
+        with self._lock:
+            if cas_username is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(cas_username, None)
+
+    def stats(self) -> Dict:
+        """准入统计：在途 / 排队登录数、拒绝次数、排队时间、打开的熔断器数"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "wait_ms": {
+                    "avg": round(self._total_wait / self._admitted * 1000, 1) if self._admitted else 0.0,
+                    "max": round(self._max_wait * 1000, 1),
+                },
+                "open_breakers": sum(
+                    1 for b in self._breakers.values()
+                    if b["open_until"] is not None and b["open_until"] > now
+                ),
+            }
+
+
+# 全局 CAS 准入控制实例（登录接口、绑定 / 验证接口、爬虫登录共用）
+cas_admission = CASAdmission()
+
+
+def cas_unavailable_response(e: CASUnavailable) -> tuple:
+    """CAS 登录被准入控制拒绝（熔断 / 排队超时）：503 + Retry-After"""
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+    return {
+        "error": str(e),
+        "retry_after": e.retry_after,
+        "cas_queue_wait_ms": cas_admission.last_wait_ms()
+    }, 503, headers
+
+
+def resolve_cas_credentials(user, req: Dict[str, Any]) -> Tuple[Optional[Tuple[str, str]], Optional[tuple]]:
+    """
+    确定同步接口使用的 CAS 账号密码，返回 ((账号, 密码), None) 或 (None, 错误响应)
+
+    - 已绑定 CAS 且请求没有提供账号密码：使用绑定的账号，但需要请求提供 cas_password 验证身份
+    - 已绑定 CAS 且请求提供了账号或密码：缺的一项用绑定账号 / cas_password 补上
+    - 未绑定 CAS（或没有本地用户）：必须提供 school_username / school_password
+    """
+    if user and user.cas_is_bound and user.cas_username:
+        if not req.get("school_username") and not req.get("school_password"):
+            if not req.get("cas_password"):
+                return None, ({
+                    "error": "请提供CAS密码以验证身份",
+                    "requires_password": True,
+                    "cas_username": user.cas_username
+                }, 400)
+            s_user, s_pass = user.cas_username, req.get("cas_password")
+        else:
+            s_user = req.get("school_username") or user.cas_username
+            s_pass = req.get("school_password") or req.get("cas_password")
+    else:
+        s_user, s_pass = req.get("school_username"), req.get("school_password")
+
+    if not s_user or not s_pass:
+        return None, ({"error": "缺少学校账号密码"}, 400)
+    return (s_user, s_pass), None
+
 
 def verify_cas_credentials(cas_username: str, cas_password: str) -> Tuple[bool, Optional[BUPT_Auth], Optional[str]]:
     """
@@ -18,29 +242,32 @@ def verify_cas_credentials(cas_username: str, cas_password: str) -> Tuple[bool,
         - is_valid: 凭证是否有效
         - auth_object: 如果有效，返回 BUPT_Auth 对象；否则为 None
         - error_message: 如果无效，返回错误信息；否则为 None
+
+    Raises:
+        CASUnavailable: 账号熔断中或排队超时（未请求 CAS）
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     try:
         # 记录调试信息（不记录完整密码，只记录长度和首尾字符）
         password_preview = f"{cas_password[0] if cas_password else ''}***{cas_password[-1] if len(cas_password) > 1 else ''}" if cas_password else "空"
         logger.debug(f"尝试 CAS 认证 - 用户名: {cas_username}, 密码长度: {len(cas_password) if cas_password else 0}")
         
-        auth = BUPT_Auth(cas={"username": cas_username, "password": cas_password})
+        auth = cas_admission.login(cas_username, cas_password)
         
         return True, auth, None
         
+    except CASUnavailable:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"CAS 认证异常: {error_msg}")
+        error_kind = classify_cas_error(error_msg)
         
         # 检查是否是账户锁定错误
-        if "423" in error_msg or "Locked" in error_msg:
+        if error_kind == "locked":
             return False, None, "CAS 认证失败：账户已被锁定，请稍后再试"
         
         # 检查是否是401错误
-        if "401" in error_msg or "Unauthorized" in error_msg:
+        if error_kind == "credentials":
             return False, None, "CAS 认证失败：用户名或密码错误"
         
         return False, None, f"CAS 认证错误：{error_msg}"
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
+from typing import Optional
 
 class Settings(BaseSettings):
     model_config = ConfigDict(
@@ -8,8 +9,22 @@ class Settings(BaseSettings):
     )
     
     database_url: str = "sqlite:///./app.db"
+    sqlite_pool_mode: str = "pooled"  # "pooled"：读连接池 + 单独写连接；"static"：所有线程共用一个连接（旧行为）
+    sqlite_reader_pool_size: int = 8  # SQLite 读连接池大小（pooled 模式）
+    sqlite_writer_timeout_seconds: int = 30  # 等待写连接的超时时间（pooled 模式）
+    write_queue_enabled: bool = True  # SQLite 下同步写入由单独的写线程串行执行
+    write_queue_size: int = 64  # 写入队列容量，队列满时提交方等待
+    write_queue_timeout_seconds: int = 120  # 提交 / 等待写入完成的超时时间（秒）
+    request_db_stats_headers: bool = False  # 响应头返回本次请求的连接签出数 / SQL 语句数（X-DB-Connections / X-DB-Statements）
     secret_key: str = "default_secret_key_change_in_production"
     access_token_expire_minutes: int = 30
+    token_revocation_refresh_seconds: float = 5.0  # 撤销缓存从数据库刷新的间隔，其他 worker 的撤销最多延迟该时间生效
+    token_revocation_reconcile_seconds: float = 300.0  # 撤销缓存完整重新加载（对账）的间隔，其间的刷新只按时间增量加载
+    identity_cache_ttl_seconds: float = 30.0  # 用户身份缓存有效期，其他 worker 的停用 / 角色变更最多延迟该时间生效
+    
+    # 列表接口分页（作业 / 公告 / 讨论列表，游标分页）
+    page_size_default: int = 50  # 未传 limit 时每页条数
+    page_size_max: int = 200  # limit 上限
     
     # 服务器配置
     host: str = "0.0.0.0"  # 监听地址，0.0.0.0 表示所有网络接口
@@ -19,6 +34,54 @@ class Settings(BaseSettings):
     # CORS 配置
     cors_origins: str = "*"  # 允许的来源，生产环境应设置为具体域名，如 "https://example.com,https://www.example.com"
     cors_supports_credentials: bool = True  # 是否支持 credentials
+    
+    # UCloud 会话缓存配置
+    ucloud_session_ttl_seconds: int = 3000  # 会话缓存有效期（秒），buptmw 设置的 UCloud Cookie 有效期为 1 小时
+    ucloud_session_store: str = "memory"  # 缓存存储："memory"（进程内）或 "database"（多个 gunicorn worker 共享）
+    
+    # 爬虫配置
+    scraper_max_workers: int = 8  # 单次同步内并发请求 UCloud 的上限
+    notification_full_sync_hours: int = 24  # 公告默认增量同步，超过该间隔做一次全量对账（刷新已读状态）
+
+    # UCloud 请求限流（进程内；多进程部署时按进程数折算）
+    upstream_rate_per_second: float = 10.0  # 每个上游主机每秒的平均请求数
+    upstream_burst: int = 20  # 每个上游主机的突发请求数
+    upstream_max_in_flight: int = 32  # 所有账号合计的在途请求上限
+    upstream_max_in_flight_per_user: int = 8  # 单个 CAS 账号的在途请求上限
+    upstream_max_retries: int = 3  # 429 / 5xx / 连接错误的最大重试次数
+    upstream_backoff_base_seconds: float = 0.5  # 指数退避的初始等待时间
+    upstream_backoff_max_seconds: float = 10.0  # 单次退避的最长等待时间
+    upstream_acquire_timeout_seconds: float = 60.0  # 等待令牌 / 在途名额的超时时间
+
+    # CAS 登录准入控制（进程内）
+    cas_max_concurrent_logins: int = 4  # 同时进行的 CAS 登录数
+    cas_max_waiting_logins: int = 32  # 排队等待登录的请求数上限，超出直接拒绝
+    cas_login_wait_seconds: float = 30.0  # 排队等待登录名额的超时时间
+    cas_breaker_failure_threshold: int = 3  # 同一账号连续密码错误达到该次数后暂停登录
+    cas_breaker_open_seconds: int = 300  # 密码错误熔断时长（秒）
+    cas_lockout_cooldown_seconds: int = 900  # 账户被 CAS 锁定（423）后暂停登录的时长（秒）
+
+    # 后台同步任务配置（sync_jobs 表作为租约队列，多个进程 / 节点可共享）
+    sync_worker_embedded: Optional[bool] = None  # Web 进程内启动同步 worker / 调度器；None 表示单进程运行（python main.py）时自动启动、gunicorn 等多进程部署不启动（改用 scripts/run_sync_worker.py）；每台主机只应有一个进程开启
+    sync_worker_mode: str = "thread"  # worker 池类型："thread"（线程）或 "process"（子进程）
+    sync_worker_concurrency: int = 2  # 同时执行的同步任务数
+    sync_job_lease_seconds: int = 300  # 任务租约时长（秒），执行期间 worker 每隔租约的 1/3 续租一次
+    sync_job_poll_seconds: float = 2.0  # 队列为空时的轮询间隔（秒）
+    sync_job_max_attempts: int = 3  # 租约过期（worker 崩溃）后最多重新领取的次数
+    sync_stage_max_workers: int = 4  # 单个同步任务内并发执行的阶段数上限
+    sync_max_running_jobs: int = 8  # 所有节点合计同时执行的同步任务上限（限制对 UCloud 的并发会话数）
+    sync_fresh_seconds: int = 60  # 同一用户的同类同步在该时间内完成过则直接返回上次结果（force=true 跳过）
+    sync_lock_ttl_seconds: int = 600  # 单飞锁有效期（秒），执行者运行期间定期续期，崩溃后超过该时间可被接管；也是后台任务等待者的最长等待时间
+    sync_wait_seconds: float = 10.0  # /sync 接口等待进行中的相同同步的最长时间（秒），超时返回 202 和锁状态
+    sync_lock_heartbeat_seconds: int = 60  # 执行者续期单飞锁的间隔（秒），应明显小于 sync_lock_ttl_seconds
+
+    # 定时同步（需要保存可还原的 CAS 密码，默认关闭；开启后用户重新登录 / 绑定 CAS 时保存）
+    sync_schedule_enabled: bool = False
+    sync_schedule_quick_minutes: int = 30  # 快速同步（待办 + 最新公告）间隔
+    sync_schedule_full_hours: int = 12  # 完整同步间隔
+    sync_schedule_jitter: float = 0.1  # 每次间隔随机浮动的比例，避免用户集中在同一时刻同步
+    sync_schedule_active_days: int = 14  # 只同步最近该天数内登录过的用户
+    sync_schedule_tick_seconds: int = 60  # 调度器检查间隔
 
 
 settings = Settings()
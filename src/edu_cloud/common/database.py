@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, Insert, Update, Delete, TextClause
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.pool import StaticPool, QueuePool
@@ -14,15 +14,33 @@ engine_kwargs = {
     "future": True,  # 使用SQLAlchemy 2.0风格
 }
 
+# 内存数据库只能有一个连接，必须共用
+is_sqlite = settings.database_url.startswith("sqlite")
+is_sqlite_memory = is_sqlite and (":memory:" in settings.database_url or settings.database_url in ("sqlite://", "sqlite:///"))
+use_sqlite_pool = is_sqlite and not is_sqlite_memory and settings.sqlite_pool_mode == "pooled"
+
+sqlite_connect_args = {
+    "check_same_thread": False,  # 允许多线程访问（连接由连接池在线程间交接，同一时刻只有一个线程使用）
+    "timeout": 20.0,  # 连接超时时间（秒）
+}
+
 # 根据数据库类型配置连接池和并发控制
-if settings.database_url.startswith("sqlite"):
+if use_sqlite_pool:
+    # SQLite 连接池模式：本引擎是唯一的写连接（pool_size=1），读请求走下面的 reader_engine
+    # WAL 模式下多个读连接可以与写连接并发，写操作在这里排队，不再在 SQLite 锁上互相等待
+    engine_kwargs.update({
+        "poolclass": QueuePool,
+        "pool_size": 1,
+        "max_overflow": 0,
+        "pool_timeout": settings.sqlite_writer_timeout_seconds,  # 等待写连接的超时时间（秒）
+        "connect_args": sqlite_connect_args,
+        "pool_pre_ping": True,
+    })
+elif is_sqlite:
     # SQLite配置：使用StaticPool支持多线程，设置WAL模式提高并发性能
     engine_kwargs.update({
         "poolclass": StaticPool,
-        "connect_args": {
-            "check_same_thread": False,  # 允许多线程访问
-            "timeout": 20.0,  # 连接超时时间（秒）
-        },
+        "connect_args": sqlite_connect_args,
         "pool_pre_ping": True,  # 连接前检查连接是否有效
     })
 else:
@@ -36,22 +54,77 @@ else:
         "pool_reset_on_return": "commit",  # 返回连接池时重置
     })
 
-# 创建数据库引擎
+# 创建数据库引擎（SQLite 连接池模式下为写引擎；建表、迁移也使用它）
 engine = create_engine(settings.database_url, **engine_kwargs)
 
+# SQLite 连接池模式的读引擎：多个读连接，利用 WAL 的并发读
+reader_engine = None
+if use_sqlite_pool:
+    reader_engine = create_engine(
+        settings.database_url,
+        echo=engine_kwargs["echo"],
+        future=True,
+        poolclass=QueuePool,
+        pool_size=settings.sqlite_reader_pool_size,
+        max_overflow=settings.sqlite_reader_pool_size,
+        connect_args=sqlite_connect_args,
+        pool_pre_ping=True,
+    )
+
+def set_sqlite_pragma(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Write-Ahead Logging模式
+    cursor.execute("PRAGMA synchronous=NORMAL")  # 平衡性能和安全性
+    cursor.execute("PRAGMA foreign_keys=ON")  # 启用外键约束
+    cursor.execute("PRAGMA busy_timeout=30000")  # 30秒忙等待超时
+    cursor.close()
+
 # 为SQLite启用WAL模式以提高并发性能（需要在engine创建后注册）
-if settings.database_url.startswith("sqlite"):
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_conn, connection_record):
-        cursor = dbapi_conn.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")  # Write-Ahead Logging模式
-        cursor.execute("PRAGMA synchronous=NORMAL")  # 平衡性能和安全性
-        cursor.execute("PRAGMA foreign_keys=ON")  # 启用外键约束
-        cursor.execute("PRAGMA busy_timeout=30000")  # 30秒忙等待超时
-        cursor.close()
+if is_sqlite:
+    event.listen(engine, "connect", set_sqlite_pragma)
+    if reader_engine is not None:
+        event.listen(reader_engine, "connect", set_sqlite_pragma)
+
+
+_WRITER_KEY = "use_writer"
+
+
+class RoutingSession(Session):
+    """
+    读写分离的会话（仅 SQLite 连接池模式生效）
+    - flush 和 INSERT/UPDATE/DELETE/原生 SQL 走写引擎（flush 由 before_flush 事件标记）
+    - 事务中一旦写过，后续读也走写引擎（读到自己未提交的修改），提交 / 回滚后恢复
+    - 其余查询走读引擎
+
+    写引擎只有一个连接：会话第一次写入后一直占用它直到提交 / 回滚，其他会话的写入都要排队
+    （最多等待 sqlite_writer_timeout_seconds）。写事务必须短：先准备好数据，写入后立即提交，
+    写入和提交之间不要访问网络；同步等批量写入交给 write_queue
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if reader_engine is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.info.get(_WRITER_KEY) or isinstance(clause, (Insert, Update, Delete, TextClause)):
+            self.info[_WRITER_KEY] = True
+            return engine
+        return reader_engine
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _mark_writer(session, flush_context, instances):
+    """有待写入的修改：本次 flush 及之后到事务结束的查询都走写引擎"""
+    session.info[_WRITER_KEY] = True
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_writer_flag(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_WRITER_KEY, None)
+
 
 # 创建会话工厂，配置隔离级别和并发控制
 SessionLocal = sessionmaker(
+    class_=RoutingSession,
     autocommit=False,
     autoflush=False,
     bind=engine,
@@ -0,0 +1,146 @@
+"""
+并发抓取工具
+在一次同步中并发请求 UCloud（线程池 + 并发上限），结果保持输入顺序；
+以及 UCloud 列表接口（current/size/total）的自动翻页
+
+settings.scraper_max_workers 是一次同步的总并发上限：已经在抓取线程池里运行的任务
+（例如按课程并发时每门课再翻页）不会再开新的线程池，而是串行翻页
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import math
+
+from .config import settings
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_pool_state = threading.local()
+
+
+def _mark_pool_thread():
+    """抓取线程池的线程初始化：标记当前线程已在池内"""
+    _pool_state.in_pool = True
+
+
+def _in_fetch_pool() -> bool:
+    """当前线程是否是 fetch_ordered / fetch_as_completed 的工作线程"""
+    return getattr(_pool_state, "in_pool", False)
+
+
+def _pool(workers: int, prefix: str) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=prefix, initializer=_mark_pool_thread)
+
+
+def fetch_ordered(func: Callable[[T], R], items: Iterable[T], max_workers: Optional[int] = None) -> List[R]:
+    """
+    并发执行 func(item)，返回与 items 顺序一致的结果列表
+
+    Args:
+        func: 单个请求函数（应自行处理异常，避免一个失败中断全部）
+        items: 输入列表
+        max_workers: 并发上限，默认 settings.scraper_max_workers
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = min(max_workers or settings.scraper_max_workers, len(items))
+    if workers <= 1 or _in_fetch_pool():
+        return [func(item) for item in items]
+
+    with _pool(workers, "ucloud-fetch") as executor:
+        # executor.map 按输入顺序返回结果，保证输出确定
+        return list(executor.map(func, items))
+
+
+def fetch_as_completed(func: Callable[[T], R], items: Iterable[T],
+                       max_workers: Optional[int] = None) -> Iterator[Tuple[T, R]]:
+    """
+    并发执行 func(item)，按完成先后流式产出 (item, result)
+    适合结果较大、希望边抓边处理的场景
+    """
+    items = list(items)
+    if not items:
+        return
+
+    workers = min(max_workers or settings.scraper_max_workers, len(items))
+    if workers <= 1 or _in_fetch_pool():
+        for item in items:
+            yield item, func(item)
+        return
+
+    with _pool(workers, "ucloud-fetch") as executor:
+        futures = {executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def parse_page(payload: Dict[str, Any]) -> Tuple[List[Dict], int]:
+    """
+    解析 UCloud 列表接口返回的 data 字段，得到 (records, total)
+    兼容分页结构 {"records": [...], "total": n} 和直接返回列表两种格式
+    """
+    data = payload.get("data") or {}
+    if isinstance(data, list):
+        return data, len(data)
+    records = data.get("records") or []
+    return records, int(data.get("total") or len(records))
+
+
+def iter_pages(fetch_page: Callable[[int, int], Tuple[List[T], int]], page_size: int,
+               max_workers: Optional[int] = None) -> Iterator[List[T]]:
+    """
+    自动翻页：先请求第 1 页读取 total，再并发请求剩余页，按页码顺序逐页产出
+
+    Args:
+        fetch_page: fetch_page(current, size) -> (records, total)，页码从 1 开始；
+                    请求失败时应抛出异常（会传给调用方），不要返回空页，否则结果会被静默截断
+        page_size: 每页条数
+        max_workers: 同时在途的页数上限，默认 settings.scraper_max_workers；
+                     已在抓取线程池内运行时串行翻页，不额外占用并发
+
+    调用方提前停止迭代（break）时，不再提交新的页请求
+    """
+    records, total = fetch_page(1, page_size)
+    yield records
+    if not records:
+        return
+
+    pages = math.ceil(total / page_size)
+    if pages <= 1:
+        return
+
+    workers = min(max_workers or settings.scraper_max_workers, pages - 1)
+    if workers <= 1 or _in_fetch_pool():
+        for current in range(2, pages + 1):
+            records, _ = fetch_page(current, page_size)
+            yield records
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ucloud-page")
+    try:
+        # 滑动窗口：最多 workers 个页在途，按页码顺序取结果
+        pending = deque()
+        next_page = 2
+        while next_page <= pages and len(pending) < workers:
+            pending.append(executor.submit(fetch_page, next_page, page_size))
+            next_page += 1
+
+        while pending:
+            records, _ = pending.popleft().result()
+            if next_page <= pages:
+                pending.append(executor.submit(fetch_page, next_page, page_size))
+                next_page += 1
+            yield records
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def paginate(fetch_page: Callable[[int, int], Tuple[List[T], int]], page_size: int,
+             max_workers: Optional[int] = None) -> Iterator[T]:
+    """iter_pages 的逐条版本：以生成器形式流式产出所有记录"""
+    for records in iter_pages(fetch_page, page_size, max_workers):
+        yield from records
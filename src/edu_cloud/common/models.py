@@ -0,0 +1,17 @@
+# 公共基础设施表（与具体业务模块无关）
+from sqlalchemy import Column, String, DateTime, Text
+from datetime import datetime, timezone
+from .database import Base
+
+
+class UCloudSessionRecord(Base):
+    """UCloud 会话缓存表（ucloud_session_store = "database" 时使用，供多个 worker 共享）"""
+    __tablename__ = "ucloud_sessions"
+
+    cas_username = Column(String, primary_key=True)         # CAS 用户名（学号）
+    credential_hash = Column(String, nullable=False)        # 凭证指纹（HMAC），用于校验调用方密码
+    user_id = Column(String, nullable=False)                # UCloud UserID
+    access_token = Column(Text, nullable=True)              # Blade-Auth Token（encrypt_secret 加密）
+    cookies = Column(Text, nullable=True)                   # Cookie 列表 (JSON，encrypt_secret 加密)
+    expires_at = Column(DateTime, nullable=False, index=True)  # 过期时间 (UTC)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
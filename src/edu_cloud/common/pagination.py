@@ -0,0 +1,117 @@
+"""
+列表接口的游标（keyset）分页
+按 (排序时间列, id) 倒序翻页：下一页从上一页最后一行的键之后继续，沿索引定位，
+翻到多深都不需要 OFFSET 跳过前面的行。排序时间为空的行排在最后：有时间的行和没有时间的行分两段查询，
+不依赖数据库对 NULL 的排序规则（SQLite 中 DESC 时 NULL 在后，PostgreSQL 中在前）
+
+接口参数：?limit=每页条数&after=上一页返回的 next_cursor
+响应体：{"data": [...], "next_cursor": "..." 或 null}
+响应头 X-Total-Count 为总条数：统计要 COUNT(*) 全部匹配的行，只在第一页（没有 after）或 ?count=1 时返回
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import jsonify, request
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Query
+
+from .config import settings
+
+
+@dataclass
+class Page:
+    """一页查询结果"""
+    items: List[Any]
+    next_cursor: Optional[str]  # 没有下一页时为 None
+    count: Callable[[], int]  # 统计总条数（COUNT 查询，访问 total 时才执行）
+
+    @property
+    def total(self) -> int:
+        return self.count()
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id) -> str:
+    """把最后一行的 (排序时间, id) 编码为不透明的游标字符串"""
+    key = [sort_value.isoformat() if sort_value else None, row_id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], Any]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(sort_value) if sort_value else None), row_id
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def page_args() -> Tuple[int, Optional[str]]:
+    """
+    读取当前请求的 limit / after 参数
+    limit 缺省为 settings.page_size_default，超过 settings.page_size_max 时截断；非法时抛出 ValueError
+    """
+    raw_limit = request.args.get("limit")
+    try:
+        limit = int(raw_limit) if raw_limit else settings.page_size_default
+    except ValueError:
+        raise ValueError("limit 必须是整数")
+    if limit < 1:
+        raise ValueError("limit 必须大于 0")
+    return min(limit, settings.page_size_max), request.args.get("after") or None
+
+
+def keyset_page(query: Query, sort_col, id_col, limit: int, after: Optional[str] = None) -> Page:
+    """
+    按 (sort_col DESC, id_col DESC) 取一页
+
+    Args:
+        query: 已加好过滤条件的查询（不要带 order_by）
+        sort_col: 排序用的时间列，应与过滤列组成复合索引，例如 (owner_id, deadline)
+        id_col: 主键列，排序时间相同时作为第二排序键
+        limit: 每页条数
+        after: 上一页的 next_cursor，None 表示第一页
+    """
+    # 第一段：有排序时间的行；第二段：排序时间为空的行，只按 id 倒序
+    dated = query.filter(sort_col.isnot(None)).order_by(sort_col.desc(), id_col.desc())
+    undated = query.filter(sort_col.is_(None)).order_by(id_col.desc())
+
+    sort_value, last_id = decode_cursor(after) if after is not None else (None, None)
+    if after is not None and sort_value is None:
+        # 已经翻到排序时间为空的行
+        rows = undated.filter(id_col < last_id).limit(limit + 1).all()
+    else:
+        if after is not None:
+            # (sort_col, id) < (sort_value, last_id)，写成 sort_col <= ? 让索引可以直接定位
+            dated = dated.filter(sort_col <= sort_value, or_(sort_col < sort_value, id_col < last_id))
+        rows = dated.limit(limit + 1).all()
+        if len(rows) <= limit:
+            # 有时间的行取完了，接着取时间为空的行
+            rows += undated.limit(limit + 1 - len(rows)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
+    return Page(items=rows, next_cursor=next_cursor,
+                count=lambda: query.order_by(None).with_entities(func.count(id_col)).scalar())
+
+
+def wants_total() -> bool:
+    """当前请求是否需要总条数：第一页或显式传了 ?count=1（翻页时不再每页 COUNT 一次）"""
+    return not request.args.get("after") or request.args.get("count") == "1"
+
+
+def page_response(page: Page, serialize: Callable[[Any], Dict]):
+    """把一页结果序列化为接口响应，需要总数时（见 wants_total）放在 X-Total-Count 响应头"""
+    response = jsonify({
+        "data": [serialize(item) for item in page.items],
+        "next_cursor": page.next_cursor
+    })
+    if wants_total():
+        response.headers["X-Total-Count"] = str(page.total)
+    return response
@@ -0,0 +1,232 @@
+"""
+UCloud 请求限流
+所有经过 UCloudSession 的请求共用：
+- 每个上游主机一个令牌桶（平均速率 + 突发上限），收到 429 时自动降速，之后逐步恢复
+- 全局 / 每个 CAS 账号的在途请求上限
+- 429 / 5xx / 连接错误按指数退避 + 随机抖动重试（优先使用 Retry-After）
+限流状态只在当前进程内有效，多进程部署时按进程数折算配置
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 需要重试的状态码（UCloud 的 POST 接口都是查询，重试不会产生副作用）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimitTimeout(Exception):
+    """等待令牌 / 在途名额超时"""
+    pass
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个
+    throttle() / recover() 实现加性增、乘性减的自适应速率
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _fill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """取一个令牌，返回等待的秒数；超过 timeout 仍未取到抛出 RateLimitTimeout"""
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._fill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = (1 - self._tokens) / self.rate
+            if timeout is not None and now - start + wait > timeout:
+                raise RateLimitTimeout(f"等待令牌超过 {timeout} 秒")
+            time.sleep(wait)
+
+    def throttle(self):
+        """上游限流（429）：速率减半，并清空积攒的令牌"""
+        with self._lock:
+            self._fill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def recover(self):
+        """请求成功：速率逐步恢复到配置值"""
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class UpstreamLimiter:
+    """
+    上游请求限流器
+
+    Args:
+        rate: 每个主机每秒的平均请求数
+        burst: 每个主机的突发请求数
+        max_in_flight: 所有账号合计的在途请求上限
+        max_in_flight_per_user: 单个 CAS 账号的在途请求上限（一次同步的多个阶段共用）
+        max_retries: 429 / 5xx / 连接错误的最大重试次数
+    """
+
+    def __init__(self, rate: float = settings.upstream_rate_per_second,
+                 burst: int = settings.upstream_burst,
+                 max_in_flight: int = settings.upstream_max_in_flight,
+                 max_in_flight_per_user: int = settings.upstream_max_in_flight_per_user,
+                 max_retries: int = settings.upstream_max_retries,
+                 backoff_base: float = settings.upstream_backoff_base_seconds,
+                 backoff_max: float = settings.upstream_backoff_max_seconds,
+                 acquire_timeout: float = settings.upstream_acquire_timeout_seconds):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight_per_user = max_in_flight_per_user
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._global = threading.BoundedSemaphore(max_in_flight)
+        self._user_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+        # 统计信息
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._counters = defaultdict(lambda: defaultdict(int))  # host -> 计数
+        self._wait_seconds = defaultdict(float)  # host -> 累计等待令牌的秒数
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def _user_slot(self, user_key: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._user_slots.get(user_key)
+            if slot is None:
+                slot = self._user_slots[user_key] = threading.BoundedSemaphore(self.max_in_flight_per_user)
+            return slot
+
+    def _count(self, host: str, key: str, amount: int = 1):
+        with self._lock:
+            self._counters[host][key] += amount
+
+    def _backoff(self, attempt: int, resp=None) -> float:
+        """第 attempt 次重试前的等待时间：Retry-After 优先，否则指数退避 + 全抖动"""
+        if resp is not None:
+            retry_after = resp.headers.get("Retry-After")
+            if isinstance(retry_after, str):
+                try:
+                    return min(self.backoff_max, float(retry_after))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send_once(self, host: str, user_key: Optional[str], send: Callable[[], requests.Response]):
+        slot = self._user_slot(user_key) if user_key else None
+        if slot is not None and not slot.acquire(timeout=self.acquire_timeout):
+            raise RateLimitTimeout(f"账号 {user_key} 的在途请求过多，等待超过 {self.acquire_timeout} 秒")
+        try:
+            if not self._global.acquire(timeout=self.acquire_timeout):
+                raise RateLimitTimeout(f"上游在途请求过多，等待超过 {self.acquire_timeout} 秒")
+            try:
+                waited = self._bucket(host).acquire(self.acquire_timeout)
+                with self._lock:
+                    self._wait_seconds[host] += waited
+                    self._in_flight += 1
+                    self._max_in_flight = max(self._max_in_flight, self._in_flight)
+                try:
+                    return send()
+                finally:
+                    with self._lock:
+                        self._in_flight -= 1
+            finally:
+                self._global.release()
+        finally:
+            if slot is not None:
+                slot.release()
+
+    def call(self, url: str, send: Callable[[], requests.Response], user_key: Optional[str] = None):
+        """
+        在限流下执行 send()（一次 HTTP 请求），需要时重试
+
+        Args:
+            url: 请求地址，按主机名限流
+            send: 发送请求的函数
+            user_key: 账号标识（cas_username），用于单账号在途上限
+        """
+        host = urlsplit(url).hostname or ""
+        attempt = 0
+        while True:
+            self._count(host, "requests")
+            try:
+                resp = self._send_once(host, user_key, send)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._count(host, "connection_errors")
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"请求 {host} 失败（{type(e).__name__}），{delay:.2f} 秒后重试")
+            else:
+                status = resp.status_code
+                if status == 429:
+                    self._count(host, "throttled")
+                    self._bucket(host).throttle()
+                elif status in RETRY_STATUS:
+                    self._count(host, "server_errors")
+                else:
+                    self._bucket(host).recover()
+                    return resp
+                if attempt >= self.max_retries:
+                    return resp
+                delay = self._backoff(attempt, resp)
+                logger.warning(f"{host} 返回 {status}，{delay:.2f} 秒后重试")
+
+            attempt += 1
+            self._count(host, "retries")
+            time.sleep(delay)
+
+    def stats(self) -> Dict:
+        """各主机的请求数、重试数、限流次数、当前速率等"""
+        with self._lock:
+            hosts = {}
+            for host, counters in self._counters.items():
+                bucket = self._buckets.get(host)
+                hosts[host] = {
+                    **counters,
+                    "wait_seconds": round(self._wait_seconds[host], 3),
+                    "rate": round(bucket.rate, 2) if bucket else self.rate,
+                }
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "hosts": hosts,
+            }
+
+
+# 全局限流器实例（UCloudSession 使用）
+upstream_limiter = UpstreamLimiter()
@@ -0,0 +1,117 @@
+"""
+请求级数据库会话（Flask 扩展）
+一个请求内的 JWT 回调、认证装饰器和视图共用同一个会话：第一次调用 get_request_db() 时才创建，
+请求结束时在 teardown_appcontext 中关闭，视图不需要再写 SessionLocal() / finally: db.close()。
+同时统计每个请求签出的连接数和执行的 SQL 语句数
+"""
+import logging
+from typing import Dict, Optional
+
+from flask import Flask, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .config import settings
+from . import database
+
+logger = logging.getLogger(__name__)
+
+_SESSION_KEY = "request_db"
+_STATS_KEY = "request_db_stats"
+
+
+def _stats() -> Optional[Dict[str, int]]:
+    """当前请求的计数器（不在请求上下文中时返回 None，例如后台同步线程）"""
+    if not has_app_context():
+        return None
+    stats = g.get(_STATS_KEY)
+    if stats is None:
+        stats = {"sessions": 0, "connections": 0, "statements": 0}
+        setattr(g, _STATS_KEY, stats)
+    return stats
+
+
+def _on_checkout(dbapi_conn, connection_record, connection_proxy):
+    stats = _stats()
+    if stats is not None:
+        stats["connections"] += 1
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats()
+    if stats is not None:
+        stats["statements"] += 1
+
+
+def get_request_db() -> Session:
+    """当前请求的数据库会话（惰性创建，请求结束时自动关闭）"""
+    db = g.get(_SESSION_KEY)
+    if db is None:
+        db = database.SessionLocal()
+        setattr(g, _SESSION_KEY, db)
+        _stats()["sessions"] += 1
+    return db
+
+
+def release_request_db():
+    """
+    提前归还请求级会话占用的连接（会话仍可继续使用，之后访问会重新签出连接）
+    用于接下来要长时间等待外部请求的视图，例如快速同步
+    """
+    db = g.get(_SESSION_KEY)
+    if db is not None:
+        db.close()
+
+
+def request_db_stats() -> Dict[str, int]:
+    """当前请求的数据库使用统计：创建的会话数、签出的连接数、执行的语句数"""
+    return dict(_stats() or {})
+
+
+class RequestDB:
+    """
+    Flask 扩展：注册请求结束时关闭会话，并在引擎上注册计数事件
+
+    Args:
+        app: Flask 应用（也可以之后调用 init_app）
+    """
+
+    _engines_instrumented = set()
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.extensions["request_db"] = self
+        self._instrument(database.engine)
+        if database.reader_engine is not None:
+            self._instrument(database.reader_engine)
+
+        @app.teardown_appcontext
+        def _close_request_db(exc):
+            db = g.pop(_SESSION_KEY, None)
+            if db is None:
+                return
+            try:
+                if exc is not None:
+                    db.rollback()
+            finally:
+                db.close()
+
+        @app.after_request
+        def _add_stats_headers(response):
+            if settings.request_db_stats_headers:
+                stats = request_db_stats()
+                response.headers["X-DB-Connections"] = str(stats.get("connections", 0))
+                response.headers["X-DB-Statements"] = str(stats.get("statements", 0))
+            return response
+
+    @classmethod
+    def _instrument(cls, engine):
+        """每个引擎只注册一次计数事件（测试中会多次创建应用）"""
+        if id(engine) in cls._engines_instrumented:
+            return
+        event.listen(engine, "checkout", _on_checkout)
+        event.listen(engine, "before_cursor_execute", _on_execute)
+        cls._engines_instrumented.add(id(engine))
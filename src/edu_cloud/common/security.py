@@ -6,4 +6,23 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 def get_password_hash(password: str) -> str:
     """生成密码哈希"""
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+def _secret_fernet():
+    """由 secret_key 派生的对称加密器（用于需要还原明文的凭证，如后台同步任务的 CAS 密码）"""
+    import base64
+    import hashlib
+    from cryptography.fernet import Fernet
+    from .config import settings
+    key = hashlib.sha256(b"edu-cloud-secret:" + settings.secret_key.encode("utf-8")).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def encrypt_secret(plaintext: str) -> str:
+    """可逆加密（Fernet），密钥由 secret_key 派生"""
+    return _secret_fernet().encrypt(plaintext.encode("utf-8")).decode("ascii")
+
+
+def decrypt_secret(token: str) -> str:
+    """解密 encrypt_secret 的结果；secret_key 变更后无法解密，抛出 cryptography.fernet.InvalidToken"""
+    return _secret_fernet().decrypt(token.encode("ascii")).decode("utf-8")
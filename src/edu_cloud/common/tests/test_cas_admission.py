@@ -0,0 +1,117 @@
+"""
+CAS 登录准入控制测试（BUPT_Auth 用假对象替换，不访问网络）
+"""
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.edu_cloud.common import cas_auth
+from src.edu_cloud.common.cas_auth import CASAdmission, CASUnavailable, verify_cas_credentials
+
+
+def make_admission(**kwargs):
+    options = dict(max_concurrent=2, max_waiting=8, wait_timeout=5,
+                   failure_threshold=3, open_seconds=60, lockout_seconds=600)
+    options.update(kwargs)
+    return CASAdmission(**options)
+
+
+def test_concurrent_logins_are_capped_and_wait_is_recorded():
+    admission = make_admission(max_concurrent=2)
+    lock = threading.Lock()
+    current = {"now": 0, "max": 0}
+    waits = []
+
+    def fake_auth(cas):
+        with lock:
+            current["now"] += 1
+            current["max"] = max(current["max"], current["now"])
+        time.sleep(0.05)
+        with lock:
+            current["now"] -= 1
+        return MagicMock()
+
+    def login(i):
+        admission.login(f"20230000{i:02d}", "secret")
+        waits.append(admission.last_wait_ms())
+
+    with patch.object(cas_auth, "BUPT_Auth", side_effect=fake_auth):
+        threads = [threading.Thread(target=login, args=(i,)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert current["max"] == 2
+    assert max(waits) >= 40
+    stats = admission.stats()
+    assert stats["admitted"] == 6
+    assert stats["in_flight"] == 0
+
+
+def test_queue_timeout_fails_fast():
+    admission = make_admission(max_concurrent=1, wait_timeout=0.05)
+    release = threading.Event()
+
+    def slow_auth(cas):
+        release.wait(5)
+        return MagicMock()
+
+    with patch.object(cas_auth, "BUPT_Auth", side_effect=slow_auth):
+        holder = threading.Thread(target=admission.login, args=("2023000001", "secret"))
+        holder.start()
+        time.sleep(0.02)
+        with pytest.raises(CASUnavailable):
+            admission.login("2023000002", "secret")
+        release.set()
+        holder.join()
+    assert admission.stats()["rejected"] == 1
+
+
+def test_lockout_opens_breaker_without_calling_cas():
+    admission = make_admission()
+    with patch.object(cas_auth, "BUPT_Auth", side_effect=Exception("423 Locked")) as auth:
+        with pytest.raises(Exception, match="423"):
+            admission.login("2023000000", "secret")
+        with pytest.raises(CASUnavailable) as exc:
+            admission.login("2023000000", "secret")
+        assert auth.call_count == 1
+    assert exc.value.retry_after > 500
+    assert admission.stats()["open_breakers"] == 1
+
+
+def test_credential_errors_open_breaker_after_threshold_and_trial_closes_it():
+    admission = make_admission(failure_threshold=2, open_seconds=0)
+    with patch.object(cas_auth, "BUPT_Auth", side_effect=Exception("401 Unauthorized")):
+        for _ in range(2):
+            with pytest.raises(Exception, match="401"):
+                admission.login("2023000000", "wrong")
+
+    # open_seconds=0：熔断立即到期，放行一次试探登录，成功后关闭
+    with patch.object(cas_auth, "BUPT_Auth", return_value=MagicMock()) as auth:
+        admission.login("2023000000", "secret")
+        admission.login("2023000000", "secret")
+        assert auth.call_count == 2
+    assert admission.stats()["open_breakers"] == 0
+
+
+def test_breaker_is_per_account():
+    admission = make_admission()
+    with patch.object(cas_auth, "BUPT_Auth", side_effect=Exception("423 Locked")):
+        with pytest.raises(Exception):
+            admission.login("2023000000", "secret")
+    with patch.object(cas_auth, "BUPT_Auth", return_value=MagicMock()):
+        admission.login("2023000001", "secret")
+
+
+def test_verify_cas_credentials_raises_when_breaker_open():
+    admission = make_admission()
+    with patch.object(cas_auth, "cas_admission", admission), \
+            patch.object(cas_auth, "BUPT_Auth", side_effect=Exception("423 Locked")):
+        is_valid, auth_object, error_msg = verify_cas_credentials("2023000000", "secret")
+        assert not is_valid
+        assert "锁定" in error_msg
+        with pytest.raises(CASUnavailable):
+            verify_cas_credentials("2023000000", "secret")
@@ -0,0 +1,36 @@
+"""
+同步接口 CAS 账号密码解析测试
+"""
+from types import SimpleNamespace
+
+from src.edu_cloud.common.cas_auth import resolve_cas_credentials
+
+BOUND = SimpleNamespace(cas_is_bound=True, cas_username="2023000000")
+UNBOUND = SimpleNamespace(cas_is_bound=False, cas_username=None)
+
+
+def test_bound_user_uses_bound_account_with_cas_password():
+    assert resolve_cas_credentials(BOUND, {"cas_password": "secret"}) == (("2023000000", "secret"), None)
+
+
+def test_bound_user_without_password_is_asked_for_it():
+    credentials, error = resolve_cas_credentials(BOUND, {})
+    body, status = error
+    assert credentials is None
+    assert status == 400
+    assert body["requires_password"] is True
+    assert body["cas_username"] == "2023000000"
+
+
+def test_bound_user_may_override_account():
+    assert resolve_cas_credentials(BOUND, {"school_username": "2023111111", "school_password": "p"}) == \
+        (("2023111111", "p"), None)
+    assert resolve_cas_credentials(BOUND, {"school_password": "p"}) == (("2023000000", "p"), None)
+
+
+def test_unbound_user_must_provide_both():
+    assert resolve_cas_credentials(UNBOUND, {"school_username": "u", "school_password": "p"}) == (("u", "p"), None)
+    assert resolve_cas_credentials(None, {"school_username": "u", "school_password": "p"}) == (("u", "p"), None)
+    credentials, (body, status) = resolve_cas_credentials(UNBOUND, {"school_username": "u"})
+    assert credentials is None and status == 400
+    assert "error" in body
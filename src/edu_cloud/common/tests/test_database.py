@@ -0,0 +1,87 @@
+"""
+SQLite 读写分离会话测试
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import select, update
+
+from src.edu_cloud.common import database
+from src.edu_cloud.common.database import Base, SessionLocal, engine
+from src.edu_cloud.user.models import User
+
+pytestmark = pytest.mark.skipif(database.reader_engine is None, reason="未启用 SQLite 连接池模式")
+
+
+@pytest.fixture(autouse=True)
+def tables():
+    Base.metadata.create_all(bind=engine)
+
+
+def test_reads_use_reader_pool_and_writes_stick_to_writer():
+    db = SessionLocal()
+    try:
+        db.execute(select(User))
+        assert db.get_bind(clause=select(User)) is database.reader_engine
+        db.execute(update(User).where(User.id == -1).values(is_active=True))
+        # 事务内写过之后，读也走写连接（读到自己未提交的修改）
+        assert db.get_bind(clause=select(User)) is engine
+        db.rollback()
+        assert db.get_bind(clause=select(User)) is database.reader_engine
+    finally:
+        db.close()
+
+
+def test_flush_goes_to_writer_and_is_visible_to_readers_after_commit():
+    db = SessionLocal()
+    try:
+        db.add(User(username="pool-test", email="pool-test@example.com", hashed_password="x"))
+        db.commit()
+
+        reader = SessionLocal()
+        try:
+            assert reader.query(User).filter(User.username == "pool-test").count() == 1
+        finally:
+            reader.close()
+    finally:
+        db.query(User).filter(User.username == "pool-test").delete()
+        db.commit()
+        db.close()
+
+
+def test_concurrent_sessions_with_pending_writes_do_not_deadlock():
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def write(name):
+        db = SessionLocal()
+        try:
+            # 两个会话先在读连接上查询，再同时 flush 待写入的修改：写连接只有一个，后到的排队等待
+            db.query(User).filter(User.username == name).count()
+            db.add(User(username=name, email=f"{name}@example.com", hashed_password="x"))
+            barrier.wait(5)
+            db.flush()
+            assert db.query(User).filter(User.username == name).count() == 1
+            db.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=write, args=(f"pending-{i}",)) for i in range(2)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(database.settings.sqlite_writer_timeout_seconds + 5)
+
+    db = SessionLocal()
+    try:
+        assert not errors
+        assert time.monotonic() - start < 5
+        assert db.query(User).filter(User.username.like("pending-%")).count() == 2
+    finally:
+        db.query(User).filter(User.username.like("pending-%")).delete(synchronize_session=False)
+        db.commit()
+        db.close()
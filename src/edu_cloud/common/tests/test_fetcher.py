@@ -0,0 +1,83 @@
+"""
+fetcher 自动翻页测试（不访问网络）
+"""
+import threading
+import time
+
+import pytest
+
+from src.edu_cloud.common.fetcher import fetch_ordered, iter_pages, paginate, parse_page
+
+
+def make_fetch_page(total):
+    calls = []
+    lock = threading.Lock()
+
+    def fetch_page(current, size):
+        with lock:
+            calls.append(current)
+        start = (current - 1) * size
+        return list(range(start, min(start + size, total))), total
+
+    return fetch_page, calls
+
+
+def test_parse_page_supports_records_and_list():
+    assert parse_page({"data": {"records": [1, 2], "total": 7}}) == ([1, 2], 7)
+    assert parse_page({"data": [1, 2, 3]}) == ([1, 2, 3], 3)
+    assert parse_page({"data": None}) == ([], 0)
+
+
+def test_paginate_fetches_all_pages_in_order():
+    fetch_page, calls = make_fetch_page(95)
+
+    assert list(paginate(fetch_page, 10, max_workers=4)) == list(range(95))
+    assert sorted(calls) == list(range(1, 11))
+
+
+def test_single_page_does_not_request_more():
+    fetch_page, calls = make_fetch_page(3)
+
+    assert list(paginate(fetch_page, 10)) == [0, 1, 2]
+    assert calls == [1]
+
+
+def test_early_stop_does_not_fetch_every_page():
+    fetch_page, calls = make_fetch_page(1000)
+
+    for records in iter_pages(fetch_page, 10, max_workers=2):
+        if records[0] >= 20:
+            break
+
+    assert len(calls) < 10
+
+
+def test_pages_inside_fetch_pool_stay_within_global_cap():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch_page(current, size):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.005)
+        with lock:
+            active[0] -= 1
+        start = (current - 1) * size
+        return list(range(start, min(start + size, 50))), 50
+
+    results = fetch_ordered(lambda _: list(paginate(fetch_page, 10, max_workers=4)), range(3), max_workers=2)
+
+    assert results == [list(range(50))] * 3
+    # 外层 2 个线程各自串行翻页，不会再开 2×4 个页请求
+    assert peak[0] <= 2
+
+
+def test_failed_page_propagates():
+    def fetch_page(current, size):
+        if current == 3:
+            raise RuntimeError("HTTP 500")
+        return list(range(size)), 50
+
+    with pytest.raises(RuntimeError, match="HTTP 500"):
+        list(paginate(fetch_page, 10, max_workers=2))
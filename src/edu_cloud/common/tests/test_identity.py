@@ -0,0 +1,96 @@
+"""
+JWT 身份声明与身份缓存测试
+"""
+import json
+
+from flask_jwt_extended import decode_token
+from sqlalchemy import event
+
+from main import create_app
+from src.edu_cloud.common import database
+from src.edu_cloud.common.auth import identity_cache
+from src.edu_cloud.common.database import SessionLocal
+from src.edu_cloud.common.security import get_password_hash
+from src.edu_cloud.common.token_manager import revocation_cache
+from src.edu_cloud.user.models import User
+
+
+class TestIdentityClaims:
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.db = SessionLocal()
+        self.user = User(username='identityuser', email='identity@example.com',
+                         hashed_password=get_password_hash('testpass123'), is_active=True)
+        self.db.add(self.user)
+        self.db.commit()
+        identity_cache.clear()
+
+    def teardown_method(self):
+        self.db.query(User).filter(User.username == 'identityuser').delete()
+        self.db.commit()
+        self.db.close()
+        identity_cache.clear()
+        revocation_cache.clear()
+
+    def login(self):
+        response = self.client.post('/api/user/login',
+                                    data=json.dumps({'username': 'identityuser', 'password': 'testpass123'}),
+                                    content_type='application/json')
+        return json.loads(response.data)['access_token']
+
+    def count_user_queries(self):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if 'FROM users' in statement:
+                statements.append(statement)
+
+        engines = [e for e in (database.engine, database.reader_engine) if e is not None]
+        for e in engines:
+            event.listen(e, "before_cursor_execute", record)
+        return statements, lambda: [event.remove(e, "before_cursor_execute", record) for e in engines]
+
+    def test_token_carries_uid_role_active(self):
+        token = self.login()
+        with self.app.app_context():
+            claims = decode_token(token)
+        assert claims['uid'] == self.user.id
+        assert claims['role'] == 'user'
+        assert claims['active'] is True
+        assert claims['token_generation'] == 0
+
+    def test_repeated_requests_skip_user_lookup(self):
+        headers = {'Authorization': f'Bearer {self.login()}'}
+        assert self.client.get('/api/assignment/', headers=headers).status_code == 200
+
+        statements, stop = self.count_user_queries()
+        try:
+            for _ in range(3):
+                assert self.client.get('/api/assignment/', headers=headers).status_code == 200
+        finally:
+            stop()
+        assert statements == []
+
+    def test_user_update_invalidates_identity(self):
+        headers = {'Authorization': f'Bearer {self.login()}'}
+        self.client.get('/api/user/me/cas-status', headers=headers)
+        assert identity_cache.get(self.user.id).cas_is_bound is False
+
+        user = self.db.get(User, self.user.id)
+        user.cas_username = '2023000000'
+        user.cas_is_bound = True
+        self.db.commit()
+
+        assert identity_cache.get(self.user.id).cas_is_bound is True
+
+    def test_deleted_user_is_rejected(self):
+        headers = {'Authorization': f'Bearer {self.login()}'}
+        assert self.client.get('/api/assignment/', headers=headers).status_code == 200
+
+        self.db.delete(self.db.get(User, self.user.id))
+        self.db.commit()
+
+        assert self.client.get('/api/assignment/', headers=headers).status_code == 404
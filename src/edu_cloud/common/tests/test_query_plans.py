@@ -0,0 +1,72 @@
+"""
+列表查询索引测试：用 EXPLAIN QUERY PLAN 确认热点列表查询走索引，而不是全表扫描或临时排序
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, or_, select, text
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.assignment.models import Assignment
+from src.edu_cloud.course.models import Course, CourseResource
+from src.edu_cloud.discussion.models import DiscussionTopic, DiscussionPost
+from src.edu_cloud.notification.models import Notification
+import src.edu_cloud.user.models  # noqa: F401  注册 users 表（外键依赖）
+import src.edu_cloud.common.models  # noqa: F401
+
+CURSOR_TIME = datetime(2025, 1, 1)
+
+LIST_QUERIES = {
+    "作业列表": select(Assignment).where(Assignment.owner_id == 1, Assignment.deadline.isnot(None))
+        .order_by(Assignment.deadline.desc(), Assignment.id.desc()),
+    "作业列表无截止时间段": select(Assignment)
+        .where(Assignment.owner_id == 1, Assignment.deadline.is_(None), Assignment.id < 100)
+        .order_by(Assignment.id.desc()),
+    "作业列表下一页": select(Assignment)
+        .where(Assignment.owner_id == 1, Assignment.deadline <= CURSOR_TIME,
+               or_(Assignment.deadline < CURSOR_TIME, Assignment.id < 100))
+        .order_by(Assignment.deadline.desc(), Assignment.id.desc()),
+    "作业总数": select(func.count(Assignment.id)).where(Assignment.owner_id == 1),
+    "课程作业列表": select(Assignment)
+        .where(Assignment.owner_id == 1, Assignment.course_name == "课程", Assignment.deadline.isnot(None))
+        .order_by(Assignment.deadline.desc(), Assignment.id.desc()),
+    "公告列表": select(Notification).where(Notification.owner_id == 1, Notification.publish_time.isnot(None))
+        .order_by(Notification.publish_time.desc(), Notification.id.desc()),
+    "公告列表无发布时间段": select(Notification)
+        .where(Notification.owner_id == 1, Notification.publish_time.is_(None), Notification.id < "n100")
+        .order_by(Notification.id.desc()),
+    "公告列表下一页": select(Notification)
+        .where(Notification.owner_id == 1, Notification.publish_time <= CURSOR_TIME,
+               or_(Notification.publish_time < CURSOR_TIME, Notification.id < "n100"))
+        .order_by(Notification.publish_time.desc(), Notification.id.desc()),
+    "公告总数": select(func.count(Notification.id)).where(Notification.owner_id == 1),
+    "课程公告列表": select(Notification)
+        .where(Notification.owner_id == 1, Notification.title == "课程")
+        .order_by(Notification.publish_time.desc()),
+    "课程列表": select(Course).where(Course.owner_id == 1),
+    "按课程名查课程": select(Course).where(Course.owner_id == 1, Course.name == "课程"),
+    "课程资源列表": select(CourseResource).where(CourseResource.course_id == "s1"),
+    "讨论列表": select(DiscussionTopic)
+        .where(DiscussionTopic.course_id == "s1", DiscussionTopic.created_at.isnot(None))
+        .order_by(DiscussionTopic.created_at.desc(), DiscussionTopic.id.desc()),
+    "回复列表": select(DiscussionPost).where(DiscussionPost.topic_id == "t1").order_by(DiscussionPost.floor.asc()),
+}
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.mark.parametrize("name", list(LIST_QUERIES))
+def test_list_query_uses_index(engine, name):
+    sql = str(LIST_QUERIES[name].compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    assert plan, name
+    for detail in plan:
+        assert "USING" in detail and "INDEX" in detail, f"{name} 未使用索引: {plan}"
+        assert "TEMP B-TREE" not in detail, f"{name} 需要临时排序: {plan}"
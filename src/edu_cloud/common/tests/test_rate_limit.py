@@ -0,0 +1,118 @@
+"""
+UCloud 请求限流测试（不访问网络，用假响应代替 HTTP 请求）
+"""
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from src.edu_cloud.common.rate_limit import RateLimitTimeout, TokenBucket, UpstreamLimiter
+from src.edu_cloud.common.ucloud_session import UCloudSession
+
+URL = "https://apiucloud.bupt.edu.cn/ykt-site/site/list/student/current"
+
+
+def fake_response(status_code, headers=None):
+    return MagicMock(status_code=status_code, headers=headers or {})
+
+
+def make_limiter(**kwargs):
+    options = dict(rate=1000, burst=1000, max_in_flight=32, max_in_flight_per_user=8,
+                   max_retries=3, backoff_base=0.001, backoff_max=0.01, acquire_timeout=5)
+    options.update(kwargs)
+    return UpstreamLimiter(**options)
+
+
+def test_token_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # 前 2 个来自突发额度，后 3 个按 50/s 补充，约 60ms
+    assert time.monotonic() - start >= 0.05
+
+    slow = TokenBucket(rate=0.5, burst=1)
+    slow.acquire()
+    with pytest.raises(RateLimitTimeout):
+        slow.acquire(timeout=0.01)
+
+
+def test_retries_429_and_5xx_then_returns_success():
+    limiter = make_limiter()
+    responses = iter([fake_response(429), fake_response(503), fake_response(200)])
+
+    resp = limiter.call(URL, lambda: next(responses))
+
+    assert resp.status_code == 200
+    host = limiter.stats()["hosts"]["apiucloud.bupt.edu.cn"]
+    assert host["requests"] == 3
+    assert host["retries"] == 2
+    assert host["throttled"] == 1
+    assert host["server_errors"] == 1
+
+
+def test_throttle_halves_rate_and_success_recovers():
+    limiter = make_limiter(rate=100, max_retries=0)
+    limiter.call(URL, lambda: fake_response(429))
+    assert limiter.stats()["hosts"]["apiucloud.bupt.edu.cn"]["rate"] == 50
+
+    limiter.call(URL, lambda: fake_response(200))
+    assert limiter.stats()["hosts"]["apiucloud.bupt.edu.cn"]["rate"] == 55
+
+
+def test_gives_up_after_max_retries():
+    limiter = make_limiter(max_retries=2)
+    send = MagicMock(return_value=fake_response(502))
+    assert limiter.call(URL, send).status_code == 502
+    assert send.call_count == 3
+
+    failing = MagicMock(side_effect=requests.ConnectionError("reset"))
+    with pytest.raises(requests.ConnectionError):
+        limiter.call(URL, failing)
+    assert failing.call_count == 3
+
+
+def test_retry_after_header_is_respected():
+    limiter = make_limiter(backoff_max=5)
+    assert limiter._backoff(0, fake_response(429, {"Retry-After": "2"})) == 2
+    assert limiter._backoff(0, fake_response(429, {"Retry-After": "60"})) == 5
+
+
+def test_per_user_in_flight_cap():
+    limiter = make_limiter(max_in_flight_per_user=2)
+    lock = threading.Lock()
+    current = {"now": 0, "max": 0}
+
+    def send():
+        with lock:
+            current["now"] += 1
+            current["max"] = max(current["max"], current["now"])
+        time.sleep(0.02)
+        with lock:
+            current["now"] -= 1
+        return fake_response(200)
+
+    threads = [threading.Thread(target=limiter.call, args=(URL, send), kwargs={"user_key": "2023000000"})
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert current["max"] == 2
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_ucloud_session_requests_go_through_limiter():
+    raw_session = MagicMock()
+    raw_session.request.return_value = fake_response(200)
+    ucloud = UCloudSession(raw_session, "fake-user-id", "2023000000")
+
+    with patch("src.edu_cloud.common.ucloud_session.upstream_limiter") as limiter:
+        limiter.call.side_effect = lambda url, send, user_key=None: send()
+        ucloud.get(URL, params={"userId": "fake-user-id"})
+
+    assert limiter.call.call_args.kwargs["user_key"] == "2023000000"
+    raw_session.request.assert_called_once_with("GET", URL, params={"userId": "fake-user-id"})
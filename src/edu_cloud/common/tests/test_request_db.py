@@ -0,0 +1,112 @@
+"""
+请求级数据库会话测试
+"""
+import json
+from unittest.mock import patch
+
+from flask import Flask
+
+from main import create_app
+from src.edu_cloud.common import database, request_db
+from src.edu_cloud.common.auth import identity_cache
+from src.edu_cloud.common.config import settings
+from src.edu_cloud.common.database import SessionLocal
+from src.edu_cloud.common.request_db import RequestDB, get_request_db, request_db_stats
+from src.edu_cloud.common.security import get_password_hash
+from src.edu_cloud.common.token_manager import revocation_cache
+from src.edu_cloud.user.models import User
+
+
+def test_one_lazy_session_per_request_closed_at_teardown():
+    app = Flask(__name__)
+    RequestDB(app)
+    sessions = []
+
+    @app.route("/db")
+    def use_db():
+        first = get_request_db()
+        assert get_request_db() is first
+        first.query(User).count()
+        sessions.append(first)
+        return {"stats": request_db_stats()}
+
+    @app.route("/no-db")
+    def no_db():
+        return {"stats": request_db_stats()}
+
+    client = app.test_client()
+    with patch.object(request_db.database, "SessionLocal", wraps=database.SessionLocal) as factory:
+        stats = client.get("/db").get_json()["stats"]
+        assert factory.call_count == 1
+        assert client.get("/no-db").get_json()["stats"]["sessions"] == 0
+        assert factory.call_count == 1
+
+    assert stats["sessions"] == 1
+    assert stats["connections"] == 1
+    assert stats["statements"] >= 1
+    # 请求结束后会话已关闭，不再占用连接
+    assert not sessions[0].in_transaction()
+
+
+class TestRequestDBApp:
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.db = SessionLocal()
+        self.db.add(User(username='requestdbuser', email='requestdb@example.com',
+                         hashed_password=get_password_hash('testpass123'), is_active=True))
+        self.db.commit()
+        identity_cache.clear()
+
+    def teardown_method(self):
+        self.db.query(User).filter(User.username == 'requestdbuser').delete()
+        self.db.commit()
+        self.db.close()
+        identity_cache.clear()
+        revocation_cache.clear()
+
+    def login(self):
+        response = self.client.post('/api/user/login',
+                                    data=json.dumps({'username': 'requestdbuser', 'password': 'testpass123'}),
+                                    content_type='application/json')
+        return json.loads(response.data)['access_token']
+
+    def test_auth_and_view_share_one_connection(self):
+        headers = {'Authorization': f'Bearer {self.login()}'}
+        # 先请求一次，让撤销缓存完成加载（它定期用自己的会话刷新）
+        self.client.get('/api/user/me', headers=headers)
+        identity_cache.clear()
+
+        with patch.object(settings, 'request_db_stats_headers', True):
+            response = self.client.get('/api/user/me', headers=headers)
+
+        assert response.status_code == 200
+        # 身份缓存未命中的查询和视图查询共用请求级会话
+        assert response.headers['X-DB-Connections'] == '1'
+        assert int(response.headers['X-DB-Statements']) >= 2
+
+    def test_stats_headers_disabled_by_default(self):
+        response = self.client.get('/api/assignment/', headers={'Authorization': f'Bearer {self.login()}'})
+        assert response.status_code == 200
+        assert 'X-DB-Connections' not in response.headers
+
+    def test_sync_view_releases_connection_before_scrape(self):
+        headers = {'Authorization': f'Bearer {self.login()}'}
+        in_transaction = []
+
+        def fake_sync(db, user_id, cas_user, cas_pass):
+            # 抓取开始时请求级会话不应再占着连接
+            in_transaction.append(db.in_transaction())
+            return 0, 0, 0
+
+        with patch('src.edu_cloud.assignment.api.AssignmentService.sync_assignments', side_effect=fake_sync), \
+                patch('src.edu_cloud.assignment.api.single_flight',
+                      side_effect=lambda user_id, scope, fn, **kwargs: (fn(), False)):
+            response = self.client.post('/api/assignment/sync', headers=headers,
+                                        data=json.dumps({'school_username': 'u', 'school_password': 'p'}),
+                                        content_type='application/json')
+
+        assert response.status_code == 200
+        assert in_transaction == [False]
@@ -0,0 +1,168 @@
+"""
+token 撤销缓存测试（内存数据库）
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.edu_cloud.common import token_manager
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.common.token_manager import (
+    RevocationCache, add_user_tombstone, is_token_revoked, revoke_all_user_tokens, revoke_token
+)
+from src.edu_cloud.user.models import TokenBlacklist, User
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def add_blacklist(db, jti, expires_in):
+    now = datetime.now(timezone.utc)
+    db.add(TokenBlacklist(jti=jti, token_type="access", username="tester",
+                          revoked_at=now, expires_at=(now + expires_in).replace(tzinfo=None)))
+    db.commit()
+
+
+def test_checks_hit_memory_between_refreshes(engine, session_factory):
+    db = session_factory()
+    add_blacklist(db, "revoked-jti", timedelta(minutes=10))
+    add_blacklist(db, "expired-jti", timedelta(minutes=-10))
+    cache = RevocationCache(session_factory, refresh_seconds=60)
+    statements = count_queries(engine)
+
+    assert cache.is_revoked("revoked-jti")
+    assert not cache.is_revoked("expired-jti")
+    for _ in range(100):
+        assert not cache.is_revoked("fresh-jti")
+
+    # 只有首次加载的两次查询（黑名单 + token 代数）
+    assert len(statements) == 2
+    # 校验路径不删除过期记录
+    assert db.query(TokenBlacklist).count() == 2
+
+
+def test_revocations_from_other_workers_seen_after_refresh(session_factory):
+    cache = RevocationCache(session_factory, refresh_seconds=0.05)
+    assert not cache.is_revoked("other-jti")
+
+    add_blacklist(session_factory(), "other-jti", timedelta(minutes=10))
+    assert not cache.is_revoked("other-jti")
+
+    with patch.object(token_manager.time, "time", return_value=token_manager.time.time() + 1):
+        assert cache.is_revoked("other-jti")
+
+
+def test_local_revocation_is_immediate(session_factory):
+    cache = RevocationCache(session_factory, refresh_seconds=60)
+    assert not cache.is_revoked("my-jti")
+
+    with patch.object(token_manager, "revocation_cache", cache):
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
+        assert revoke_token(session_factory(), "my-jti", "tester", expires_at=expires_at)
+
+    assert cache.is_revoked("my-jti")
+    assert is_token_revoked(session_factory(), "my-jti")
+
+
+def test_first_load_failure_treats_token_as_revoked():
+    def broken():
+        raise RuntimeError("database unavailable")
+
+    cache = RevocationCache(broken, refresh_seconds=60)
+    assert cache.is_revoked("any-jti")
+
+
+def test_revoke_all_bumps_generation_with_single_update(engine, session_factory):
+    db = session_factory()
+    db.add(User(id=1, username="tester", hashed_password="x"))
+    db.commit()
+    cache = RevocationCache(session_factory, refresh_seconds=60)
+    assert not cache.is_revoked("old-jti", "tester", 0)
+
+    statements = count_queries(engine)
+    with patch.object(token_manager, "revocation_cache", cache):
+        assert revoke_all_user_tokens(db, "tester") == 1
+
+    assert sum(1 for sql in statements if sql.startswith("UPDATE")) == 1
+    assert db.query(TokenBlacklist).count() == 0
+    # 旧 token（代数 0）立即失效，新 token（代数 1）有效
+    assert cache.is_revoked("old-jti", "tester", 0)
+    assert not cache.is_revoked("new-jti", "tester", 1)
+    assert not cache.is_revoked("other-jti", "someone-else", 0)
+
+
+def test_generations_loaded_from_db_and_dropped_when_user_recreated(session_factory):
+    db = session_factory()
+    db.add(User(id=1, username="tester", hashed_password="x", token_generation=2))
+    db.commit()
+    cache = RevocationCache(session_factory, refresh_seconds=0.05)
+    assert cache.is_revoked("jti", "tester", 1)
+    assert not cache.is_revoked("jti", "tester", 2)
+
+    # 用户被删除（写入墓碑）后以同名重建，代数从 0 开始，增量刷新即可看到
+    add_user_tombstone(db, 1, "tester")
+    db.query(User).delete()
+    db.add(User(id=2, username="tester", hashed_password="x"))
+    db.commit()
+    with patch.object(token_manager.time, "time", return_value=token_manager.time.time() + 1):
+        assert not cache.is_revoked("jti", "tester", 0)
+    assert cache.reconciles == 1
+
+
+def test_refresh_loads_only_deltas_between_reconciles(engine, session_factory):
+    db = session_factory()
+    db.add(User(id=1, username="tester", hashed_password="x"))
+    db.commit()
+    cache = RevocationCache(session_factory, refresh_seconds=0.05, reconcile_seconds=60)
+    assert not cache.is_revoked("other-jti")
+
+    add_blacklist(db, "other-jti", timedelta(minutes=10))
+    revoke_all_user_tokens(session_factory(), "tester")
+    statements = count_queries(engine)
+    with patch.object(token_manager.time, "time", return_value=token_manager.time.time() + 1):
+        assert cache.is_revoked("other-jti")
+        assert cache.is_revoked("jti", "tester", 0)
+
+    # 增量刷新按撤销时间 / 代数变化时间的索引查询，不扫描所有非 0 代数的用户
+    assert len(statements) == 2
+    assert "revoked_at >=" in statements[0]
+    assert "token_generation_updated_at >=" in statements[1]
+    assert cache.reconciles == 1
+
+
+def test_reconcile_reloads_everything_periodically(session_factory):
+    cache = RevocationCache(session_factory, refresh_seconds=0.05, reconcile_seconds=10)
+    assert not cache.is_revoked("late-jti")
+
+    # 撤销时间早于高水位窗口的记录（例如时钟偏差很大的节点写入的）增量刷新看不到，对账时补上
+    now = datetime.now(timezone.utc)
+    db = session_factory()
+    db.add(TokenBlacklist(jti="late-jti", token_type="access", username="tester",
+                          revoked_at=now - timedelta(minutes=5),
+                          expires_at=(now + timedelta(minutes=10)).replace(tzinfo=None)))
+    db.commit()
+    with patch.object(token_manager.time, "time", return_value=now.timestamp() + 1):
+        assert not cache.is_revoked("late-jti")
+    with patch.object(token_manager.time, "time", return_value=now.timestamp() + 11):
+        assert cache.is_revoked("late-jti")
+    assert cache.reconciles == 2
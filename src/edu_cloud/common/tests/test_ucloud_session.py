@@ -0,0 +1,151 @@
+"""
+UCloudSession 共享会话测试（不访问网络）
+"""
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.edu_cloud.common import database
+from src.edu_cloud.common.models import UCloudSessionRecord
+from src.edu_cloud.common.ucloud_session import UCloudSession, UCloudSessionCache, session_cache
+from src.edu_cloud.assignment.scraper import AssignmentScraper
+from src.edu_cloud.course.scraper import CourseScraper
+from src.edu_cloud.discussion.scraper import DiscussionScraper
+from src.edu_cloud.notification.scraper import NotificationScraper
+
+
+def make_fake_ucloud():
+    raw_session = MagicMock()
+    raw_session.access_token = "fake-token"
+    return UCloudSession(raw_session, "fake-user-id", "2023000000")
+
+
+def test_from_auth_extracts_user_id():
+    raw_session = MagicMock()
+    raw_session.cookies = {"iClass-uuid": "uuid-1"}
+    auth = MagicMock()
+    auth.get_UCloud.return_value = raw_session
+
+    ucloud = UCloudSession.from_auth(auth, "2023000000")
+
+    assert ucloud.user_id == "uuid-1"
+    assert auth.get_UCloud.call_count == 1
+
+
+def test_restore_uses_bearer_header_like_fresh_session():
+    ucloud = UCloudSession.restore("2023000000", "uuid-1", "stored-token", "[]", time.time() + 60)
+
+    assert ucloud.session.headers["Blade-Auth"] == "bearer stored-token"
+    assert ucloud.auth_headers() == {"Blade-Auth": "bearer stored-token"}
+
+
+def test_scrapers_reuse_shared_session_without_login():
+    ucloud = make_fake_ucloud()
+    with patch.object(UCloudSession, "login") as login:
+        for scraper_cls in (AssignmentScraper, CourseScraper, DiscussionScraper, NotificationScraper):
+            scraper = scraper_cls(ucloud=ucloud)
+            scraper._login()
+            assert scraper.user_id == "fake-user-id"
+            assert scraper._get_headers()["Blade-Auth"] == "bearer fake-token"
+        login.assert_not_called()
+
+
+def test_scraper_logs_in_when_no_shared_session():
+    session_cache.clear()
+    ucloud = make_fake_ucloud()
+    with patch.object(UCloudSession, "login", return_value=ucloud) as login:
+        scraper = AssignmentScraper("2023000000", "secret")
+        scraper._login()
+        login.assert_called_once_with("2023000000", "secret")
+        assert scraper.ucloud is ucloud
+    session_cache.clear()
+
+
+def test_cache_reuses_session_for_same_credentials():
+    cache = UCloudSessionCache(store="memory")
+    with patch.object(UCloudSession, "login", side_effect=lambda u, p: make_fake_ucloud()) as login:
+        first = cache.acquire("2023000000", "secret")
+        second = cache.acquire("2023000000", "secret")
+        assert first is second
+        assert login.call_count == 1
+
+        # 密码不一致时不能复用别人的会话
+        third = cache.acquire("2023000000", "wrong")
+        assert third is not first
+        assert login.call_count == 2
+
+
+def test_cache_relogins_after_expiry():
+    cache = UCloudSessionCache(store="memory")
+    with patch.object(UCloudSession, "login", side_effect=lambda u, p: make_fake_ucloud()) as login:
+        first = cache.acquire("2023000000", "secret")
+        first.expires_at = 0
+        second = cache.acquire("2023000000", "secret")
+        assert second is not first
+        assert login.call_count == 2
+
+
+def test_request_relogins_once_on_401():
+    cache = UCloudSessionCache(store="memory")
+    stale = make_fake_ucloud()
+    stale.session.request.return_value = MagicMock(status_code=401)
+    fresh = make_fake_ucloud()
+    fresh.session.access_token = "fresh-token"
+    fresh.session.request.return_value = MagicMock(status_code=200)
+
+    with patch.object(UCloudSession, "login", side_effect=[stale, fresh]):
+        ucloud = cache.acquire("2023000000", "secret")
+        resp = ucloud.get("https://example.invalid", headers={"Blade-Auth": "bearer fake-token"})
+
+    assert resp.status_code == 200
+    assert ucloud.access_token == "fresh-token"
+    _, kwargs = fresh.session.request.call_args
+    assert kwargs["headers"]["Blade-Auth"] == "bearer fresh-token"
+
+
+def test_warm_async_does_not_block_and_acquire_reuses_it():
+    cache = UCloudSessionCache(store="memory")
+    release = threading.Event()
+    raw_session = MagicMock()
+    raw_session.cookies = {"iClass-uuid": "uuid-1"}
+    auth = MagicMock()
+    auth.get_UCloud.side_effect = lambda: release.wait(5) and raw_session
+
+    start = time.monotonic()
+    thread = cache.warm_async(auth, "2023000000", "secret")
+    # OAuth 往返在后台进行，调用方立即返回
+    assert time.monotonic() - start < 0.5
+    while not auth.get_UCloud.called:  # 后台线程已持有账号锁、正在换取会话
+        time.sleep(0.001)
+
+    with patch.object(UCloudSession, "login") as login:
+        release.set()
+        ucloud = cache.acquire("2023000000", "secret")
+        thread.join()
+        login.assert_not_called()
+    assert ucloud.user_id == "uuid-1"
+
+
+def test_database_store_encrypts_token_and_cookies():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    UCloudSessionRecord.__table__.create(engine)
+    ucloud = UCloudSession.restore("2023000000", "uuid-1", "secret-token",
+                                   '[{"name": "iClass-uuid", "value": "secret-cookie", "domain": "ucloud.bupt.edu.cn"}]', time.time() + 60)
+
+    with patch.object(database, "SessionLocal", sessionmaker(bind=engine)):
+        UCloudSessionCache(store="database").put(ucloud, "secret")
+        with engine.connect() as conn:
+            access_token, cookies = conn.execute(text("SELECT access_token, cookies FROM ucloud_sessions")).one()
+        assert "secret-token" not in access_token
+        assert "secret-cookie" not in cookies
+
+        # 另一个 worker（空的内存缓存）从数据库还原会话，不需要登录
+        with patch.object(UCloudSession, "login") as login:
+            restored = UCloudSessionCache(store="database").acquire("2023000000", "secret")
+            login.assert_not_called()
+    assert restored.access_token == "secret-token"
+    assert restored.session.cookies.get("iClass-uuid") == "secret-cookie"
@@ -0,0 +1,71 @@
+"""
+写入队列测试：写入单元在单独的写线程中串行执行，异常回传给提交方
+"""
+import threading
+import time
+
+import pytest
+
+from src.edu_cloud.common.write_queue import WriteQueue
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+
+    def close(self):
+        pass
+
+
+def test_units_run_serially_on_writer_thread():
+    log = []
+    q = WriteQueue(session_factory=lambda: FakeSession(log))
+    active = []
+    max_active = []
+    lock = threading.Lock()
+
+    def unit(db):
+        with lock:
+            active.append(1)
+            max_active.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.pop()
+        return threading.current_thread().name
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(q.run(unit, label="unit"))) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    q.stop()
+
+    assert results == ["db-writer"] * 6
+    assert max(max_active) == 1
+    assert log.count("commit") == 6
+    stats = q.stats()
+    assert stats["completed"] == 6
+    assert stats["by_unit"]["unit"]["count"] == 6
+    assert stats["lock_hold_ms"]["max"] >= 10
+
+
+def test_failed_unit_rolls_back_and_raises_to_caller():
+    log = []
+    q = WriteQueue(session_factory=lambda: FakeSession(log))
+
+    def unit(db):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        q.run(unit)
+    q.stop()
+
+    assert log == ["rollback"]
+    assert q.stats()["failed"] == 1
@@ -1,18 +1,271 @@
 """
 Token管理模块，用于处理JWT token的撤销和黑名单检查
 """
-from datetime import datetime, timezone
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
 from flask_jwt_extended import get_jwt, get_jwt_identity
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 import logging
+import threading
+import time
 
-from ..user.models import TokenBlacklist
+from .config import settings
+from ..user.models import TokenBlacklist, User
 
 logger = logging.getLogger(__name__)
 
 
+TOMBSTONE_TOKEN_TYPE = "user_deleted"  # 删除用户时写入黑名单的墓碑记录
+
+
+def _merge_tombstone(tombstones: Dict[int, Tuple[float, float]], user_id: int, deleted_at: float, expires: float):
+    """同一用户 ID 多次删除（SQLite 会复用最大的 ID）时保留最晚的删除时间"""
+    current = tombstones.get(user_id)
+    if current is None or deleted_at > current[0]:
+        tombstones[user_id] = (deleted_at, max(expires, current[1]) if current else expires)
+
+
+def _naive_utc(timestamp: float) -> datetime:
+    """时间戳转为与数据库比较用的 naive UTC 时间"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    """数据库中的时间按 UTC 处理（SQLite 读出的是 naive datetime）"""
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationCache:
+    """
+    进程内的 token 撤销缓存
+    - 保存未过期的已撤销 JTI（jti -> 过期时间戳）和用户的 token 代数（username -> token_generation），
+      每次校验只查内存
+    - 每隔 refresh_seconds 增量刷新：只加载撤销时间 / 代数变化时间晚于高水位的记录（按 revoked_at /
+      token_generation_updated_at 索引查询），其他 worker / 节点的撤销最多延迟 refresh_seconds 生效
+    - 每隔 reconcile_seconds 完整重新加载一次（对账），顺带丢弃已过期的记录
+    - 已删除用户的墓碑记录（user_id -> (删除时间戳, 过期时间戳)）：删除前签发的、带该 uid 声明的 token 均已撤销
+    - 本进程内的撤销（revoke_token / revoke_all_user_tokens / 删除用户）立即写入缓存
+    - 校验路径不再删除过期记录，清理由 cleanup_expired_tokens 完成
+    """
+
+    # 增量加载时高水位往回多查的秒数：覆盖提交晚于记录时间的事务和节点间的时钟偏差
+    DELTA_OVERLAP_SECONDS = 30.0
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None,
+                 refresh_seconds: float = settings.token_revocation_refresh_seconds,
+                 reconcile_seconds: float = settings.token_revocation_reconcile_seconds):
+        self.session_factory = session_factory
+        self.refresh_seconds = refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self._revoked: Dict[str, float] = {}
+        self._generations: Dict[str, int] = {}
+        self._local_generations: Dict[str, Tuple[int, float]] = {}  # username -> (代数, 写入时间)
+        self._tombstones: Dict[int, Tuple[float, float]] = {}
+        self._loaded_at: Optional[float] = None
+        self._reconciled_at: Optional[float] = None
+        self._high_water: float = 0.0  # 已加载记录中最晚的撤销 / 代数变化时间
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.checks = 0
+        self.refreshes = 0
+        self.reconciles = 0
+
+    def _session(self) -> Session:
+        if self.session_factory is not None:
+            return self.session_factory()
+        from .database import SessionLocal
+        return SessionLocal()
+
+    def refresh(self):
+        """从数据库刷新撤销记录：距上次对账超过 reconcile_seconds 时完整加载，否则只加载增量"""
+        now = time.time()
+        if self._reconciled_at is None or now - self._reconciled_at >= self.reconcile_seconds:
+            self._reload(now)
+        else:
+            self._load_delta(now)
+
+    def _reload(self, now: float):
+        """完整重新加载未过期的撤销记录和非 0 的 token 代数"""
+        db = self._session()
+        try:
+            rows = db.query(TokenBlacklist.jti, TokenBlacklist.expires_at,
+                            TokenBlacklist.token_type, TokenBlacklist.revoked_at).filter(
+                TokenBlacklist.expires_at > _naive_utc(now)
+            ).all()
+            generation_rows = db.query(User.username, User.token_generation,
+                                       User.token_generation_updated_at).filter(
+                User.token_generation > 0
+            ).all()
+        finally:
+            db.close()
+        revoked = {}
+        tombstones = {}
+        for jti, expires_at, token_type, revoked_at in rows:
+            if token_type == TOMBSTONE_TOKEN_TYPE:
+                _merge_tombstone(tombstones, int(jti.split(":")[1]), _timestamp(revoked_at), _timestamp(expires_at))
+            else:
+                revoked[jti] = _timestamp(expires_at)
+        generations = {username: generation for username, generation, _ in generation_rows}
+        high_water = max([_timestamp(row[3]) for row in rows] + [_timestamp(row[2]) for row in generation_rows],
+                         default=now)
+        with self._lock:
+            # 加载期间本进程新撤销的 token 不能丢
+            for jti, expires in self._revoked.items():
+                if expires > now:
+                    revoked.setdefault(jti, expires)
+            for user_id, (deleted_at, expires) in self._tombstones.items():
+                if expires > now:
+                    _merge_tombstone(tombstones, user_id, deleted_at, expires)
+            # 本进程的代数变化在写入缓存前已提交；加载开始前写入的已包含在查询结果中，
+            # 只保留加载期间写入的（用户被删除后重建时不会沿用旧代数）
+            self._local_generations = {
+                username: (generation, set_at)
+                for username, (generation, set_at) in self._local_generations.items()
+                if set_at >= now
+            }
+            for username, (generation, _) in self._local_generations.items():
+                if generation > generations.get(username, 0):
+                    generations[username] = generation
+            self._revoked = revoked
+            self._tombstones = tombstones
+            self._generations = generations
+            self._high_water = max(self._high_water, high_water)
+            self._loaded_at = now
+            self._reconciled_at = now
+            self.refreshes += 1
+            self.reconciles += 1
+
+    def _load_delta(self, now: float):
+        """只加载高水位之后新增的撤销记录和代数变化（往回多查 DELTA_OVERLAP_SECONDS，重复的记录合并时去重）"""
+        since = _naive_utc(self._high_water - self.DELTA_OVERLAP_SECONDS)
+        db = self._session()
+        try:
+            rows = db.query(TokenBlacklist.jti, TokenBlacklist.expires_at,
+                            TokenBlacklist.token_type, TokenBlacklist.revoked_at,
+                            TokenBlacklist.username).filter(
+                TokenBlacklist.revoked_at >= since,
+                TokenBlacklist.expires_at > _naive_utc(now)
+            ).all()
+            generation_rows = db.query(User.username, User.token_generation,
+                                       User.token_generation_updated_at).filter(
+                User.token_generation_updated_at >= since
+            ).all()
+        finally:
+            db.close()
+        high_water = max([_timestamp(row[3]) for row in rows] + [_timestamp(row[2]) for row in generation_rows],
+                         default=0.0)
+        with self._lock:
+            revoked = {jti: expires for jti, expires in self._revoked.items() if expires > now}
+            tombstones = {user_id: value for user_id, value in self._tombstones.items() if value[1] > now}
+            generations = dict(self._generations)
+            for jti, expires_at, token_type, revoked_at, username in rows:
+                if token_type == TOMBSTONE_TOKEN_TYPE:
+                    _merge_tombstone(tombstones, int(jti.split(":")[1]), _timestamp(revoked_at), _timestamp(expires_at))
+                    # 用户已删除，同名重建的用户代数从 0 开始（重建后的代数变化更晚，下面会重新写入）
+                    generations.pop(username, None)
+                else:
+                    revoked[jti] = _timestamp(expires_at)
+            for username, generation, _ in generation_rows:
+                if generation > generations.get(username, 0):
+                    generations[username] = generation
+            self._revoked = revoked
+            self._tombstones = tombstones
+            self._generations = generations
+            self._high_water = max(self._high_water, high_water)
+            self._loaded_at = now
+            self.refreshes += 1
+
+    def _ensure_fresh(self):
+        """缓存过期时刷新；首次加载必须等待，之后只由一个线程刷新，其他线程继续使用旧数据"""
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.time() - loaded_at < self.refresh_seconds:
+            return
+        if loaded_at is None:
+            with self._refresh_lock:
+                if self._loaded_at is None:
+                    self.refresh()
+            return
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing token revocation cache: {str(e)}")
+            finally:
+                self._refresh_lock.release()
+
+    def add(self, jti: str, expires_at: Optional[datetime]):
+        """记录本进程内的撤销（立即生效）"""
+        with self._lock:
+            self._revoked[jti] = _timestamp(expires_at) or time.time() + settings.access_token_expire_minutes * 60
+
+    def add_tombstone(self, user_id: int, deleted_at: datetime, expires_at: datetime):
+        """记录本进程内删除的用户（立即生效）"""
+        with self._lock:
+            _merge_tombstone(self._tombstones, user_id, _timestamp(deleted_at), _timestamp(expires_at))
+
+    def set_generation(self, username: str, generation: int):
+        """记录本进程内的 token 代数变化（立即生效）"""
+        with self._lock:
+            self._local_generations[username] = (generation, time.time())
+            if generation > self._generations.get(username, 0):
+                self._generations[username] = generation
+
+    def is_revoked(self, jti: str, username: Optional[str] = None, generation: int = 0,
+                   user_id: Optional[int] = None, issued_at: Optional[float] = None) -> bool:
+        """
+        检查 token 是否已撤销（只查内存）：JTI 在黑名单中、token 代数低于用户当前代数，
+        或 token 签发于 user_id 对应用户被删除之前（之后以同一 ID 新建的用户不受影响）。
+        JWT 的 iat 精确到秒，删除当秒签发的 token 不按墓碑撤销（避免误伤当秒以同一 ID 新建的用户），由身份查询拒绝
+        首次加载失败时为了安全起见认为已撤销
+        """
+        try:
+            self._ensure_fresh()
+        except Exception as e:
+            logger.error(f"Error loading token revocation cache: {str(e)}")
+            return True
+        self.checks += 1
+        if username is not None and (generation or 0) < self._generations.get(username, 0):
+            return True
+        now = time.time()
+        tombstone = self._tombstones.get(user_id) if user_id is not None else None
+        if tombstone is not None and tombstone[1] > now and (issued_at or 0) < int(tombstone[0]):
+            return True
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > now
+
+    def clear(self):
+        with self._lock:
+            self._revoked = {}
+            self._tombstones = {}
+            self._generations = {}
+            self._local_generations = {}
+            self._loaded_at = None
+            self._reconciled_at = None
+            self._high_water = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "revoked_tokens": len(self._revoked),
+            "revoked_generations": len(self._generations),
+            "deleted_users": len(self._tombstones),
+            "checks": self.checks,
+            "refreshes": self.refreshes,
+            "reconciles": self.reconciles,
+            "age_seconds": round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+        }
+
+
+# 全局撤销缓存实例（JWT token_in_blocklist_loader 使用）
+revocation_cache = RevocationCache()
+
+
 def revoke_token(db: Session, jti: str, username: str, token_type: str = "access", expires_at: Optional[datetime] = None) -> bool:
     """
     将token加入黑名单
@@ -45,6 +298,7 @@ def revoke_token(db: Session, jti: str, username: str, token_type: str = "access
         
         db.add(blacklist_entry)
         db.commit()
+        revocation_cache.add(jti, blacklist_entry.expires_at)
         logger.info(f"Token {jti} has been revoked for user {username}")
         return True
         
@@ -59,7 +313,7 @@ def revoke_token(db: Session, jti: str, username: str, token_type: str = "access
 
 def is_token_revoked(db: Session, jti: str) -> bool:
     """
-    检查token是否已被撤销
+    检查token是否已被撤销（直接查询数据库；请求校验使用 revocation_cache.is_revoked）
     
     Args:
         db: 数据库会话
@@ -74,13 +328,8 @@ def is_token_revoked(db: Session, jti: str) -> bool:
         ).first()
         
         if blacklist_entry:
-            # 检查token是否已过期，如果过期则可以从黑名单中删除（可选）
-            if blacklist_entry.expires_at < datetime.now(timezone.utc):
-                # 可选：清理过期的黑名单记录
-                db.delete(blacklist_entry)
-                db.commit()
-                return False
-            return True
+            # 已过期的记录不影响结果（过期 token 本身无法通过校验），由 cleanup_expired_tokens 清理
+            return _timestamp(blacklist_entry.expires_at) > time.time()
         
         return False
         
@@ -127,34 +376,67 @@ def revoke_current_token(db: Session) -> bool:
         return False
 
 
+def add_user_tombstone(db: Session, user_id: int, username: str) -> TokenBlacklist:
+    """
+    删除用户时写入墓碑记录（不提交，与删除用户在同一事务中提交；提交后调用 revocation_cache.add_tombstone 立即生效）
+    用户行被删除后其他 worker 加载不到它的 token 代数，所以删除用户不能靠 revoke_all_user_tokens；
+    墓碑记录在黑名单表中，其他 worker 最多 refresh_seconds 后拒绝该用户删除前签发的、带 uid 声明的 token
+    （不带 uid 的旧 token 由身份查询拒绝）。有效期为 access token 有效期，之前签发的 token 届时都已过期
+    """
+    now = datetime.now(timezone.utc)
+    entry = TokenBlacklist(
+        jti=f"user:{user_id}:{now.timestamp():.6f}",
+        token_type=TOMBSTONE_TOKEN_TYPE,
+        username=username,
+        revoked_at=now,
+        expires_at=(now + timedelta(minutes=settings.access_token_expire_minutes)).replace(tzinfo=None)
+    )
+    db.add(entry)
+    return entry
+
+
+def bump_token_generation(user: User):
+    """
+    把用户的 token_generation 加 1（不提交，与修改密码等操作在同一事务中提交）
+    提交后 user.token_generation 即新代数，再调用 revocation_cache.set_generation 让本进程立即生效
+    """
+    user.token_generation = User.token_generation + 1
+    user.token_generation_updated_at = datetime.now(timezone.utc)
+
+
 def revoke_all_user_tokens(db: Session, username: str) -> int:
     """
-    撤销指定用户的所有token
+    撤销指定用户的所有token（"退出所有设备"、修改密码时使用；删除用户见 add_user_tombstone）
+    只需把用户的 token_generation 加 1：之前签发的 token 携带的代数更低，校验时被拒绝，
+    不需要为每个 token 写黑名单记录
     
     Args:
         db: 数据库会话
         username: 用户名
         
     Returns:
-        int: 撤销的token数量
+        int: 新的 token 代数，用户不存在或出错时返回 0
     """
     try:
-        # 获取所有未过期的token
-        current_time = datetime.now(timezone.utc)
-        tokens = db.query(TokenBlacklist).filter(
-            TokenBlacklist.username == username,
-            TokenBlacklist.expires_at > current_time
-        ).all()
-        
-        # 如果token已经在黑名单中，则跳过
-        count = 0
-        for token in tokens:
-            if not is_token_revoked(db, token.jti):
-                count += 1
+        updated = db.query(User).filter(User.username == username).update(
+            {User.token_generation: User.token_generation + 1,
+             User.token_generation_updated_at: datetime.now(timezone.utc)},
+            synchronize_session=False
+        )
+        if not updated:
+            db.rollback()
+            return 0
+        generation = db.query(User.token_generation).filter(User.username == username).scalar()
+        db.commit()
         
-        logger.info(f"Revoked {count} tokens for user {username}")
-        return count
+        revocation_cache.set_generation(username, generation)
+        logger.info(f"Revoked all tokens for user {username} (generation {generation})")
+        return generation
         
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Database error while revoking all user tokens: {str(e)}")
+        return 0
     except Exception as e:
         logger.error(f"Error revoking all user tokens: {str(e)}")
         return 0
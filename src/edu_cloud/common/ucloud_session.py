@@ -0,0 +1,312 @@
+"""
+UCloud 会话模块
+一次 CAS 登录得到的 UCloud Session，在一次同步中供所有爬虫共享；
+并按 cas_username 缓存在服务端，重复同步时跳过 CAS 登录
+"""
+from typing import Optional, Dict, Any, Callable
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+
+import requests
+from buptmw import BUPT_Auth
+
+from .cas_auth import cas_admission
+from .config import settings
+from .rate_limit import upstream_limiter
+from .security import decrypt_secret, encrypt_secret
+
+logger = logging.getLogger(__name__)
+
+
+def extract_user_id(session) -> Optional[str]:
+    """从 buptmw 的 UCloud Session 中提取 UserID"""
+    return session.cookies.get("iClass-uuid") or \
+           session.cookies.get("userId") or \
+           getattr(session, "user_id", None)
+
+
+def credential_fingerprint(cas_username: str, cas_password: str) -> str:
+    """凭证指纹：缓存命中前校验密码，不保存明文"""
+    message = f"{cas_username}:{cas_password}".encode("utf-8")
+    return hmac.new(settings.secret_key.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+class UCloudSession:
+    """
+    已登录的 UCloud 会话
+    职责：持有 requests Session + UserID + Token，供多个爬虫复用，避免重复 CAS 登录
+    """
+
+    def __init__(self, session, user_id: str, cas_username: Optional[str] = None,
+                 expires_at: Optional[float] = None):
+        self.session = session
+        self.user_id = user_id
+        self.cas_username = cas_username
+        # 过期时间（time.time() 时间戳）
+        self.expires_at = expires_at or time.time() + settings.ucloud_session_ttl_seconds
+        # 收到 401 时用于重新登录的回调（由 UCloudSessionCache 设置）
+        self.relogin: Optional[Callable[[], "UCloudSession"]] = None
+        self._relogin_lock = threading.Lock()
+
+    @classmethod
+    def from_auth(cls, auth: BUPT_Auth, cas_username: Optional[str] = None) -> "UCloudSession":
+        """
+        从已完成 CAS 认证的 BUPT_Auth 对象创建会话（例如 verify_cas_credentials 返回的对象）
+        """
+        # buptmw 自动处理 OAuth 换 Token
+        session = auth.get_UCloud()
+        user_id = extract_user_id(session)
+        if not user_id:
+            raise ValueError("登录成功但未能提取 UserID")
+        return cls(session, user_id, cas_username)
+
+    @classmethod
+    def login(cls, cas_username: str, cas_password: str) -> "UCloudSession":
+        """执行一次完整的 CAS 登录并创建会话"""
+        logger.info(f"正在登录 CAS: {cas_username}")
+        # 经过 CAS 准入控制：限制同时登录数，账号熔断中直接抛出 CASUnavailable
+        auth = cas_admission.login(cas_username, cas_password)
+        return cls.from_auth(auth, cas_username)
+
+    @property
+    def access_token(self) -> Optional[str]:
+        return getattr(self.session, "access_token", None)
+
+    def is_expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def auth_headers(self) -> Dict[str, str]:
+        """构造 Blade-Auth 请求头"""
+        token = self.access_token
+        if token:
+            return {"Blade-Auth": f"bearer {token}"}
+        return {}
+
+    def _refresh(self, stale_token: Optional[str]):
+        """重新登录并接管新会话（并发的 401 只触发一次登录）"""
+        with self._relogin_lock:
+            if self.access_token != stale_token:
+                return  # 其他线程已经刷新过
+            fresh = self.relogin()
+            self.session = fresh.session
+            self.user_id = fresh.user_id
+            self.expires_at = fresh.expires_at
+
+    def _send(self, method: str, url: str, **kwargs: Any):
+        """经过上游限流器发送（令牌桶 + 在途上限 + 429/5xx 退避重试）"""
+        return upstream_limiter.call(
+            url, lambda: self.session.request(method, url, **kwargs), user_key=self.cas_username
+        )
+
+    def request(self, method: str, url: str, **kwargs: Any):
+        """发送请求；Token 失效（401）时透明地重新登录并重试一次"""
+        stale_token = self.access_token
+        resp = self._send(method, url, **kwargs)
+        if resp.status_code != 401 or self.relogin is None:
+            return resp
+
+        logger.info(f"UCloud 会话已失效，重新登录: {self.cas_username}")
+        self._refresh(stale_token)
+        headers = kwargs.get("headers")
+        if headers and "Blade-Auth" in headers:
+            kwargs["headers"] = {**headers, **self.auth_headers()}
+        return self._send(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any):
+        return self.request("POST", url, **kwargs)
+
+    # ---------- 序列化（数据库存储用） ----------
+
+    def dump_cookies(self) -> str:
+        return json.dumps([
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+            for c in self.session.cookies
+        ])
+
+    @classmethod
+    def restore(cls, cas_username: str, user_id: str, access_token: Optional[str],
+                cookies_json: Optional[str], expires_at: float) -> "UCloudSession":
+        """从缓存记录重建会话（不访问网络）"""
+        session = requests.Session()
+        for c in json.loads(cookies_json or "[]"):
+            session.cookies.set(c["name"], c["value"], domain=c.get("domain"), path=c.get("path") or "/")
+        if access_token:
+            session.headers["Blade-Auth"] = f"bearer {access_token}"
+        session.access_token = access_token
+        session.user_id = user_id
+        return cls(session, user_id, cas_username, expires_at=expires_at)
+
+
+class UCloudSessionCache:
+    """
+    UCloud 会话缓存（按 cas_username）
+    - 进程内缓存：同一进程内直接复用
+    - 可选数据库存储：settings.ucloud_session_store = "database" 时，多个 worker 共享
+    """
+
+    def __init__(self, store: Optional[str] = None):
+        self.store = store or settings.ucloud_session_store
+        self._entries: Dict[str, tuple] = {}  # cas_username -> (fingerprint, UCloudSession)
+        self._lock = threading.Lock()
+        self._user_locks: Dict[str, threading.Lock] = {}
+
+    def _user_lock(self, cas_username: str) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(cas_username, threading.Lock())
+
+    def acquire(self, cas_username: str, cas_password: str) -> UCloudSession:
+        """
+        获取可用会话：命中缓存且未过期则直接返回，否则登录 CAS 并写入缓存
+        同一账号的并发请求只会触发一次登录
+        """
+        fingerprint = credential_fingerprint(cas_username, cas_password)
+        with self._user_lock(cas_username):
+            cached = self._get(cas_username, fingerprint)
+            if cached is not None:
+                logger.info(f"复用已缓存的 UCloud 会话: {cas_username}")
+                self._attach_relogin(cached, cas_username, cas_password)
+                return cached
+
+            ucloud = UCloudSession.login(cas_username, cas_password)
+            self.put(ucloud, cas_password)
+            return ucloud
+
+    def put(self, ucloud: UCloudSession, cas_password: str) -> UCloudSession:
+        """写入缓存（例如登录接口已经完成了 CAS 认证）"""
+        cas_username = ucloud.cas_username
+        fingerprint = credential_fingerprint(cas_username, cas_password)
+        self._attach_relogin(ucloud, cas_username, cas_password)
+        with self._lock:
+            self._entries[cas_username] = (fingerprint, ucloud)
+        if self.store == "database":
+            self._save_record(ucloud, fingerprint)
+        return ucloud
+
+    def warm_async(self, auth: BUPT_Auth, cas_username: str, cas_password: str) -> threading.Thread:
+        """
+        在后台线程中用已完成 CAS 认证的 auth 对象换取 UCloud 会话并写入缓存（例如 CAS 登录接口）
+        OAuth 换 token 需要一次完整往返，不阻塞调用方；换取期间持有账号锁，同进程内的 acquire 会等待复用，不会重复登录
+        """
+        fingerprint = credential_fingerprint(cas_username, cas_password)
+
+        def run():
+            try:
+                with self._user_lock(cas_username):
+                    if self._get(cas_username, fingerprint) is None:
+                        self.put(UCloudSession.from_auth(auth, cas_username), cas_password)
+            except Exception as e:
+                logger.warning(f"缓存 UCloud 会话失败，同步任务将重新登录: {str(e)}")
+
+        thread = threading.Thread(target=run, name=f"ucloud-warm-{cas_username}", daemon=True)
+        thread.start()
+        return thread
+
+    def invalidate(self, cas_username: str):
+        """使某账号的缓存失效（例如解绑 CAS）"""
+        with self._lock:
+            self._entries.pop(cas_username, None)
+        if self.store == "database":
+            self._delete_record(cas_username)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _attach_relogin(self, ucloud: UCloudSession, cas_username: str, cas_password: str):
+        def relogin() -> UCloudSession:
+            fresh = UCloudSession.login(cas_username, cas_password)
+            self.put(fresh, cas_password)
+            return fresh
+        ucloud.relogin = relogin
+
+    def _get(self, cas_username: str, fingerprint: str) -> Optional[UCloudSession]:
+        with self._lock:
+            entry = self._entries.get(cas_username)
+        if entry is None and self.store == "database":
+            entry = self._load_record(cas_username)
+            if entry is not None:
+                with self._lock:
+                    self._entries[cas_username] = entry
+
+        if entry is None:
+            return None
+        cached_fingerprint, ucloud = entry
+        if not hmac.compare_digest(cached_fingerprint, fingerprint) or ucloud.is_expired():
+            return None
+        return ucloud
+
+    # ---------- 数据库存储 ----------
+
+    def _load_record(self, cas_username: str) -> Optional[tuple]:
+        from .database import SessionLocal
+        from .models import UCloudSessionRecord
+        db = SessionLocal()
+        try:
+            record = db.query(UCloudSessionRecord).filter(
+                UCloudSessionRecord.cas_username == cas_username
+            ).first()
+            if not record:
+                return None
+            expires_at = record.expires_at.replace(tzinfo=timezone.utc).timestamp()
+            # token 和 Cookie 加密保存；secret_key 变更后（或旧版明文记录）无法解密，按未命中处理并重新登录
+            ucloud = UCloudSession.restore(
+                cas_username, record.user_id,
+                decrypt_secret(record.access_token) if record.access_token else None,
+                decrypt_secret(record.cookies) if record.cookies else None,
+                expires_at
+            )
+            return record.credential_hash, ucloud
+        except Exception as e:
+            logger.error(f"读取 UCloud 会话缓存失败: {str(e)}")
+            return None
+        finally:
+            db.close()
+
+    def _save_record(self, ucloud: UCloudSession, fingerprint: str):
+        from .database import SessionLocal
+        from .models import UCloudSessionRecord
+        db = SessionLocal()
+        try:
+            record = UCloudSessionRecord(
+                cas_username=ucloud.cas_username,
+                credential_hash=fingerprint,
+                user_id=ucloud.user_id,
+                access_token=encrypt_secret(ucloud.access_token) if ucloud.access_token else None,
+                cookies=encrypt_secret(ucloud.dump_cookies()),
+                expires_at=datetime.fromtimestamp(ucloud.expires_at, tz=timezone.utc).replace(tzinfo=None),
+                updated_at=datetime.now(timezone.utc),
+            )
+            db.merge(record)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"保存 UCloud 会话缓存失败: {str(e)}")
+        finally:
+            db.close()
+
+    def _delete_record(self, cas_username: str):
+        from .database import SessionLocal
+        from .models import UCloudSessionRecord
+        db = SessionLocal()
+        try:
+            db.query(UCloudSessionRecord).filter(
+                UCloudSessionRecord.cas_username == cas_username
+            ).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"删除 UCloud 会话缓存失败: {str(e)}")
+        finally:
+            db.close()
+
+
+# 全局会话缓存实例
+session_cache = UCloudSessionCache()
@@ -0,0 +1,184 @@
+"""
+同步写入队列（SQLite 单写线程）
+各同步服务把"对比 + 批量写入"打包成一个写入单元提交到有界队列，
+由唯一的写线程逐个执行并用短事务提交，调用方阻塞等待结果。
+这样多个用户同时同步时不会在 SQLite 写锁上互相等待（busy_timeout / database is locked），
+并统计每个写入单元持有写锁的时间
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal, is_sqlite
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STOP = object()
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class WriteQueue:
+    """
+    单写线程 + 有界队列
+
+    Args:
+        session_factory: 写入单元使用的会话工厂，默认 SessionLocal
+        maxsize: 队列容量，队列满时提交方阻塞（背压）
+        enabled: 为 False 时在调用方线程直接执行（非 SQLite 数据库不需要串行化写入）
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal,
+                 maxsize: int = settings.write_queue_size, enabled: bool = True):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self._hold_ms = deque(maxlen=1000)   # 最近 1000 个写入单元的持锁时间
+        self._wait_ms = deque(maxlen=1000)   # 最近 1000 个写入单元的排队时间
+        self._completed = 0
+        self._failed = 0
+        self._max_hold_ms = 0.0
+        self._max_depth = 0
+        self._by_label: Dict[str, Dict[str, float]] = {}
+
+    # ---------- 提交 ----------
+
+    def submit(self, unit: Callable[[Session], T], label: str = "write") -> "Future[T]":
+        """
+        提交写入单元，返回 Future
+        unit(session) 在写线程中执行，返回后由写线程提交事务；抛出异常时回滚
+        """
+        future: "Future[T]" = Future()
+        if not self.enabled or threading.current_thread() is self._thread:
+            # 未启用队列，或在写线程内部再次提交（避免自己等自己），直接执行
+            self._execute(unit, label, future, time.perf_counter())
+            return future
+
+        self._ensure_started()
+        try:
+            self._queue.put((unit, label, future, time.perf_counter()),
+                            timeout=settings.write_queue_timeout_seconds)
+        except queue.Full:
+            raise RuntimeError("写入队列已满，请稍后重试")
+        with self._stats_lock:
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return future
+
+    def run(self, unit: Callable[[Session], T], label: str = "write") -> T:
+        """提交写入单元并等待完成，返回 unit 的返回值（异常原样抛出）"""
+        return self.submit(unit, label).result(timeout=settings.write_queue_timeout_seconds)
+
+    # ---------- 写线程 ----------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            self._execute(*item)
+
+    def _execute(self, unit, label, future: Future, enqueued_at: float):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            result = unit(db)
+            db.commit()
+        except BaseException as e:
+            db.rollback()
+            self._record(label, enqueued_at, started, ok=False)
+            logger.warning(f"写入单元失败 ({label}): {str(e)}")
+            future.set_exception(e)
+        else:
+            self._record(label, enqueued_at, started, ok=True)
+            future.set_result(result)
+        finally:
+            db.close()
+
+    def stop(self, timeout: Optional[float] = None):
+        """处理完已提交的写入单元后停止写线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # ---------- 统计 ----------
+
+    def _record(self, label: str, enqueued_at: float, started: float, ok: bool):
+        finished = time.perf_counter()
+        hold = (finished - started) * 1000
+        wait = (started - enqueued_at) * 1000
+        with self._stats_lock:
+            self._hold_ms.append(hold)
+            self._wait_ms.append(wait)
+            self._max_hold_ms = max(self._max_hold_ms, hold)
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+            entry = self._by_label.setdefault(label, {"count": 0, "total_hold_ms": 0.0, "max_hold_ms": 0.0})
+            entry["count"] += 1
+            entry["total_hold_ms"] += hold
+            entry["max_hold_ms"] = max(entry["max_hold_ms"], hold)
+
+    def stats(self) -> Dict:
+        """写锁持有时间等统计（毫秒）"""
+        with self._stats_lock:
+            hold = list(self._hold_ms)
+            wait = list(self._wait_ms)
+            return {
+                "enabled": self.enabled,
+                "completed": self._completed,
+                "failed": self._failed,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_depth,
+                "lock_hold_ms": {
+                    "avg": round(sum(hold) / len(hold), 2) if hold else 0.0,
+                    "p50": round(_percentile(hold, 0.50), 2),
+                    "p95": round(_percentile(hold, 0.95), 2),
+                    "max": round(self._max_hold_ms, 2),
+                },
+                "queue_wait_ms": {
+                    "avg": round(sum(wait) / len(wait), 2) if wait else 0.0,
+                    "p95": round(_percentile(wait, 0.95), 2),
+                },
+                "by_unit": {
+                    label: {
+                        "count": int(v["count"]),
+                        "avg_hold_ms": round(v["total_hold_ms"] / v["count"], 2),
+                        "max_hold_ms": round(v["max_hold_ms"], 2),
+                    }
+                    for label, v in self._by_label.items()
+                },
+            }
+
+
+# 全局写入队列：只有 SQLite 需要串行化写入，其他数据库在调用方线程直接执行（仍统计持锁时间）
+write_queue = WriteQueue(enabled=settings.write_queue_enabled and is_sqlite)
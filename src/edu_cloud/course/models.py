@@ -1,5 +1,5 @@
 # 定义数据库表(Course, Resource) + 数据传输类(Dataclass)
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import List, Optional
@@ -12,6 +12,10 @@ from ..common.database import Base
 class Course(Base):
     """课程主表"""
     __tablename__ = "courses"
+    __table_args__ = (
+        # 课程列表 / 按课程名查找
+        Index("ix_courses_owner_name", "owner_id", "name"),
+    )
 
     # 直接使用学校的 siteId 作为主键，方便对应
     id = Column(String, primary_key=True, index=True) 
@@ -32,7 +36,7 @@ class CourseResource(Base):
     __tablename__ = "course_resources"
 
     id = Column(String, primary_key=True) # 使用学校的 resourceId
-    course_id = Column(String, ForeignKey("courses.id"), nullable=False) # 关联课程
+    course_id = Column(String, ForeignKey("courses.id"), nullable=False, index=True) # 关联课程
     
     title = Column(String, nullable=False)       # 资料标题 (第01章 Python概述)
     file_type = Column(String, nullable=True)    # 文件类型 (pptx, pdf)
@@ -67,4 +71,6 @@ class ScrapedCourseData:
     pic_url: str
     description: str
     # 课程包含的资源列表
-    resources: List[ScrapedResourceData]
\ No newline at end of file
+    resources: List[ScrapedResourceData]
+    # 资源树是否完整抓取（抓取失败时为 False，同步时不删除本地资源）
+    resources_complete: bool = True
\ No newline at end of file
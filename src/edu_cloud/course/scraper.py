@@ -1,33 +1,32 @@
 # 只负责调用那3个API，清洗数据，返回 Dataclass
 import time
 from datetime import datetime
-from typing import List, Dict
-from buptmw import BUPT_Auth
+from typing import List, Dict, Optional, Iterator, Tuple
+from ..common.ucloud_session import UCloudSession, session_cache
+from ..common.fetcher import fetch_as_completed, paginate, parse_page
 from .models import ScrapedCourseData, ScrapedResourceData
 
 # API 配置
 API_BASE = "https://apiucloud.bupt.edu.cn/ykt-site"
+PAGE_SIZE = 50  # 列表接口每页条数（超过一页时自动翻页）
 
 class CourseScraper:
-    def __init__(self, username, password):
+    def __init__(self, username=None, password=None, ucloud: Optional[UCloudSession] = None):
         self.username = username
         self.password = password
+        self.ucloud = ucloud
         self.session = None
         self.user_id = None
+        # 资源树抓取失败的课程（同步时不据此删除本地资源）
+        self.failed_sites = set()
 
     def _login(self):
-        """初始化 buptmw (复用 assignment 的成功逻辑)"""
+        """获取 UCloud Session（优先复用共享会话）"""
         try:
-            auth = BUPT_Auth(cas={"username": self.username, "password": self.password})
-            self.session = auth.get_UCloud()
-            
-            # 尝试多种方式获取 ID
-            self.user_id = self.session.cookies.get("iClass-uuid") or \
-                           self.session.cookies.get("userId") or \
-                           getattr(self.session, "user_id", None)
-            
-            if not self.user_id:
-                raise ValueError("登录成功但 UserID 缺失")
+            if self.ucloud is None:
+                self.ucloud = session_cache.acquire(self.username, self.password)
+            self.session = self.ucloud
+            self.user_id = self.ucloud.user_id
         except Exception as e:
             raise RuntimeError(f"认证失败: {str(e)}")
 
@@ -44,21 +43,22 @@ class CourseScraper:
     def _fetch_course_list_raw(self) -> List[Dict]:
         """1. 获取本学期课程列表 (对应你提供的接口3)"""
         url = f"{API_BASE}/site/list/student/current"
-        # 使用你截图里的参数
-        params = {
-            "userId": self.user_id,
-            "current": 1, 
-            "size": 50, # 足够大了
-            "siteRoleCode": 2
-        }
-        try:
+        
+        def fetch_page(current, size):
+            # 使用你截图里的参数
+            params = {
+                "userId": self.user_id,
+                "current": current,
+                "size": size,
+                "siteRoleCode": 2
+            }
+            # 失败时抛出异常：返回空页会被当成"没有课程"，整个课程列表被静默丢弃
             resp = self.session.get(url, params=params, headers=self._get_headers())
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("data", {}).get("records", [])
-        except Exception as e:
-            print(f"获取课程列表失败: {e}")
-        return []
+            if resp.status_code != 200:
+                raise RuntimeError(f"获取课程列表失败(第{current}页): HTTP {resp.status_code}")
+            return parse_page(resp.json())
+        
+        return list(paginate(fetch_page, PAGE_SIZE))
 
     def _fetch_course_detail_raw(self, site_id) -> Dict:
         """2. 获取课程详细信息 (对应你提供的接口2)"""
@@ -71,44 +71,68 @@ class CourseScraper:
             pass
         return {}
 
-    def _fetch_course_resources(self, site_id) -> List[ScrapedResourceData]:
-        """3. 获取课程主页讲义/资源 (对应你提供的接口1)"""
+    def _fetch_resource_tree(self, site_id) -> List[Dict]:
+        """3. 获取课程主页讲义/资源树 (对应你提供的接口1)"""
         url = f"{API_BASE}/site-resource/tree/student"
         params = {"siteId": site_id, "userId": self.user_id}
         
-        resources = []
-        try:
-            # 这是一个 POST 请求，虽然截图显示 Params 里有参数，但通常 POST 也要发 body 或者 query
-            # 根据截图，参数在 Query 里。
-            resp = self.session.post(url, params=params, headers=self._get_headers())
+        # 这是一个 POST 请求，虽然截图显示 Params 里有参数，但通常 POST 也要发 body 或者 query
+        # 根据截图，参数在 Query 里。
+        resp = self.session.post(url, params=params, headers=self._get_headers())
+        if resp.status_code != 200:
+            # 抛出异常而不是返回空列表，避免把"抓取失败"当成"资源已全部删除"
+            raise RuntimeError(f"HTTP {resp.status_code}")
+        return resp.json().get("data", []) or []
+
+    def _walk_resource_tree(self, nodes: List[Dict]) -> Iterator[ScrapedResourceData]:
+        """
+        遍历整棵资源树（迭代实现，支持任意层级的章节嵌套）
+        数据结构: data -> list[Node] -> attachmentVOs -> list[File]，Node 可以再包含子 Node
+        章节名按层级拼接，例如 "第01章 Python概述 / 1.1 环境搭建"
+        """
+        # 栈中保存 (节点, 父级章节路径)，逆序入栈以保持先序遍历顺序
+        stack = [(node, None) for node in reversed(nodes)]
+        while stack:
+            node, parent_path = stack.pop()
+            node_name = node.get("resourceName", "未知章节") # e.g. "第01章 Python概述"
+            chapter_name = f"{parent_path} / {node_name}" if parent_path else node_name
             
-            if resp.status_code == 200:
-                # 这是一个树状结构，我们需要递归或者双层循环
-                # 数据结构: data -> list[Node] -> attachmentVOs -> list[File]
-                nodes = resp.json().get("data", [])
+            # 遍历该节点下的附件
+            for att in node.get("attachmentVOs") or []:
+                res_info = att.get("resource", {})
                 
-                for node in nodes:
-                    chapter_name = node.get("resourceName", "未知章节") # e.g. "第01章 Python概述"
-                    
-                    # 遍历该节点下的附件
-                    attachments = node.get("attachmentVOs", [])
-                    for att in attachments:
-                        res_info = att.get("resource", {})
-                        
-                        # 提取我们需要的信息
-                        resources.append(ScrapedResourceData(
-                            resource_id=res_info.get("id"),
-                            title=res_info.get("name"), # e.g. "第01章-Python概述.pptx"
-                            file_type=res_info.get("ext"),
-                            file_size=res_info.get("fileSizeUnit"),
-                            download_url=res_info.get("url"),
-                            parent_section=chapter_name,
-                            upload_time=self._parse_time(res_info.get("createTime"))
-                        ))
+                # 提取我们需要的信息
+                yield ScrapedResourceData(
+                    resource_id=res_info.get("id"),
+                    title=res_info.get("name"), # e.g. "第01章-Python概述.pptx"
+                    file_type=res_info.get("ext"),
+                    file_size=res_info.get("fileSizeUnit"),
+                    download_url=res_info.get("url"),
+                    parent_section=chapter_name,
+                    upload_time=self._parse_time(res_info.get("createTime"))
+                )
+            
+            children = node.get("children") or node.get("childList") or []
+            for child in reversed(children):
+                stack.append((child, chapter_name))
+
+    def _fetch_course_resources(self, site_id) -> List[ScrapedResourceData]:
+        """抓取单门课程的全部资源（整棵资源树）"""
+        try:
+            return list(self._walk_resource_tree(self._fetch_resource_tree(site_id)))
         except Exception as e:
             print(f"抓取资源失败({site_id}): {e}")
-            
-        return resources
+            self.failed_sites.add(site_id)
+            return []
+
+    def iter_resources(self, site_ids: List[str]) -> Iterator[Tuple[str, ScrapedResourceData]]:
+        """
+        并发抓取多门课程的资源树（并发上限 settings.scraper_max_workers）
+        哪门课先返回就先产出它的资源 (site_id, ScrapedResourceData)，调用方可以边抓边处理
+        """
+        for site_id, resources in fetch_as_completed(self._fetch_course_resources, site_ids):
+            for res in resources:
+                yield site_id, res
 
     def _parse_time(self, time_str) -> datetime:
         if not time_str: return None
@@ -128,7 +152,13 @@ class CourseScraper:
         # 1. 拿列表
         raw_courses = self._fetch_course_list_raw()
         
-        # 2. 遍历每门课，补充详情和资源
+        # 2. 并发抓取所有课程的资源 (这是最耗时的部分)
+        site_ids = [raw.get("id") for raw in raw_courses if raw.get("id")]
+        resources_by_site = {site_id: [] for site_id in site_ids}
+        for site_id, res in self.iter_resources(site_ids):
+            resources_by_site[site_id].append(res)
+        
+        # 3. 按列表顺序组装每门课的详情和资源
         for raw in raw_courses:
             site_id = raw.get("id")
             if not site_id: continue
@@ -138,8 +168,7 @@ class CourseScraper:
             teachers = raw.get("teachers", [])
             teacher_name = teachers[0].get("name") if teachers else raw.get("teacherName", "")
             
-            # 3. 抓取资源 (这是最耗时的，如果需要速度可以异步，但现在先同步)
-            resources = self._fetch_course_resources(site_id)
+            resources = resources_by_site.get(site_id, [])
             
             course_data = ScrapedCourseData(
                 site_id=site_id,
@@ -150,7 +179,8 @@ class CourseScraper:
                 dept_name=raw.get("departmentName"),
                 pic_url=raw.get("picUrl"),
                 description=raw.get("briefIntroduction", ""), # 简介
-                resources=resources # 把抓到的资源列表挂载上去
+                resources=resources, # 把抓到的资源列表挂载上去
+                resources_complete=site_id not in self.failed_sites
             )
             final_results.append(course_data)
             
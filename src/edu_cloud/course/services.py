@@ -1,6 +1,11 @@
  # 负责协调：调爬虫 -> 打印日志 -> 存入数据库
 import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
+from ..common.bulk import bulk_upsert, chunked
+from ..common.ucloud_session import UCloudSession
+from ..common.write_queue import write_queue
 from . import models
 from .scraper import CourseScraper
 
@@ -12,14 +17,16 @@ class CourseService:
     """
 
     @staticmethod
-    def sync_courses(db: Session, user_id: int, cas_user: str, cas_pass: str):
+    def sync_courses(db: Session, user_id: int, cas_user: str, cas_pass: str,
+                     ucloud: Optional[UCloudSession] = None):
         """
         执行同步：抓取 -> 打印日志 -> 存库 (课程 + 资源)
+        ucloud: 可选的共享 UCloud 会话，传入时不再单独登录 CAS
         """
         print(f"--- [Service] 开始同步课程数据 (用户ID: {user_id}) ---")
         
         # 1. 调用爬虫
-        scraper = CourseScraper(cas_user, cas_pass)
+        scraper = CourseScraper(cas_user, cas_pass, ucloud=ucloud)
         course_data_list = scraper.run()
         
         # 2. 【详细日志】打印抓取结果表格
@@ -36,70 +43,112 @@ class CourseService:
             print(f"{course.site_id:<20} | {c_name:<20} | {res_count:<5} | {course.teacher_name}")
         print("-" * 70 + "\n")
 
-        # 3. 存入数据库
-        new_course_count = 0
-        updated_course_count = 0
-        new_res_count = 0
+        # 3. 存入数据库：交给写线程用短事务执行
+        new_course_count, updated_course_count, new_res_count = write_queue.run(
+            lambda wdb: CourseService.save_courses(wdb, user_id, course_data_list),
+            label="courses"
+        )
         
-        for item in course_data_list:
-            # --- A. 处理课程本身 ---
-            db_course = db.query(models.Course).filter(models.Course.id == item.site_id).first()
-            
-            if db_course:
-                # 更新逻辑
-                db_course.name = item.name
-                db_course.teacher = item.teacher_name
-                db_course.pic_url = item.pic_url
-                db_course.description = item.description
-                # 还可以更新其他字段...
-                updated_course_count += 1
-            else:
-                # 新增逻辑
-                new_course = models.Course(
-                    id=item.site_id,
-                    owner_id=user_id,
-                    name=item.name,
-                    course_code=item.course_code,
-                    term_name=item.term_name,
-                    teacher=item.teacher_name,
-                    dept_name=item.dept_name,
-                    pic_url=item.pic_url,
-                    description=item.description
-                )
-                db.add(new_course)
-                new_course_count += 1
-            
-            # --- B. 处理课程下的资源 (Link Table) ---
-            # 简单策略：遍历抓到的资源，逐个 Upsert (更新或插入)
-            for res in item.resources:
-                db_res = db.query(models.CourseResource).filter(models.CourseResource.id == res.resource_id).first()
-                
-                if not db_res:
-                    new_res = models.CourseResource(
-                        id=res.resource_id,
-                        course_id=item.site_id, # 关联外键
-                        title=res.title,
-                        file_type=res.file_type,
-                        file_size=res.file_size,
-                        download_url=res.download_url,
-                        parent_section=res.parent_section,
-                        created_at=res.upload_time
-                    )
-                    db.add(new_res)
-                    new_res_count += 1
-                else:
-                    # 如果资源已存在，更新一下链接（防止过期）
-                    db_res.download_url = res.download_url
-
-        db.commit()
+        # 资源树抓取失败的课程标记为不完整：保留本地资源，不做删除对账
+        incomplete = [course.site_id for course in course_data_list if not course.resources_complete]
+        if incomplete:
+            logger.warning(f"{len(incomplete)} 门课程的资源树抓取失败，保留本地资源: {incomplete}")
         
         return {
             "total_courses": len(course_data_list),
             "new_courses": new_course_count,
             "updated_courses": updated_course_count,
             "total_resources_found": total_res_count,
-            "new_resources_added": new_res_count
+            "new_resources_added": new_res_count,
+            "incomplete_courses": incomplete
+        }
+
+    @staticmethod
+    def save_courses(db: Session, user_id: int, course_data_list: List[models.ScrapedCourseData]) -> Tuple[int, int, int]:
+        """
+        把抓取结果写入数据库，返回 (新增课程数, 更新课程数, 新增资源数)
+        两次 IN 查询预取已有 ID，批量 upsert；删除上游已不存在的资源
+        """
+        course_ids = [item.site_id for item in course_data_list]
+        existing_course_ids = set()
+        for chunk in chunked(course_ids):
+            existing_course_ids.update(
+                row[0] for row in db.query(models.Course.id).filter(models.Course.id.in_(chunk))
+            )
+        
+        # --- A. 处理课程本身 ---
+        # 已有课程只更新名称/教师/封面/简介，与逐条更新时的字段一致
+        course_rows = {
+            item.site_id: dict(
+                id=item.site_id,
+                owner_id=user_id,
+                name=item.name,
+                course_code=item.course_code,
+                term_name=item.term_name,
+                teacher=item.teacher_name,
+                dept_name=item.dept_name,
+                pic_url=item.pic_url,
+                description=item.description,
+                last_updated=datetime.now(timezone.utc)
+            )
+            for item in course_data_list
         }
+        bulk_upsert(
+            db, models.Course, list(course_rows.values()),
+            index_elements=["id"],
+            update_columns=["name", "teacher", "pic_url", "description"],
+        )
+        new_course_count = len(set(course_rows) - existing_course_ids)
+        updated_course_count = len(course_data_list) - new_course_count
+        
+        # --- B. 处理课程下的资源 (Link Table) ---
+        resource_rows = {}
+        for item in course_data_list:
+            for res in item.resources:
+                resource_rows[res.resource_id] = dict(
+                    id=res.resource_id,
+                    course_id=item.site_id, # 关联外键
+                    title=res.title,
+                    file_type=res.file_type,
+                    file_size=res.file_size,
+                    download_url=res.download_url,
+                    parent_section=res.parent_section,
+                    created_at=res.upload_time
+                )
+        
+        existing_res_ids = set()
+        for chunk in chunked(list(resource_rows)):
+            existing_res_ids.update(
+                row[0] for row in db.query(models.CourseResource.id).filter(models.CourseResource.id.in_(chunk))
+            )
+        new_res_count = len(set(resource_rows) - existing_res_ids)
+        
+        # 如果资源已存在，只更新一下链接（防止过期）
+        bulk_upsert(
+            db, models.CourseResource, list(resource_rows.values()),
+            index_elements=["id"],
+            update_columns=["download_url"],
+        )
+        
+        # --- C. 删除上游已不存在的资源（仅限资源树完整抓取的课程）---
+        complete_ids = [item.site_id for item in course_data_list if item.resources_complete]
+        stale_res_ids = []
+        for chunk in chunked(complete_ids):
+            stale_res_ids.extend(
+                row[0] for row in db.query(models.CourseResource.id)
+                .filter(models.CourseResource.course_id.in_(chunk))
+                if row[0] not in resource_rows
+            )
+        removed_res_count = 0
+        for chunk in chunked(stale_res_ids):
+            removed_res_count += db.query(models.CourseResource)\
+                .filter(models.CourseResource.id.in_(chunk))\
+                .delete(synchronize_session=False)
+        if removed_res_count:
+            print(f"  已删除 {removed_res_count} 个上游不存在的资源")
+
+        db.commit()
+        return new_course_count, updated_course_count, new_res_count
 
     @staticmethod
     def get_course_resources(db: Session, course_id: str):
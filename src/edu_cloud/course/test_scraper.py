@@ -0,0 +1,98 @@
+"""
+CourseScraper 资源树抓取测试（使用假会话，不访问网络）
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.edu_cloud.course.scraper import CourseScraper
+
+
+def attachment(res_id):
+    return {"resource": {"id": res_id, "name": f"{res_id}.pdf", "ext": "pdf"}}
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return {"data": self._data}
+
+
+class FakeUCloud:
+    def __init__(self, trees):
+        self.trees = trees
+
+    def post(self, url, params=None, **kwargs):
+        return FakeResponse(self.trees[params["siteId"]])
+
+    def get(self, url, params=None, **kwargs):
+        return FakeResponse({"records": [
+            {"id": site_id, "siteName": f"课程{site_id}"} for site_id in self.trees
+        ]})
+
+
+def make_scraper(trees):
+    scraper = CourseScraper(ucloud=MagicMock())
+    scraper._login = lambda: None
+    scraper.session = FakeUCloud(trees)
+    scraper.user_id = "u1"
+    return scraper
+
+
+def test_walk_resource_tree_includes_nested_chapters():
+    tree = [
+        {
+            "resourceName": "第01章",
+            "attachmentVOs": [attachment("r1")],
+            "children": [
+                {"resourceName": "1.1节", "attachmentVOs": [attachment("r2")],
+                 "children": [{"resourceName": "实验", "attachmentVOs": [attachment("r3")]}]},
+            ],
+        },
+        {"resourceName": "第02章", "attachmentVOs": [attachment("r4")]},
+    ]
+
+    resources = list(make_scraper({"s1": tree})._walk_resource_tree(tree))
+
+    assert [(r.resource_id, r.parent_section) for r in resources] == [
+        ("r1", "第01章"),
+        ("r2", "第01章 / 1.1节"),
+        ("r3", "第01章 / 1.1节 / 实验"),
+        ("r4", "第02章"),
+    ]
+
+
+def test_run_crawls_all_courses_and_keeps_course_order():
+    trees = {
+        f"s{i}": [{"resourceName": "章节", "attachmentVOs": [attachment(f"s{i}-r{j}") for j in range(3)]}]
+        for i in range(5)
+    }
+
+    courses = make_scraper(trees).run()
+
+    assert [c.site_id for c in courses] == [f"s{i}" for i in range(5)]
+    for i, course in enumerate(courses):
+        assert [r.resource_id for r in course.resources] == [f"s{i}-r{j}" for j in range(3)]
+
+
+def test_failed_course_list_raises_instead_of_returning_no_courses():
+    scraper = make_scraper({"s1": []})
+    scraper.session.get = lambda url, params=None, **kwargs: FakeResponse(None, status_code=502)
+
+    with pytest.raises(RuntimeError, match="HTTP 502"):
+        scraper.run()
+
+
+def test_failed_resource_tree_marks_course_incomplete():
+    scraper = make_scraper({"s1": [{"resourceName": "章节", "attachmentVOs": [attachment("r1")]}], "s2": []})
+    post = scraper.session.post
+    scraper.session.post = lambda url, params=None, **kwargs: (
+        FakeResponse(None, status_code=500) if params["siteId"] == "s2" else post(url, params=params)
+    )
+
+    courses = scraper.run()
+
+    assert [(c.site_id, c.resources_complete) for c in courses] == [("s1", True), ("s2", False)]
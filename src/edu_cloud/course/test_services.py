@@ -0,0 +1,66 @@
+"""
+CourseService 批量写库测试（内存数据库，爬虫结果用假数据代替）
+"""
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.common.write_queue import WriteQueue
+from src.edu_cloud.user.models import User
+from src.edu_cloud.course import models
+from src.edu_cloud.course.scraper import CourseScraper
+from src.edu_cloud.course.services import CourseService
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username="a", email="a@example.com", hashed_password="x"))
+    db.commit()
+    return db
+
+
+def resource(res_id, url="u1"):
+    return models.ScrapedResourceData(
+        resource_id=res_id, title=f"{res_id}.pdf", file_type="pdf", file_size="1MB",
+        download_url=url, parent_section="第01章", upload_time=None,
+    )
+
+
+def course(site_id, resources, name="课程", complete=True):
+    return models.ScrapedCourseData(
+        site_id=site_id, name=name, course_code="", term_name="", teacher_name="老师",
+        dept_name="", pic_url="", description="", resources=resources,
+        resources_complete=complete,
+    )
+
+
+def sync(db, courses):
+    # 写入单元在当前线程、测试数据库上执行
+    inline_queue = WriteQueue(session_factory=lambda: db, enabled=False)
+    with patch.object(CourseScraper, "run", return_value=courses), \
+            patch("src.edu_cloud.course.services.write_queue", inline_queue):
+        return CourseService.sync_courses(db, 1, "c", "p", ucloud=object())
+
+
+def test_sync_courses_upserts_and_removes_stale_resources():
+    db = make_db()
+    stats = sync(db, [course("s1", [resource("r1"), resource("r2")]), course("s2", [resource("r3")])])
+    assert stats == {"total_courses": 2, "new_courses": 2, "updated_courses": 0,
+                     "total_resources_found": 3, "new_resources_added": 3, "incomplete_courses": []}
+
+    # r2 上游已删除；s2 抓取失败时保留本地资源
+    stats = sync(db, [
+        course("s1", [resource("r1", url="u2"), resource("r4")], name="新课程名"),
+        course("s2", [], complete=False),
+    ])
+    assert stats == {"total_courses": 2, "new_courses": 0, "updated_courses": 2,
+                     "total_resources_found": 2, "new_resources_added": 1, "incomplete_courses": ["s2"]}
+
+    db.expire_all()
+    assert {r.id for r in db.query(models.CourseResource)} == {"r1", "r3", "r4"}
+    assert db.get(models.CourseResource, "r1").download_url == "u2"
+    assert db.get(models.Course, "s1").name == "新课程名"
@@ -1,5 +1,5 @@
 # 定义数据库表(Topic, Post)
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import List, Optional
@@ -12,6 +12,11 @@ from ..common.database import Base
 class DiscussionTopic(Base):
     """讨论区主题（帖子）"""
     __tablename__ = "discussion_topics"
+    __table_args__ = (
+        # 讨论列表：按课程过滤、按发帖时间排序
+        # 末尾带上 id，游标分页按 (created_at, id) 排序时不需要临时排序
+        Index("ix_discussion_topics_course_created_id", "course_id", "created_at", "id"),
+    )
 
     # 使用学校的 id 作为主键
     id = Column(String, primary_key=True) 
@@ -33,6 +38,10 @@ class DiscussionTopic(Base):
 class DiscussionPost(Base):
     """讨论区回复（楼层）"""
     __tablename__ = "discussion_posts"
+    __table_args__ = (
+        # 回复列表：按主题过滤、按楼层排序
+        Index("ix_discussion_posts_topic_floor", "topic_id", "floor"),
+    )
 
     id = Column(String, primary_key=True)
     
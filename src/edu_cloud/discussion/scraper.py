@@ -1,29 +1,33 @@
 # 爬虫逻辑(fetch_topics, fetch_posts)
 import time
 from datetime import datetime
-from typing import List, Dict
-from buptmw import BUPT_Auth
+from typing import List, Dict, Optional
+from ..common.ucloud_session import UCloudSession, session_cache
+from ..common.fetcher import paginate, parse_page
 from .models import ScrapedTopicData, ScrapedPostData
 
 API_BASE = "https://apiucloud.bupt.edu.cn"
+COURSE_PAGE_SIZE = 50
+TOPIC_PAGE_SIZE = 20
+POST_PAGE_SIZE = 50
 
 class DiscussionScraper:
-    def __init__(self, username, password):
+    def __init__(self, username=None, password=None, ucloud: Optional[UCloudSession] = None):
         self.username = username
         self.password = password
+        self.ucloud = ucloud
         self.session = None
         self.user_id = None
+        # 讨论区（主题或回复）抓取失败的课程，本次同步跳过
+        self.failed_sites = set()
 
     def _login(self):
-        """复用认证逻辑"""
+        """复用认证逻辑（优先复用共享会话）"""
         try:
-            auth = BUPT_Auth(cas={"username": self.username, "password": self.password})
-            self.session = auth.get_UCloud()
-            self.user_id = self.session.cookies.get("iClass-uuid") or \
-                           self.session.cookies.get("userId") or \
-                           getattr(self.session, "user_id", None)
-            if not self.user_id:
-                raise ValueError("UserID 缺失")
+            if self.ucloud is None:
+                self.ucloud = session_cache.acquire(self.username, self.password)
+            self.session = self.ucloud
+            self.user_id = self.ucloud.user_id
         except Exception as e:
             raise RuntimeError(f"认证失败: {str(e)}")
 
@@ -44,73 +48,77 @@ class DiscussionScraper:
     def _fetch_course_list(self) -> List[str]:
         """获取所有课程 ID"""
         url = f"{API_BASE}/ykt-site/site/list/student/current"
-        params = {"userId": self.user_id, "current": 1, "size": 50, "siteRoleCode": 2}
-        site_ids = []
-        try:
+        
+        def fetch_page(current, size):
+            params = {"userId": self.user_id, "current": current, "size": size, "siteRoleCode": 2}
             resp = self.session.get(url, params=params, headers=self._get_headers())
-            if resp.status_code == 200:
-                for c in resp.json().get("data", {}).get("records", []):
-                    if c.get("id"): site_ids.append(c.get("id"))
-        except: pass
-        return site_ids
+            if resp.status_code != 200:
+                raise RuntimeError(f"获取课程列表失败(第{current}页): HTTP {resp.status_code}")
+            return parse_page(resp.json())
+        
+        return [c.get("id") for c in paginate(fetch_page, COURSE_PAGE_SIZE) if c.get("id")]
 
     def _fetch_posts(self, topic_id) -> List[ScrapedPostData]:
         """3. 获取讨论回复列表 (对应接口3)"""
         url = f"{API_BASE}/ykt-activity/forum/list/topic-post"
-        # 你的截图显示是用 GET，参数在 Query
-        params = {"tid": topic_id, "userId": self.user_id, "current": 1, "size": 10}
         
-        posts = []
-        try:
+        def fetch_page(current, size):
+            # 你的截图显示是用 GET，参数在 Query
+            params = {"tid": topic_id, "userId": self.user_id, "current": current, "size": size}
             resp = self.session.get(url, params=params, headers=self._get_headers())
-            if resp.status_code == 200:
-                records = resp.json().get("data", {}).get("records", [])
-                for item in records:
-                    posts.append(ScrapedPostData(
-                        id=item.get("id"),
-                        author_name=item.get("userName"),
-                        content=item.get("body", ""),
-                        floor=item.get("floor", 1),
-                        created_at=self._parse_time(item.get("createTime"))
-                    ))
-        except: pass
+            if resp.status_code != 200:
+                raise RuntimeError(f"抓取回复失败({topic_id}, 第{current}页): HTTP {resp.status_code}")
+            return parse_page(resp.json())
+        
+        posts = []
+        for item in paginate(fetch_page, POST_PAGE_SIZE):
+            posts.append(ScrapedPostData(
+                id=item.get("id"),
+                author_name=item.get("userName"),
+                content=item.get("body", ""),
+                floor=item.get("floor", 1),
+                created_at=self._parse_time(item.get("createTime"))
+            ))
         return posts
 
     def _fetch_topics(self, site_id) -> List[ScrapedTopicData]:
         """1. 获取某门课的讨论列表 (对应接口1)"""
         url = f"{API_BASE}/ykt-activity/forum/page"
-        params = {"siteId": site_id, "userId": self.user_id, "current": 1, "size": 5, "roleType": 1}
         
-        topics = []
-        try:
+        def fetch_page(current, size):
+            params = {"siteId": site_id, "userId": self.user_id, "current": current, "size": size, "roleType": 1}
             resp = self.session.get(url, params=params, headers=self._get_headers())
-            if resp.status_code == 200:
-                records = resp.json().get("data", {}).get("records", [])
-                for item in records:
-                    t_id = item.get("id")
-                    
-                    # 顺便抓取回复
-                    posts = self._fetch_posts(t_id)
-                    
-                    topics.append(ScrapedTopicData(
-                        id=t_id,
-                        course_id=site_id,
-                        title=item.get("title"),
-                        author_name=item.get("userName"),
-                        content=item.get("body", ""),
-                        view_count=item.get("viewNum", 0),
-                        reply_count=item.get("replyNum", 0),
-                        like_count=item.get("likeNum", 0),
-                        created_at=self._parse_time(item.get("createTime")),
-                        posts=posts
-                    ))
-        except Exception as e:
-            print(f"抓取讨论区失败({site_id}): {e}")
+            if resp.status_code != 200:
+                raise RuntimeError(f"抓取讨论区失败({site_id}, 第{current}页): HTTP {resp.status_code}")
+            return parse_page(resp.json())
+        
+        topics = []
+        for item in paginate(fetch_page, TOPIC_PAGE_SIZE):
+            t_id = item.get("id")
+            
+            # 顺便抓取回复
+            posts = self._fetch_posts(t_id)
             
+            topics.append(ScrapedTopicData(
+                id=t_id,
+                course_id=site_id,
+                title=item.get("title"),
+                author_name=item.get("userName"),
+                content=item.get("body", ""),
+                view_count=item.get("viewNum", 0),
+                reply_count=item.get("replyNum", 0),
+                like_count=item.get("likeNum", 0),
+                created_at=self._parse_time(item.get("createTime")),
+                posts=posts
+            ))
         return topics
 
     def run(self) -> List[ScrapedTopicData]:
-        """执行全流程"""
+        """
+        执行全流程
+        课程列表抓取失败时抛出异常；某门课的主题或回复抓取失败时跳过这门课并记入 failed_sites，
+        不把抓到一半的主题当成完整结果写入
+        """
         self._login()
         
         all_topics = []
@@ -119,7 +127,12 @@ class DiscussionScraper:
         
         # 2. 遍历每门课查讨论区
         for cid in course_ids:
-            course_topics = self._fetch_topics(cid)
+            try:
+                course_topics = self._fetch_topics(cid)
+            except Exception as e:
+                print(f"抓取讨论区失败({cid}): {e}")
+                self.failed_sites.add(cid)
+                continue
             all_topics.extend(course_topics)
             
         return all_topics
\ No newline at end of file
@@ -1,6 +1,12 @@
 # 业务逻辑(sync_discussions)
 import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
+from ..common.bulk import bulk_upsert, chunked
+from ..common.pagination import Page, keyset_page
+from ..common.ucloud_session import UCloudSession
+from ..common.write_queue import write_queue
 from . import models
 from .scraper import DiscussionScraper
 from ..course.models import Course  # 需要用来关联课程名
@@ -13,15 +19,17 @@ class DiscussionService:
     """
 
     @staticmethod
-    def sync_discussions(db: Session, cas_user: str, cas_pass: str):
+    def sync_discussions(db: Session, cas_user: str, cas_pass: str,
+                         ucloud: Optional[UCloudSession] = None):
         """
         同步流程：抓取 -> 打印日志 -> 存库
         注意：讨论区是公开的，不属于特定“用户”，而是属于“课程”。
+        ucloud: 可选的共享 UCloud 会话，传入时不再单独登录 CAS
         """
         print(f"--- [Service] 开始同步讨论区数据 ---")
         
         # 1. 调用爬虫
-        scraper = DiscussionScraper(cas_user, cas_pass)
+        scraper = DiscussionScraper(cas_user, cas_pass, ucloud=ucloud)
         topic_list = scraper.run()
         
         # 2. 【详细日志】打印抓取结果
@@ -37,66 +45,90 @@ class DiscussionService:
             print(f"{topic.course_id:<20} | {post_count:<6} | {topic.author_name:<10} | {title_short}")
         print("-" * 70 + "\n")
 
-        # 3. 存入数据库
-        new_topic_count = 0
-        new_post_count = 0
+        # 3. 存入数据库：交给写线程用短事务执行
+        new_topic_count, new_post_count = write_queue.run(
+            lambda wdb: DiscussionService.save_discussions(wdb, topic_list),
+            label="discussions"
+        )
         
-        for item in topic_list:
-            # --- A. 处理主题 (Topic) ---
-            db_topic = db.query(models.DiscussionTopic).filter(models.DiscussionTopic.id == item.id).first()
-            
-            if db_topic:
-                # 更新动态数据
-                db_topic.view_count = item.view_count
-                db_topic.reply_count = item.reply_count
-                db_topic.like_count = item.like_count
-            else:
-                # 新增
-                new_topic = models.DiscussionTopic(
-                    id=item.id,
-                    course_id=item.course_id,
-                    title=item.title,
-                    author_name=item.author_name,
-                    content=item.content,
-                    view_count=item.view_count,
-                    reply_count=item.reply_count,
-                    like_count=item.like_count,
-                    created_at=item.created_at
-                )
-                db.add(new_topic)
-                new_topic_count += 1
-            
-            # --- B. 处理回复 (Posts) ---
-            for post in item.posts:
-                db_post = db.query(models.DiscussionPost).filter(models.DiscussionPost.id == post.id).first()
-                if not db_post:
-                    new_post = models.DiscussionPost(
-                        id=post.id,
-                        topic_id=item.id, # 关联外键
-                        author_name=post.author_name,
-                        content=post.content,
-                        floor=post.floor,
-                        created_at=post.created_at
-                    )
-                    db.add(new_post)
-                    new_post_count += 1
-
-        db.commit()
+        if scraper.failed_sites:
+            logger.warning(f"{len(scraper.failed_sites)} 门课程的讨论区抓取失败，本次未同步: {sorted(scraper.failed_sites)}")
         
         return {
             "total_topics": len(topic_list),
             "new_topics": new_topic_count,
             "total_posts_found": total_posts_count,
-            "new_posts_added": new_post_count
+            "new_posts_added": new_post_count,
+            "failed_courses": sorted(scraper.failed_sites)
         }
 
     @staticmethod
-    def get_course_topics(db: Session, course_id: str):
-        """获取某门课的讨论列表"""
-        return db.query(models.DiscussionTopic)\
-            .filter(models.DiscussionTopic.course_id == course_id)\
-            .order_by(models.DiscussionTopic.created_at.desc())\
-            .all()
+    def save_discussions(db: Session, topic_list: List[models.ScrapedTopicData]) -> Tuple[int, int]:
+        """把抓取结果写入数据库，返回 (新增主题数, 新增回复数)"""
+        # 讨论区不区分用户，多个同学可能同时同步同一批主题：
+        # 统一用 INSERT ... ON CONFLICT 写入，重复执行和并发执行都不会触发主键冲突
+        now = datetime.now(timezone.utc)
+        topic_rows = {}
+        post_rows = {}
+        for item in topic_list:
+            topic_rows[item.id] = dict(
+                id=item.id,
+                course_id=item.course_id,
+                title=item.title,
+                author_name=item.author_name,
+                content=item.content,
+                view_count=item.view_count,
+                reply_count=item.reply_count,
+                like_count=item.like_count,
+                created_at=item.created_at,
+                updated_at=now
+            )
+            for post in item.posts:
+                post_rows[post.id] = dict(
+                    id=post.id,
+                    topic_id=item.id, # 关联外键
+                    author_name=post.author_name,
+                    content=post.content,
+                    floor=post.floor,
+                    created_at=post.created_at
+                )
+        
+        # 预取已有 ID，只用于统计新增数量
+        existing_topic_ids = set()
+        for chunk in chunked(list(topic_rows)):
+            existing_topic_ids.update(
+                row[0] for row in db.query(models.DiscussionTopic.id).filter(models.DiscussionTopic.id.in_(chunk))
+            )
+        existing_post_ids = set()
+        for chunk in chunked(list(post_rows)):
+            existing_post_ids.update(
+                row[0] for row in db.query(models.DiscussionPost.id).filter(models.DiscussionPost.id.in_(chunk))
+            )
+        new_topic_count = len(set(topic_rows) - existing_topic_ids)
+        new_post_count = len(set(post_rows) - existing_post_ids)
+        
+        # --- A. 处理主题 (Topic)：已存在的只更新动态数据 ---
+        bulk_upsert(
+            db, models.DiscussionTopic, list(topic_rows.values()),
+            index_elements=["id"],
+            update_columns=["view_count", "reply_count", "like_count", "updated_at"],
+        )
+        
+        # --- B. 处理回复 (Posts)：回复内容不变，已存在的跳过 ---
+        bulk_upsert(
+            db, models.DiscussionPost, list(post_rows.values()),
+            index_elements=["id"],
+            update_columns=[],
+        )
+
+        db.commit()
+        return new_topic_count, new_post_count
+
+    @staticmethod
+    def get_course_topics(db: Session, course_id: str, limit: int, after: Optional[str] = None) -> Page:
+        """获取某门课的讨论列表（按发帖时间倒序游标分页）"""
+        query = db.query(models.DiscussionTopic).filter(models.DiscussionTopic.course_id == course_id)
+        return keyset_page(query, models.DiscussionTopic.created_at, models.DiscussionTopic.id, limit, after)
 
     @staticmethod
     def get_topic_detail(db: Session, topic_id: str):
@@ -0,0 +1,126 @@
+"""
+DiscussionService 冲突安全写库测试（文件数据库，爬虫结果用假数据代替）
+"""
+import threading
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.common.write_queue import WriteQueue
+from src.edu_cloud.discussion import models
+from src.edu_cloud.discussion.scraper import DiscussionScraper
+from src.edu_cloud.discussion.services import DiscussionService
+
+
+def topic(t_id, views=1, posts=2):
+    return models.ScrapedTopicData(
+        id=t_id, course_id="s1", title=f"主题{t_id}", author_name="同学", content="",
+        view_count=views, reply_count=posts, like_count=0, created_at=None,
+        posts=[
+            models.ScrapedPostData(id=f"{t_id}-p{i}", author_name="同学", content="",
+                                   floor=i + 1, created_at=None)
+            for i in range(posts)
+        ],
+    )
+
+
+def sync(SessionLocal):
+    db = SessionLocal()
+    try:
+        return DiscussionService.sync_discussions(db, "c", "p", ucloud=object())
+    finally:
+        db.close()
+
+
+def test_sync_discussions_is_idempotent_and_updates_counters(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'd.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+    queue = WriteQueue(session_factory=SessionLocal)
+
+    errors = []
+
+    def worker():
+        try:
+            sync(SessionLocal)
+        except Exception as e:  # pragma: no cover - 仅在回归时出现
+            errors.append(e)
+
+    # 在线程外打补丁：各线程各自 patch / 还原会互相覆盖，测试结束后留下假的 run
+    with patch.object(DiscussionScraper, "run") as run, \
+            patch("src.edu_cloud.discussion.services.write_queue", queue):
+        # 两个同学同时同步同一批主题（写入由写线程串行执行）
+        run.return_value = [topic(f"t{i}") for i in range(20)]
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+
+        run.return_value = [topic("t0", views=99, posts=3)]
+        stats = sync(SessionLocal)
+    queue.stop()
+    assert stats == {"total_topics": 1, "new_topics": 0, "total_posts_found": 3, "new_posts_added": 1,
+                     "failed_courses": []}
+
+    db = SessionLocal()
+    assert db.query(models.DiscussionTopic).count() == 20
+    assert db.query(models.DiscussionPost).count() == 41
+    assert db.get(models.DiscussionTopic, "t0").view_count == 99
+    db.close()
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return {"data": self._data}
+
+
+class FakeForum:
+    """s1 的讨论区正常返回；s2 的回复接口失败"""
+
+    user_id = "u1"
+    access_token = "t"
+
+    def __init__(self, course_list_status=200):
+        self.course_list_status = course_list_status
+
+    def get(self, url, params=None, **kwargs):
+        if url.endswith("/site/list/student/current"):
+            return FakeResponse({"records": [{"id": "s1"}, {"id": "s2"}]}, self.course_list_status)
+        if url.endswith("/forum/page"):
+            site = params["siteId"]
+            return FakeResponse({"records": [{"id": f"{site}-t1", "title": "主题", "userName": "同学"}], "total": 1})
+        if params["tid"].startswith("s2"):
+            return FakeResponse(None, 500)
+        return FakeResponse({"records": [{"id": f"{params['tid']}-p1", "floor": 1}], "total": 1})
+
+
+def make_scraper(forum):
+    scraper = DiscussionScraper(ucloud=forum)
+    scraper._login = lambda: None
+    scraper.session = forum
+    scraper.user_id = forum.user_id
+    return scraper
+
+
+def test_failed_course_is_skipped_not_saved_half_crawled():
+    scraper = make_scraper(FakeForum())
+
+    topics = scraper.run()
+
+    assert [t.id for t in topics] == ["s1-t1"]
+    assert [p.id for p in topics[0].posts] == ["s1-t1-p1"]
+    assert scraper.failed_sites == {"s2"}
+
+
+def test_failed_course_list_raises():
+    with pytest.raises(RuntimeError, match="HTTP 503"):
+        make_scraper(FakeForum(course_list_status=503)).run()
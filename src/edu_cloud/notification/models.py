@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Optional
@@ -11,6 +11,12 @@ from ..common.database import Base
 class Notification(Base):
     """系统公告/通知表"""
     __tablename__ = "notifications"
+    __table_args__ = (
+        # 公告列表：按用户（及课程名标题）过滤、按发布时间排序
+        # 末尾带上 id（字符串主键不在索引的 rowid 里），游标分页按 (publish_time, id) 排序时不需要临时排序
+        Index("ix_notifications_owner_publish_id", "owner_id", "publish_time", "id"),
+        Index("ix_notifications_owner_title_publish", "owner_id", "title", "publish_time"),
+    )
 
     # 使用学校的 id 作为主键 (e.g. "2000742433166016525")
     id = Column(String, primary_key=True)
@@ -27,6 +33,14 @@ class Notification(Base):
     publish_time = Column(DateTime, nullable=True) # newsCopyTime 或 createTime
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
+
+class NotificationSyncState(Base):
+    """公告同步状态表（记录每个用户上次全量对账时间）"""
+    __tablename__ = "notification_sync_states"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_full_sync_at = Column(DateTime, nullable=True)
+
 # ==========================================
 # 2. 数据传输对象 (DTO)
 # ==========================================
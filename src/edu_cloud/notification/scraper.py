@@ -1,30 +1,31 @@
-import time
 from datetime import datetime
-from typing import List, Dict
-from buptmw import BUPT_Auth
+from typing import List, Dict, Optional, Set
+from ..common.ucloud_session import UCloudSession, session_cache
+from ..common.fetcher import iter_pages, parse_page
 from .models import ScrapedNotificationData
 
 API_BASE = "https://apiucloud.bupt.edu.cn/ykt-basics/api"
+PAGE_SIZE = 10  # 保持 10 条，稳扎稳打
 
 class NotificationScraper:
-    def __init__(self, username, password):
+    def __init__(self, username=None, password=None, ucloud: Optional[UCloudSession] = None):
         self.username = username
         self.password = password
+        self.ucloud = ucloud
         self.session = None
         self.user_id = None
+        self.complete = False  # 本次是否读完了需要的所有页（中途因空页、重复页停止时为 False）
 
     def _login(self):
-        """复用认证逻辑"""
-        print(f"--- [Scraper] 正在登录 CAS: {self.username} ---")
+        """复用认证逻辑（优先复用共享会话）"""
         try:
-            auth = BUPT_Auth(cas={"username": self.username, "password": self.password})
-            self.session = auth.get_UCloud()
+            if self.ucloud is None:
+                print(f"--- [Scraper] 正在获取 UCloud 会话: {self.username} ---")
+                self.ucloud = session_cache.acquire(self.username, self.password)
+            self.session = self.ucloud
+            self.user_id = self.ucloud.user_id
             
-            self.user_id = self.session.cookies.get("iClass-uuid") or \
-                           self.session.cookies.get("userId") or \
-                           getattr(self.session, "user_id", None)
-            
-            token = getattr(self.session, "access_token", "未找到")
+            token = self.ucloud.access_token or "未找到"
             print(f"✅ 登录成功!")
             print(f"   - 获取到的 UserID: {self.user_id}")
             print(f"   - 获取到的 Token: {str(token)[:10]}...")
@@ -53,81 +54,93 @@ class NotificationScraper:
         except:
             return None
 
-    def run(self) -> List[ScrapedNotificationData]:
-        """抓取公告列表（自动翻页版 - 修正参数传递）"""
+    def _fetch_page(self, current: int, size: int):
+        """请求一页公告，返回 (records, total)；失败时抛出异常，不能当成空页（否则会提前停止翻页并被记为全量完成）"""
+        url = f"{API_BASE}/inform/news/list"
+        # 策略：把参数同时塞给 params (URL参数) 和 json (Body参数)
+        # 这样无论服务器读哪里，都能读到页码
+        req_data = {
+            "newsCopyPersonId": self.user_id,
+            "current": current,
+            "size": size
+        }
+        print(f"   -> 正在请求第 {current} 页...")
+        resp = self.session.post(url, params=req_data, json=req_data, headers=self._get_headers())
+        if resp.status_code != 200:
+            raise RuntimeError(f"第 {current} 页公告请求失败: HTTP {resp.status_code}")
+        return parse_page(resp.json())
+
+    def run(self, known_ids: Optional[Set[str]] = None,
+            max_pages: Optional[int] = None) -> List[ScrapedNotificationData]:
+        """
+        抓取公告列表（自动翻页：第 1 页读取 total，剩余页并发请求）
+
+        Args:
+            known_ids: 本地已有的公告 ID。传入时为增量模式：公告按时间倒序返回，
+                       某一页全部是已知 ID 时停止翻页，且只返回新公告
+            max_pages: 最多抓取的页数（快速同步只抓第 1 页）
+
+        请求失败时抛出异常；翻页异常中断时 self.complete 为 False，调用方不应把结果当成完整列表
+        """
+        self.complete = False
         self._login()
         if not self.user_id: return []
 
-        url = f"{API_BASE}/inform/news/list"
         all_results = []
-        current_page = 1
+        seen_ids = set()
+        incremental = known_ids is not None
         
-        print(f"--- [Scraper] 开始全量抓取公告 ---")
+        print(f"--- [Scraper] 开始{'增量' if incremental else '全量'}抓取公告 ---")
 
-        while True:
-            # 【核心修改点】
-            # 策略：把参数同时塞给 params (URL参数) 和 json (Body参数)
-            # 这样无论服务器读哪里，都能读到页码
-            req_data = {
-                "newsCopyPersonId": self.user_id,
-                "current": current_page,
-                "size": 10  # 保持 10 条，稳扎稳打
-            }
+        # 增量模式通常一两页就结束，不做多页预取，避免浪费请求
+        for page_no, records in enumerate(
+                iter_pages(self._fetch_page, PAGE_SIZE, max_workers=1 if incremental or max_pages else None), 1):
+            if not records:
+                print("✅ 数据为空，停止翻页。")
+                # 第 1 页为空说明确实没有公告；后面的页为空说明上游少给了数据
+                self.complete = page_no == 1
+                break
             
-            try:
-                print(f"   -> 正在请求第 {current_page} 页...")
-                
-                # 注意这里：params=req_data 把参数放URL里，json=req_data 把参数放Body里
-                resp = self.session.post(url, params=req_data, json=req_data, headers=self._get_headers())
-                
-                if resp.status_code != 200:
-                    print(f"❌ 第 {current_page} 页请求失败: {resp.status_code}")
-                    break
-                
-                data = resp.json()
-                records = data.get("data", {}).get("records", [])
-                total_server = data.get("data", {}).get("total", 0)
-                
-                # 去重校验：如果这一页的第一条数据的ID，和我们已经抓到的最后一条ID一样
-                # 说明翻页失败了，服务器一直在返回同一页
-                if records and all_results and records[0].get("id") == all_results[-1].id:
-                    print("⚠️ 警告：检测到重复数据，服务器可能忽略了翻页参数。停止抓取。")
-                    break
-
-                if not records:
-                    print("✅ 数据为空，停止翻页。")
-                    break
-                
-                # 解析当前页数据
-                page_added_count = 0
-                for item in records:
-                    # 再次做一个内存级去重，防止列表里堆积重复数据
-                    n_id = str(item.get("id"))
-                    if any(x.id == n_id for x in all_results):
-                        continue
-
-                    all_results.append(ScrapedNotificationData(
-                        id=n_id,
-                        title=item.get("newsTitle"),
-                        content=item.get("newsInfo"),
-                        msg_type=item.get("type"),
-                        is_read=bool(item.get("isRead", 0)),
-                        publish_time=self._parse_time(item.get("createTime") or item.get("newsCopyTime"))
-                    ))
-                    page_added_count += 1
-                
-                print(f"      本页解析 {len(records)} 条，有效新增 {page_added_count} 条。当前累计: {len(all_results)}/{total_server}")
-
-                # 判断是否抓够了
-                if len(all_results) >= total_server or len(records) < 10:
-                    print("✅ 所有页面抓取完毕！")
-                    break
-                
-                current_page += 1
-                time.sleep(0.2) 
-                
-            except Exception as e:
-                print(f"❌ 抓取中断: {e}")
+            # 去重校验：如果这一页的第一条数据的ID，和我们已经抓到的最后一条ID一样
+            # 说明翻页失败了，服务器一直在返回同一页
+            if all_results and str(records[0].get("id")) == all_results[-1].id:
+                print("⚠️ 警告：检测到重复数据，服务器可能忽略了翻页参数。停止抓取。")
                 break
             
-        return all_results
\ No newline at end of file
+            # 解析当前页数据
+            page_added_count = 0
+            page_known_count = 0
+            for item in records:
+                # 再次做一个内存级去重，防止列表里堆积重复数据
+                n_id = str(item.get("id"))
+                if n_id in seen_ids:
+                    continue
+                seen_ids.add(n_id)
+                if incremental and n_id in known_ids:
+                    page_known_count += 1
+                    continue
+
+                all_results.append(ScrapedNotificationData(
+                    id=n_id,
+                    title=item.get("newsTitle"),
+                    content=item.get("newsInfo"),
+                    msg_type=item.get("type"),
+                    is_read=bool(item.get("isRead", 0)),
+                    publish_time=self._parse_time(item.get("createTime") or item.get("newsCopyTime"))
+                ))
+                page_added_count += 1
+            
+            print(f"      本页解析 {len(records)} 条，有效新增 {page_added_count} 条。当前累计: {len(all_results)}")
+            
+            if incremental and page_known_count == len(records):
+                print("✅ 本页公告均已同步过，停止翻页。")
+                self.complete = True
+                break
+            if max_pages and page_no >= max_pages:
+                self.complete = True
+                break
+        else:
+            self.complete = True
+        
+        print("✅ 所有页面抓取完毕！")
+        return all_results
@@ -1,5 +1,12 @@
 import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
+from ..common.bulk import bulk_insert, chunked
+from ..common.config import settings
+from ..common.pagination import Page, keyset_page
+from ..common.ucloud_session import UCloudSession
+from ..common.write_queue import write_queue
 from . import models
 from .scraper import NotificationScraper
 
@@ -7,12 +14,40 @@ logger = logging.getLogger(__name__)
 
 class NotificationService:
     @staticmethod
-    def sync_notifications(db: Session, user_id: int, cas_user: str, cas_pass: str):
-        """同步公告"""
-        print(f"--- [Service] 开始同步公告 ---")
+    def _needs_full_sync(state: Optional[models.NotificationSyncState], now: datetime) -> bool:
+        """没有全量对账记录，或距上次全量对账超过 notification_full_sync_hours 时需要全量"""
+        if state is None or state.last_full_sync_at is None:
+            return True
+        return now - state.last_full_sync_at >= timedelta(hours=settings.notification_full_sync_hours)
+
+    @staticmethod
+    def sync_notifications(db: Session, user_id: int, cas_user: str, cas_pass: str,
+                           ucloud: Optional[UCloudSession] = None, full: bool = False,
+                           head_only: bool = False):
+        """
+        同步公告（ucloud: 可选的共享 UCloud 会话）
+
+        默认增量同步：遇到整页已知公告即停止翻页，只写入新公告；
+        首次同步、full=True 或距上次全量超过 notification_full_sync_hours 时全量对账，顺带刷新已读状态
+        head_only=True（快速同步）：只抓第 1 页的新公告，不做全量对账
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        state = db.get(models.NotificationSyncState, user_id)
+        full = not head_only and (full or NotificationService._needs_full_sync(state, now))
+        print(f"--- [Service] 开始同步公告（{'全量' if full else '第 1 页' if head_only else '增量'}） ---")
         
-        scraper = NotificationScraper(cas_user, cas_pass)
-        data_list = scraper.run()
+        # 一次查询取出该用户已有公告的 ID 和阅读状态
+        known = dict(
+            db.query(models.Notification.id, models.Notification.is_read)
+            .filter(models.Notification.owner_id == user_id)
+            .all()
+        )
+        
+        # 结束只读事务再开始抓取，等待 UCloud 期间不占用数据库连接
+        db.commit()
+        
+        scraper = NotificationScraper(cas_user, cas_pass, ucloud=ucloud)
+        data_list = scraper.run(known_ids=None if full else set(known), max_pages=1 if head_only else None)
         
         # 详细日志
         print(f"\n>>> 公告抓取清单 (共{len(data_list)}条) <<<")
@@ -25,38 +60,82 @@ class NotificationService:
             print(f"{item.msg_type:<10} | {item.title[:12]:<15} | {content_clean}")
         print("-" * 60 + "\n")
 
-        # 入库
-        new_count = 0
-        update_count = 0
+        # 翻页没有读完时不记录全量对账时间，下次同步仍会全量
+        full_complete = full and scraper.complete
+        if full and not full_complete:
+            logger.warning("公告全量抓取未读完所有页，本次不记录全量对账时间 (user_id=%s)", user_id)
+
+        # 入库：交给写线程用短事务执行
+        new_count, update_count = write_queue.run(
+            lambda wdb: NotificationService.save_notifications(wdb, user_id, data_list, full_complete, now),
+            label="notifications"
+        )
+        return new_count, update_count, len(data_list)
+
+    @staticmethod
+    def save_notifications(db: Session, user_id: int, data_list: List[models.ScrapedNotificationData],
+                           full: bool, now: datetime) -> Tuple[int, int]:
+        """
+        把抓取结果写入数据库，返回 (新增数, 更新数)
+        已有公告按阅读状态分组批量更新，新公告批量插入；全量同步时记录对账时间
+        """
+        known = dict(
+            db.query(models.Notification.id, models.Notification.is_read)
+            .filter(models.Notification.owner_id == user_id)
+            .all()
+        )
         
+        read_changes = {True: [], False: []}
+        candidates = []
         for item in data_list:
-            exists = db.query(models.Notification).filter(models.Notification.id == item.id).first()
-            
-            if exists:
-                # 更新阅读状态
-                if exists.is_read != item.is_read:
-                    exists.is_read = item.is_read
-                    update_count += 1
+            if item.id in known:
+                if known[item.id] != item.is_read:
+                    read_changes[item.is_read].append(item.id)
             else:
-                new_msg = models.Notification(
-                    id=item.id,
-                    owner_id=user_id,
-                    title=item.title,
-                    content=item.content,
-                    msg_type=item.msg_type,
-                    is_read=item.is_read,
-                    publish_time=item.publish_time
-                )
-                db.add(new_msg)
-                new_count += 1
+                candidates.append(item)
+        
+        # 公告 ID 是全表主键：排除已属于其他本地用户的记录（与逐条查询时的行为一致）
+        taken = set()
+        candidate_ids = [item.id for item in candidates]
+        for chunk in chunked(candidate_ids):
+            taken.update(row[0] for row in db.query(models.Notification.id)
+                         .filter(models.Notification.id.in_(chunk)).all())
+        
+        new_rows = [
+            dict(
+                id=item.id,
+                owner_id=user_id,
+                title=item.title,
+                content=item.content,
+                msg_type=item.msg_type,
+                is_read=item.is_read,
+                publish_time=item.publish_time,
+                created_at=now
+            )
+            for item in candidates if item.id not in taken
+        ]
+        bulk_insert(db, models.Notification, new_rows)
+        
+        update_count = 0
+        for is_read, ids in read_changes.items():
+            for chunk in chunked(ids):
+                db.query(models.Notification)\
+                    .filter(models.Notification.id.in_(chunk))\
+                    .update({models.Notification.is_read: is_read}, synchronize_session=False)
+                update_count += len(chunk)
+        
+        if full:
+            state = db.get(models.NotificationSyncState, user_id)
+            if state is None:
+                state = models.NotificationSyncState(owner_id=user_id)
+                db.add(state)
+            state.last_full_sync_at = now
                 
         db.commit()
-        return new_count, update_count, len(data_list)
+        return len(new_rows), update_count
 
     @staticmethod
-    def get_user_notifications(db: Session, user_id: int):
-        """获取本地列表"""
-        return db.query(models.Notification)\
-            .filter(models.Notification.owner_id == user_id)\
-            .order_by(models.Notification.publish_time.desc())\
-            .all()
\ No newline at end of file
+    def get_user_notifications(db: Session, user_id: int, limit: int, after: Optional[str] = None) -> Page:
+        """获取本地列表（按发布时间倒序游标分页）"""
+        query = db.query(models.Notification).filter(models.Notification.owner_id == user_id)
+        return keyset_page(query, models.Notification.publish_time, models.Notification.id, limit, after)
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+公告列表接口分页测试
+"""
+import json
+from datetime import datetime, timedelta
+
+from main import create_app
+from src.edu_cloud.common.auth import identity_cache
+from src.edu_cloud.common.database import SessionLocal
+from src.edu_cloud.common.security import get_password_hash
+from src.edu_cloud.common.token_manager import revocation_cache
+from src.edu_cloud.notification import models
+from src.edu_cloud.user.models import User
+
+
+class TestNotificationListPagination:
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.db = SessionLocal()
+        self.user = User(username='pageuser', email='page@example.com',
+                         hashed_password=get_password_hash('testpass123'), is_active=True)
+        self.db.add(self.user)
+        self.db.commit()
+        start = datetime(2024, 1, 1)
+        self.db.add_all([
+            models.Notification(id=f"page-n{i}", owner_id=self.user.id, title=f"公告{i}",
+                                content="<p>内容</p>", publish_time=start + timedelta(days=i))
+            for i in range(5)
+        ])
+        self.db.commit()
+
+    def teardown_method(self):
+        self.db.query(models.Notification).filter(models.Notification.owner_id == self.user.id).delete()
+        self.db.query(User).filter(User.username == 'pageuser').delete()
+        self.db.commit()
+        self.db.close()
+        identity_cache.clear()
+        revocation_cache.clear()
+
+    def auth_headers(self):
+        response = self.client.post('/api/user/login',
+                                    data=json.dumps({'username': 'pageuser', 'password': 'testpass123'}),
+                                    content_type='application/json')
+        return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+    def test_pages_follow_cursor_with_total_header(self):
+        headers = self.auth_headers()
+        ids, after = [], None
+        while True:
+            query = {'limit': 2, **({'after': after} if after else {})}
+            response = self.client.get('/api/notification/', query_string=query, headers=headers)
+            assert response.status_code == 200
+            # 只有第一页统计总数，翻页时不再 COUNT
+            if after:
+                assert 'X-Total-Count' not in response.headers
+            else:
+                assert response.headers['X-Total-Count'] == '5'
+            body = json.loads(response.data)
+            assert len(body['data']) <= 2
+            ids += [n['id'] for n in body['data']]
+            after = body['next_cursor']
+            if not after:
+                break
+
+        assert ids == [f"page-n{i}" for i in range(4, -1, -1)]
+
+    def test_total_on_later_page_only_when_requested(self):
+        headers = self.auth_headers()
+        first = json.loads(self.client.get('/api/notification/', query_string={'limit': 2}, headers=headers).data)
+        query = {'limit': 2, 'after': first['next_cursor'], 'count': 1}
+        response = self.client.get('/api/notification/', query_string=query, headers=headers)
+        assert response.status_code == 200
+        assert response.headers['X-Total-Count'] == '5'
+
+    def test_invalid_page_args_are_rejected(self):
+        headers = self.auth_headers()
+        assert self.client.get('/api/notification/?limit=abc', headers=headers).status_code == 400
+        assert self.client.get('/api/notification/?limit=0', headers=headers).status_code == 400
+        assert self.client.get('/api/notification/?after=%%%', headers=headers).status_code == 400
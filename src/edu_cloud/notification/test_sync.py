@@ -0,0 +1,157 @@
+"""
+公告增量同步测试（使用假会话和内存数据库，不访问网络）
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.common.write_queue import WriteQueue
+from src.edu_cloud.user.models import User
+from src.edu_cloud.notification import models
+from src.edu_cloud.notification.scraper import NotificationScraper
+from src.edu_cloud.notification.services import NotificationService
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status_code = 200
+        self._data = data
+
+    def json(self):
+        return {"data": self._data}
+
+
+class FakeUCloud:
+    """按时间倒序返回 total 条公告，记录请求过的页码"""
+
+    def __init__(self, total, read_ids=()):
+        self.user_id = "u1"
+        self.access_token = "t"
+        self.total = total
+        self.read_ids = set(read_ids)
+        self.pages = []
+
+    def post(self, url, params=None, **kwargs):
+        current, size = params["current"], params["size"]
+        self.pages.append(current)
+        start = (current - 1) * size
+        records = [
+            {"id": f"n{i}", "newsTitle": f"公告{i}", "newsInfo": "", "type": "通知",
+             "isRead": int(f"n{i}" in self.read_ids), "createTime": "2024-01-01 10:00"}
+            for i in range(self.total - 1 - start, max(self.total - 1 - start - size, -1), -1)
+        ]
+        return FakeResponse({"records": records, "total": self.total})
+
+
+def make_scraper(fake):
+    scraper = NotificationScraper(ucloud=MagicMock())
+    scraper._login = lambda: None
+    scraper.session = fake
+    scraper.user_id = fake.user_id
+    return scraper
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    db.commit()
+    return db
+
+
+def test_incremental_run_stops_at_first_known_page():
+    fake = FakeUCloud(total=100)
+    known = {f"n{i}" for i in range(85)}
+
+    results = make_scraper(fake).run(known_ids=known)
+
+    assert [r.id for r in results] == [f"n{i}" for i in range(99, 84, -1)]
+    # 第 3 页整页已知后停止（最多预取下一页）
+    assert fake.pages[:3] == [1, 2, 3]
+    assert len(fake.pages) <= 4
+
+
+def test_service_full_sync_then_incremental():
+    db = make_db()
+
+    fake = FakeUCloud(total=30)
+
+    def fake_login(scraper):
+        scraper.session = fake
+        scraper.user_id = fake.user_id
+
+    # 写入单元在当前线程、测试数据库上执行
+    inline_queue = WriteQueue(session_factory=lambda: db, enabled=False)
+    with patch.object(NotificationScraper, "_login", fake_login), \
+            patch("src.edu_cloud.notification.services.write_queue", inline_queue):
+        assert NotificationService.sync_notifications(db, 1, "c", "p") == (30, 0, 30)
+        assert db.get(models.NotificationSyncState, 1).last_full_sync_at is not None
+
+        # 上游新增 5 条：增量同步遇到整页已知即停止，只写入新公告
+        fake = FakeUCloud(total=35)
+        assert NotificationService.sync_notifications(db, 1, "c", "p") == (5, 0, 5)
+        assert len(fake.pages) < 4
+
+        # 全量对账刷新已读状态
+        fake = FakeUCloud(total=35, read_ids={"n0", "n1"})
+        assert NotificationService.sync_notifications(db, 1, "c", "p", full=True) == (0, 2, 35)
+
+    assert db.query(models.Notification).count() == 35
+    assert db.get(models.Notification, "n0").is_read is True
+
+
+def test_head_only_sync_fetches_first_page_without_full_reconcile():
+    db = make_db()
+    fake = FakeUCloud(total=30)
+
+    def fake_login(scraper):
+        scraper.session = fake
+        scraper.user_id = fake.user_id
+
+    inline_queue = WriteQueue(session_factory=lambda: db, enabled=False)
+    with patch.object(NotificationScraper, "_login", fake_login), \
+            patch("src.edu_cloud.notification.services.write_queue", inline_queue):
+        # 从未全量同步过，快速同步也只抓第 1 页
+        assert NotificationService.sync_notifications(db, 1, "c", "p", head_only=True) == (10, 0, 10)
+
+    assert fake.pages == [1]
+    assert db.get(models.NotificationSyncState, 1) is None
+
+
+def test_full_sync_with_failed_or_short_page_is_not_recorded_as_complete():
+    db = make_db()
+    fake = FakeUCloud(total=30)
+    post = fake.post
+
+    def fake_login(scraper):
+        scraper.session = fake
+        scraper.user_id = fake.user_id
+
+    inline_queue = WriteQueue(session_factory=lambda: db, enabled=False)
+    with patch.object(NotificationScraper, "_login", fake_login), \
+            patch("src.edu_cloud.notification.services.write_queue", inline_queue):
+        # 第 2 页请求失败：同步报错，不写入截断的结果
+        def failing_post(url, params=None, **kwargs):
+            if params["current"] == 2:
+                return MagicMock(status_code=500)
+            return post(url, params=params, **kwargs)
+
+        fake.post = failing_post
+        with pytest.raises(RuntimeError, match="第 2 页"):
+            NotificationService.sync_notifications(db, 1, "c", "p")
+        assert db.get(models.NotificationSyncState, 1) is None
+
+        # 第 2 页返回空（上游少给了数据）：保存已抓到的公告，但不记录全量对账时间
+        def short_post(url, params=None, **kwargs):
+            if params["current"] == 2:
+                return FakeResponse({"records": [], "total": 30})
+            return post(url, params=params, **kwargs)
+
+        fake.post = short_post
+        assert NotificationService.sync_notifications(db, 1, "c", "p") == (10, 0, 10)
+        assert db.get(models.NotificationSyncState, 1) is None
@@ -0,0 +1,148 @@
+"""
+作业同步写库基准测试
+对比逐条查询写入（旧实现）与 AssignmentService.save_assignments 批量写入的耗时
+
+使用方法:
+    python -m src.edu_cloud.scripts.bench_assignment_sync [--sizes 1000 10000]
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.user.models import User
+from src.edu_cloud.assignment import models
+from src.edu_cloud.assignment.services import AssignmentService
+
+import src.edu_cloud.course.models
+import src.edu_cloud.discussion.models
+import src.edu_cloud.notification.models
+import src.edu_cloud.common.models
+
+
+def make_session(path):
+    """在临时文件上建库（与线上一致使用 WAL 模式）"""
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    db.add(User(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+    db.commit()
+    return db
+
+
+def make_data(n, changed_every=10):
+    """生成 n 条作业；changed_every 条里改动一条的状态，模拟二次同步"""
+    base = datetime(2024, 1, 1)
+    first = []
+    second = []
+    for i in range(n):
+        item = models.ScrapedAssignmentData(
+            course_name=f"课程{i % 50}",
+            title=f"作业{i}",
+            description=f"描述{i}",
+            deadline=base + timedelta(hours=i),
+            is_submitted=False,
+            score="",
+            upstream_id=f"w{i}",
+        )
+        first.append(item)
+        changed = i % changed_every == 0
+        second.append(models.ScrapedAssignmentData(
+            course_name=item.course_name,
+            title=item.title,
+            description=item.description,
+            deadline=item.deadline,
+            is_submitted=changed,
+            score="100" if changed else "",
+            upstream_id=item.upstream_id,
+        ))
+    return first, second
+
+
+def legacy_save(db, user_id, data_list):
+    """旧实现：每条作业一次查询"""
+    new_count = 0
+    update_count = 0
+    for item in data_list:
+        exists = db.query(models.Assignment).filter(
+            models.Assignment.owner_id == user_id,
+            models.Assignment.course_name == item.course_name,
+            models.Assignment.title == item.title
+        ).first()
+        if exists:
+            if (exists.is_submitted != item.is_submitted or
+                exists.score != item.score or
+                exists.description != item.description):
+                exists.is_submitted = item.is_submitted
+                exists.score = item.score
+                exists.deadline = item.deadline
+                exists.description = item.description
+                update_count += 1
+        else:
+            db.add(models.Assignment(
+                owner_id=user_id,
+                course_name=item.course_name,
+                title=item.title,
+                description=item.description,
+                deadline=item.deadline,
+                is_submitted=item.is_submitted,
+                score=item.score
+            ))
+            db.flush()  # 旧实现的 autoflush：下一条查询前写入
+            new_count += 1
+    db.commit()
+    return new_count, update_count
+
+
+def run_case(save, n):
+    """首次同步 + 二次同步（10% 变化），返回 (首次耗时, 二次耗时, 两次结果)"""
+    first, second = make_data(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_session(os.path.join(tmp, "bench.db"))
+        try:
+            t0 = time.perf_counter()
+            r1 = save(db, 1, first)
+            t1 = time.perf_counter()
+            r2 = save(db, 1, second)
+            t2 = time.perf_counter()
+        finally:
+            db.close()
+            db.get_bind().dispose()
+    return t1 - t0, t2 - t1, (r1, r2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='作业同步写库基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='作业条数')
+    args = parser.parse_args()
+
+    print(f"{'条数':>6} | {'实现':<6} | {'首次同步':>10} | {'二次同步':>10} | 结果 (新增, 更新)")
+    print("-" * 72)
+    for n in args.sizes:
+        legacy = run_case(legacy_save, n)
+        bulk = run_case(AssignmentService.save_assignments, n)
+        assert legacy[2] == bulk[2], f"结果不一致: {legacy[2]} != {bulk[2]}"
+        for name, (first, second, result) in (("逐条", legacy), ("批量", bulk)):
+            print(f"{n:>6} | {name:<6} | {first:>9.3f}s | {second:>9.3f}s | {result}")
+        print(f"{'':>6} | 加速比 | {legacy[0] / bulk[0]:>9.1f}x | {legacy[1] / bulk[1]:>9.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+SQLite 连接池并发基准测试
+后台线程持续执行作业同步（批量写入）的同时，多个线程请求作业列表，
+对比 sqlite_pool_mode=static（所有线程共用一个连接）与 pooled（读连接池 + 单独写连接）下的读吞吐
+
+使用方法:
+    python -m src.edu_cloud.scripts.bench_sqlite_pool [--readers 1 8] [--seconds 5] [--rows 5000]
+"""
+import sys
+import os
+import argparse
+import json
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+
+def run_worker(readers: int, seconds: float, rows: int) -> dict:
+    """在当前进程内执行一次测试（数据库配置已由环境变量指定）"""
+    from src.edu_cloud.common.database import engine, Base, SessionLocal
+    from src.edu_cloud.user.models import User
+    from src.edu_cloud.assignment import models
+    from src.edu_cloud.assignment.services import AssignmentService
+    import src.edu_cloud.course.models
+    import src.edu_cloud.discussion.models
+    import src.edu_cloud.notification.models
+    import src.edu_cloud.common.models
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all([
+        User(id=1, username="reader", email="reader@example.com", hashed_password="x"),
+        User(id=2, username="syncer", email="syncer@example.com", hashed_password="x"),
+    ])
+    db.commit()
+    base = datetime(2024, 1, 1)
+    AssignmentService.save_assignments(db, 1, [
+        models.ScrapedAssignmentData(
+            course_name=f"课程{i % 20}", title=f"作业{i}", description="", deadline=base + timedelta(hours=i),
+            is_submitted=False, score="", upstream_id=f"r{i}",
+        )
+        for i in range(200)
+    ])
+    db.close()
+
+    stop = threading.Event()
+    sync_rounds = [0]
+
+    def syncer():
+        """模拟正在进行的同步：反复写入另一个用户的大批量作业"""
+        round_no = 0
+        while not stop.is_set():
+            round_no += 1
+            sync_db = SessionLocal()
+            try:
+                AssignmentService.save_assignments(sync_db, 2, [
+                    models.ScrapedAssignmentData(
+                        course_name=f"课程{i % 50}", title=f"作业{i}", description=f"第{round_no}轮",
+                        deadline=base + timedelta(hours=i), is_submitted=bool(round_no % 2), score="",
+                        upstream_id=f"s{i}",
+                    )
+                    for i in range(rows)
+                ])
+            finally:
+                sync_db.close()
+            sync_rounds[0] += 1
+
+    read_counts = [0] * readers
+    latencies = [[] for _ in range(readers)]
+
+    def reader(idx):
+        """模拟作业列表接口"""
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            read_db = SessionLocal()
+            try:
+                read_db.query(models.Assignment)\
+                    .filter(models.Assignment.owner_id == 1)\
+                    .order_by(models.Assignment.deadline.desc())\
+                    .all()
+            finally:
+                read_db.close()
+            latencies[idx].append(time.perf_counter() - t0)
+            read_counts[idx] += 1
+
+    threads = [threading.Thread(target=syncer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    all_latencies = sorted(l for ls in latencies for l in ls)
+    p99 = all_latencies[int(len(all_latencies) * 0.99) - 1] if all_latencies else 0.0
+    return {
+        "reads_per_sec": sum(read_counts) / seconds,
+        "p99_ms": p99 * 1000,
+        "sync_rounds": sync_rounds[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite 连接池并发基准测试')
+    parser.add_argument('--readers', type=int, nargs='+', default=[1, 8], help='并发读线程数（可给多个）')
+    parser.add_argument('--seconds', type=float, default=5, help='每种模式的测试时长（秒）')
+    parser.add_argument('--rows', type=int, default=5000, help='每轮同步写入的作业条数')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.readers[0], args.seconds, args.rows)))
+        return
+
+    # 数据库配置在导入时读取，每种模式在独立子进程中运行
+    print(f"时长: {args.seconds}s  每轮同步: {args.rows} 条")
+    print(f"{'读线程':>6} | {'模式':<8} | {'读吞吐 (次/秒)':>14} | {'读 p99 (ms)':>11} | 同步轮数")
+    print("-" * 66)
+    for readers in args.readers:
+        for mode in ("static", "pooled"):
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}", SQLITE_POOL_MODE=mode)
+                proc = subprocess.run(
+                    [sys.executable, "-m", "src.edu_cloud.scripts.bench_sqlite_pool", "--worker",
+                     "--readers", str(readers), "--seconds", str(args.seconds), "--rows", str(args.rows)],
+                    env=env, capture_output=True, text=True,
+                )
+            if proc.returncode != 0:
+                # 共用一个连接时多个线程同时执行语句，可能直接导致 sqlite3 崩溃或报错
+                print(f"{readers:>6} | {mode:<8} | {'失败 (exit ' + str(proc.returncode) + ')':>14} | {'-':>11} | -")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"{readers:>6} | {mode:<8} | {result['reads_per_sec']:>14.1f} | {result['p99_ms']:>11.1f} | {result['sync_rounds']}")
+
+
+if __name__ == "__main__":
+    main()
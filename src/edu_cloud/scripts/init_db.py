@@ -4,6 +4,8 @@
 
 使用方法:
     python -m src.edu_cloud.scripts.init_db [--skip-migrations] [--create-admin]
+
+迁移版本记录在 schema_migrations 表中，见 scripts/migrations.py
 """
 import sys
 import os
@@ -18,6 +20,8 @@ from src.edu_cloud.assignment.models import Assignment
 from src.edu_cloud.course.models import Course, CourseResource
 from src.edu_cloud.discussion.models import DiscussionTopic, DiscussionPost
 from src.edu_cloud.notification.models import Notification
+from src.edu_cloud.common.models import UCloudSessionRecord
+from src.edu_cloud.sync.models import SyncJob
 
 # 导入所有模型以确保它们被注册到Base.metadata
 # 这些导入会触发模型的注册
@@ -26,6 +30,8 @@ import src.edu_cloud.assignment.models
 import src.edu_cloud.course.models
 import src.edu_cloud.discussion.models
 import src.edu_cloud.notification.models
+import src.edu_cloud.common.models
+import src.edu_cloud.sync.models
 
 
 def init_database(skip_migrations: bool = False):
@@ -48,23 +54,11 @@ def init_database(skip_migrations: bool = False):
         # 2. 运行迁移脚本（如果需要）
         if not skip_migrations:
             print("\n[2/3] 运行数据库迁移...")
-            try:
-                from src.edu_cloud.scripts.migrate_add_role_field import migrate_add_role_field
-                if migrate_add_role_field():
-                    print("✓ role字段迁移完成")
-                else:
-                    print("⚠ role字段迁移跳过或失败")
-            except Exception as e:
-                print(f"⚠ role字段迁移出错: {str(e)}")
-            
-            try:
-                from src.edu_cloud.scripts.migrate_add_cas_fields import migrate_database
-                if migrate_database():
-                    print("✓ CAS字段迁移完成")
-                else:
-                    print("⚠ CAS字段迁移跳过或失败")
-            except Exception as e:
-                print(f"⚠ CAS字段迁移出错: {str(e)}")
+            from src.edu_cloud.scripts.migrations import run_migrations
+            if run_migrations():
+                print("✓ 数据库迁移完成")
+            else:
+                print("⚠ 数据库迁移未全部完成，请查看上方输出后重新运行")
         else:
             print("\n[2/3] 跳过数据库迁移（--skip-migrations）")
         
@@ -0,0 +1,62 @@
+"""
+数据库迁移脚本：为 assignments 表添加 upstream_id 字段
+- 添加 upstream_id 列（学校侧的作业 ID）
+- 创建 (owner_id, upstream_id) 唯一索引
+如果字段和索引已存在，则跳过
+
+已有数据的 upstream_id 在用户下一次同步作业时按 (课程名, 标题) 匹配回填，
+见 AssignmentService.save_assignments
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from sqlalchemy import text, inspect
+from src.edu_cloud.common.database import engine, SessionLocal
+
+
+def migrate_add_assignment_upstream_id():
+    """添加 upstream_id 字段和唯一索引到 assignments 表"""
+    db = SessionLocal()
+    try:
+        inspector = inspect(engine)
+        if 'assignments' not in inspector.get_table_names():
+            print("assignments 表不存在，将在应用启动时自动创建")
+            return True
+
+        columns = [col['name'] for col in inspector.get_columns('assignments')]
+        if 'upstream_id' not in columns:
+            print("开始添加 upstream_id 字段...")
+            db.execute(text("ALTER TABLE assignments ADD COLUMN upstream_id VARCHAR"))
+            db.commit()
+        else:
+            print("upstream_id 字段已存在")
+
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_assignments_owner_upstream "
+            "ON assignments(owner_id, upstream_id)"
+        ))
+        db.commit()
+
+        pending = db.execute(text("SELECT COUNT(*) FROM assignments WHERE upstream_id IS NULL")).scalar()
+        print("成功: upstream_id 字段和唯一索引已就绪")
+        if pending:
+            print(f"  {pending} 条旧作业将在下次同步时回填 upstream_id")
+        return True
+
+    except Exception as e:
+        db.rollback()
+        print(f"错误: 迁移失败: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("数据库迁移：添加作业 upstream_id 字段")
+    print("=" * 50)
+    success = migrate_add_assignment_upstream_id()
+    sys.exit(0 if success else 1)
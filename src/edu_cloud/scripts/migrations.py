@@ -0,0 +1,236 @@
+"""
+版本化数据库迁移
+schema_migrations 表记录已执行的迁移版本，每个迁移只执行一次；
+新增迁移时在 MIGRATIONS 末尾追加一项（版本号递增，不要修改已发布的迁移）
+
+使用方法:
+    python -m src.edu_cloud.scripts.migrations [--status]
+"""
+import sys
+import os
+import argparse
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+from src.edu_cloud.common.database import engine, Base
+
+# 导入所有模型以确保它们被注册到Base.metadata（索引迁移需要读取模型上的索引定义）
+import src.edu_cloud.user.models
+import src.edu_cloud.assignment.models
+import src.edu_cloud.course.models
+import src.edu_cloud.discussion.models
+import src.edu_cloud.notification.models
+import src.edu_cloud.common.models
+import src.edu_cloud.sync.models
+
+# schema_migrations 不是业务模型，使用单独的 MetaData
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _add_role_field() -> bool:
+    from src.edu_cloud.scripts.migrate_add_role_field import migrate_add_role_field
+    return migrate_add_role_field()
+
+
+def _add_cas_fields() -> bool:
+    from src.edu_cloud.scripts.migrate_add_cas_fields import migrate_database
+    if engine.dialect.name != "sqlite":
+        return True  # 该脚本只处理 SQLite 旧库，其他数据库由 create_all 建表
+    try:
+        migrate_database()
+    except SystemExit:
+        return False
+    return True
+
+
+def _add_assignment_upstream_id() -> bool:
+    from src.edu_cloud.scripts.migrate_add_assignment_upstream_id import migrate_add_assignment_upstream_id
+    return migrate_add_assignment_upstream_id()
+
+
+# 列表接口依赖的复合索引（定义见各模块 models.py 的 __table_args__ / index=True）
+LIST_QUERY_INDEXES = [
+    ("assignments", "ix_assignments_owner_deadline"),
+    ("assignments", "ix_assignments_owner_course_deadline"),
+    ("notifications", "ix_notifications_owner_publish"),
+    ("notifications", "ix_notifications_owner_title_publish"),
+    ("courses", "ix_courses_owner_name"),
+    ("course_resources", "ix_course_resources_course_id"),
+    ("discussion_topics", "ix_discussion_topics_course_created"),
+    ("discussion_posts", "ix_discussion_posts_topic_floor"),
+]
+
+# 游标分页改用带 id 的索引后被替代的旧索引 (表名, 索引名, 列)：
+# 模型上已不再定义，保留列信息让已发布的迁移 4 在旧库上照原样执行，再由迁移 7 删除
+REPLACED_LIST_QUERY_INDEXES = [
+    ("notifications", "ix_notifications_owner_publish", ("owner_id", "publish_time")),
+    ("discussion_topics", "ix_discussion_topics_course_created", ("course_id", "created_at")),
+]
+
+# 游标分页用的 (..., 排序时间, id) 索引
+KEYSET_INDEXES = [
+    ("notifications", "ix_notifications_owner_publish_id"),
+    ("discussion_topics", "ix_discussion_topics_course_created_id"),
+]
+
+# 撤销缓存增量加载用的索引
+REVOCATION_INDEXES = [
+    ("users", "ix_users_token_generation_updated_at"),
+    ("token_blacklist", "ix_token_blacklist_revoked_at"),
+]
+
+
+def _create_indexes(indexes: List[Tuple[str, str]]):
+    """在已有的表上补建索引（已存在则跳过）"""
+    tables = set(inspect(engine).get_table_names())
+    replaced = {name: columns for _, name, columns in REPLACED_LIST_QUERY_INDEXES}
+    for table_name, index_name in indexes:
+        if table_name not in tables:
+            continue
+        if index_name in replaced:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(replaced[index_name])})"
+                ))
+        else:
+            index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+            index.create(bind=engine, checkfirst=True)
+        print(f"  ✓ 索引 {index_name}")
+
+
+def _add_list_query_indexes() -> bool:
+    """为已有数据库补建列表查询索引（新库由 create_all 直接创建）"""
+    _create_indexes(LIST_QUERY_INDEXES)
+    return True
+
+
+def _add_columns(table_name: str, columns: List[Column]):
+    """
+    在已有的表上补加字段（已存在则跳过）
+    列定义按当前数据库方言编译，例如 DateTime 在 SQLite 上是 DATETIME、在 PostgreSQL 上是 TIMESTAMP
+    """
+    existing = {col["name"] for col in inspect(engine).get_columns(table_name)}
+    with engine.begin() as conn:
+        for column in columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+            print(f"  ✓ 字段 {table_name}.{column.name}")
+
+
+def _add_user_sync_fields() -> bool:
+    """users 表添加定时同步需要的 cas_password_secret / last_login_at 字段"""
+    _add_columns("users", [
+        Column("cas_password_secret", Text),
+        Column("last_login_at", DateTime),
+    ])
+    return True
+
+
+def _add_user_token_generation() -> bool:
+    """users 表添加 token_generation 字段（"退出所有设备" / 修改密码时加 1）"""
+    _add_columns("users", [Column("token_generation", Integer, nullable=False, server_default=text("0"))])
+    return True
+
+
+def _add_keyset_indexes() -> bool:
+    """补建游标分页用的 (..., 排序时间, id) 索引，并删除被替代的旧索引"""
+    _create_indexes(KEYSET_INDEXES)
+    tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table_name, index_name, _ in REPLACED_LIST_QUERY_INDEXES:
+            if table_name in tables:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+                print(f"  ✓ 删除旧索引 {index_name}")
+    return True
+
+
+def _add_revocation_watermarks() -> bool:
+    """撤销缓存增量加载需要的 users.token_generation_updated_at 字段及其索引、token_blacklist.revoked_at 索引"""
+    if "users" in set(inspect(engine).get_table_names()):
+        _add_columns("users", [Column("token_generation_updated_at", DateTime)])
+    _create_indexes(REVOCATION_INDEXES)
+    return True
+
+
+# (版本号, 名称, 迁移函数)；迁移函数返回 True 表示成功
+MIGRATIONS: List[Tuple[int, str, Callable[[], bool]]] = [
+    (1, "add_role_field", _add_role_field),
+    (2, "add_cas_fields", _add_cas_fields),
+    (3, "add_assignment_upstream_id", _add_assignment_upstream_id),
+    (4, "add_list_query_indexes", _add_list_query_indexes),
+    (5, "add_user_sync_fields", _add_user_sync_fields),
+    (6, "add_user_token_generation", _add_user_token_generation),
+    (7, "add_keyset_indexes", _add_keyset_indexes),
+    (8, "add_revocation_watermarks", _add_revocation_watermarks),
+]
+
+
+def applied_versions() -> set:
+    """已执行的迁移版本"""
+    migration_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def run_migrations() -> bool:
+    """
+    按版本顺序执行尚未执行的迁移
+    某个迁移失败时停止（不记录该版本，下次重新执行），返回 False
+    """
+    done = applied_versions()
+    pending = [m for m in MIGRATIONS if m[0] not in done]
+    if not pending:
+        print("数据库已是最新版本，无需迁移")
+        return True
+
+    for version, name, migrate in pending:
+        print(f"执行迁移 {version:03d}_{name} ...")
+        try:
+            ok = migrate()
+        except Exception as e:
+            print(f"✗ 迁移 {version:03d}_{name} 出错: {str(e)}")
+            return False
+        if ok is False:
+            print(f"✗ 迁移 {version:03d}_{name} 失败")
+            return False
+
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.now(timezone.utc)
+            ))
+        print(f"✓ 迁移 {version:03d}_{name} 完成")
+    return True
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='执行数据库迁移')
+    parser.add_argument('--status', action='store_true', help='只显示迁移状态，不执行')
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions()
+        for version, name, _ in MIGRATIONS:
+            mark = "✓" if version in done else " "
+            print(f"[{mark}] {version:03d}_{name}")
+        sys.exit(0)
+
+    sys.exit(0 if run_migrations() else 1)
+
+
+if __name__ == "__main__":
+    main()
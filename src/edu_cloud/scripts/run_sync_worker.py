@@ -0,0 +1,75 @@
+"""
+独立运行后台同步 worker
+gunicorn 等多进程部署时 Web 进程不启动 worker（只有 python main.py 单进程运行或 SYNC_WORKER_EMBEDDED=true 时才启动），
+用本脚本在任意节点上运行 worker（共用同一个数据库即可共享队列）
+开启 SYNC_SCHEDULE_ENABLED 时同时运行定时同步调度器
+
+使用方法:
+    python -m src.edu_cloud.scripts.run_sync_worker [--concurrency 4] [--mode thread|process] [--once]
+"""
+import sys
+import os
+import argparse
+import logging
+import signal
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from src.edu_cloud.common.config import settings
+from src.edu_cloud.common.database import engine, Base
+
+# 导入所有模型以确保它们被注册到Base.metadata
+import src.edu_cloud.user.models
+import src.edu_cloud.assignment.models
+import src.edu_cloud.course.models
+import src.edu_cloud.discussion.models
+import src.edu_cloud.notification.models
+import src.edu_cloud.common.models
+import src.edu_cloud.sync.models
+
+from src.edu_cloud.sync.worker import SyncWorkerPool, make_worker_id, run_once
+from src.edu_cloud.sync.scheduler import SyncScheduler
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='运行后台同步 worker')
+    parser.add_argument('--concurrency', type=int, default=settings.sync_worker_concurrency, help='worker 数量')
+    parser.add_argument('--mode', choices=['thread', 'process'], default=settings.sync_worker_mode, help='worker 类型')
+    parser.add_argument('--once', action='store_true', help='执行完队列中的任务后退出')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+
+    if args.once:
+        count = 0
+        while run_once(make_worker_id(0)):
+            count += 1
+        print(f"已执行 {count} 个同步任务")
+        sys.exit(0)
+
+    pool = SyncWorkerPool(concurrency=args.concurrency, mode=args.mode)
+    scheduler = SyncScheduler() if settings.sync_schedule_enabled else None
+
+    def shutdown(signum, frame):
+        print("\n收到退出信号，等待当前任务完成...")
+        if scheduler:
+            scheduler.stop()
+        pool.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    pool.start()
+    if scheduler:
+        scheduler.start()
+        print("定时同步调度器已启动")
+    print(f"同步 worker 已启动：{args.concurrency} 个 {args.mode} worker，按 Ctrl+C 退出")
+    pool.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from ..common.request_db import get_request_db, release_request_db
+from ..common.auth import current_identity
+from ..common.cas_auth import CASUnavailable, cas_unavailable_response, resolve_cas_credentials
+from .services import SyncJobService
+from . import models
+
+sync_bp = Blueprint('sync', __name__)
+
+# --- 接口 1: 创建后台同步任务 (POST) ---
+@sync_bp.route("/jobs", methods=["POST"])
+@jwt_required()
+def create_sync_job():
+    """
+    创建后台同步任务，立即返回任务 ID（同步由 worker 执行，不占用请求线程）
+    kind: all / courses / assignments / discussions / notifications，默认 all
+    """
+    req = request.get_json() or {}
+
+    kind = req.get("kind", "all")
+    if kind not in models.JOB_KINDS:
+        return jsonify({"error": f"不支持的同步类型: {kind}"}), 400
+
+    db = get_request_db()
+    try:
+        user = current_identity()
+        if not user:
+            return jsonify({"error": "本地用户不存在"}), 404
+
+        credentials, error = resolve_cas_credentials(user, req)
+        if error:
+            return error
+        s_user, s_pass = credentials
+
+        job = SyncJobService.enqueue(db, user.id, s_user, s_pass, kind=kind)
+        return jsonify({
+            "msg": "同步任务已创建",
+            "job_id": job.id,
+            "data": SyncJobService.to_dict(job)
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# --- 接口 2: 查询同步任务进度 (GET /jobs/:id) ---
+@sync_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required()
+def get_sync_job(job_id):
+    db = get_request_db()
+    user = current_identity()
+    if not user:
+        return jsonify({"error": "本地用户不存在"}), 404
+
+    job = SyncJobService.get_job(db, job_id, user.id)
+    if not job:
+        return jsonify({"error": "同步任务不存在或无权访问"}), 404
+
+    return jsonify({"data": SyncJobService.to_dict(job)})
+
+# --- 接口 3: 快速同步 (POST /quick) ---
+@sync_bp.route("/quick", methods=["POST"])
+@jwt_required()
+def quick_sync():
+    """
+    快速同步：只请求待办作业和公告第 1 页（一两次请求），直接在请求中完成
+    刷新提交状态和新截止时间；课程、作业详情等完整数据用 POST /jobs 创建完整同步任务
+    """
+    req = request.get_json() or {}
+
+    user = current_identity()
+    if not user:
+        return jsonify({"error": "本地用户不存在"}), 404
+
+    credentials, error = resolve_cas_credentials(user, req)
+    if error:
+        return error
+    s_user, s_pass = credentials
+
+    user_id = user.id
+    # 同步要等待 UCloud 响应，先归还身份查询占用的连接
+    release_request_db()
+
+    try:
+        stats = SyncJobService.quick_sync(user_id, s_user, s_pass)
+    except CASUnavailable as e:
+        return cas_unavailable_response(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    # 任一部分失败（例如待办接口请求失败）时不能返回"待办 0 条"，按上游错误返回 502
+    errors = {name: s["error"] for name, s in stats.items() if s.get("error")}
+    if errors:
+        return jsonify({
+            "error": "快速同步失败：" + "；".join(f"{name}: {msg}" for name, msg in errors.items()),
+            "errors": errors,
+            "stats": stats
+        }), 502
+
+    assignments = stats.get("assignments", {})
+    notifications = stats.get("notifications", {})
+    return jsonify({
+        "msg": f"快速同步完成！待办作业 {assignments.get('total_fetched', 0)} 条，新公告 {notifications.get('new_added', 0)} 条。",
+        "stats": stats
+    })
@@ -0,0 +1,90 @@
+# 同步阶段依赖图：声明各阶段的依赖，互不依赖的阶段并发执行
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """一个同步阶段：depends_on 中的阶段全部结束（无论成功失败）后才开始"""
+    name: str
+    run: Callable[[], Any]
+    depends_on: Tuple[str, ...] = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str                  # "succeeded" / "failed"
+    result: Any = None
+    error: Optional[str] = None
+    started_at: float = 0.0      # 相对整个图开始执行的秒数
+    seconds: float = 0.0         # 阶段耗时（秒）
+    depends_on: Tuple[str, ...] = field(default_factory=tuple)
+
+
+def run_stages(stages: Sequence[Stage], max_workers: int = 4,
+               on_start: Optional[Callable[[Stage], None]] = None,
+               on_finish: Optional[Callable[[StageResult], None]] = None) -> Dict[str, StageResult]:
+    """
+    按依赖关系执行各阶段，返回 {阶段名: StageResult}
+
+    - 依赖全部结束的阶段立即提交到线程池，互不依赖的阶段并发执行
+    - 单个阶段失败只记录在结果中，依赖它的阶段照常执行（与逐个执行时一致）
+    - 依赖不在本次执行的阶段中时视为已满足（如任务重试时跳过了已完成的阶段）
+    - on_start / on_finish 在调用方线程中回调，可用于记录进度
+    """
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("阶段名称重复")
+
+    pending: Dict[str, Stage] = {s.name: s for s in stages}
+    running: Dict[Any, Tuple[Stage, float]] = {}
+    results: Dict[str, StageResult] = {}
+    began = time.perf_counter()
+
+    def timed(stage: Stage):
+        t0 = time.perf_counter()
+        try:
+            return stage.run(), None, time.perf_counter() - t0
+        except Exception as e:
+            logger.error(f"阶段 {stage.name} 失败: {str(e)}", exc_info=True)
+            return None, e, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="sync-stage") as pool:
+        while pending or running:
+            ready: List[Stage] = [
+                s for s in pending.values()
+                if all(dep in results or dep not in names for dep in s.depends_on)
+            ]
+            if not ready and not running:
+                raise ValueError(f"阶段依赖存在环: {sorted(pending)}")
+
+            for stage in ready:
+                del pending[stage.name]
+                if on_start:
+                    on_start(stage)
+                running[pool.submit(timed, stage)] = (stage, time.perf_counter() - began)
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, started_at = running.pop(future)
+                value, error, seconds = future.result()
+                result = StageResult(
+                    name=stage.name,
+                    status="failed" if error else "succeeded",
+                    result=value,
+                    error=str(error) if error else None,
+                    started_at=started_at,
+                    seconds=seconds,
+                    depends_on=stage.depends_on,
+                )
+                results[stage.name] = result
+                if on_finish:
+                    on_finish(result)
+
+    return results
@@ -0,0 +1,100 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
+from datetime import datetime, timezone
+from ..common.database import Base
+
+# ==========================================
+# 1. 数据库模型
+# ==========================================
+
+# 任务状态
+JOB_QUEUED = "queued"        # 等待执行
+JOB_RUNNING = "running"      # 已被某个 worker 租用
+JOB_SUCCEEDED = "succeeded"  # 全部阶段执行完毕（单个阶段失败记录在 progress 中）
+JOB_FAILED = "failed"        # 无法执行（如凭证失效、超过最大重试次数）
+
+# 同步类型 -> 依次执行的阶段
+JOB_KINDS = {
+    "all": ["courses", "assignments", "discussions", "notifications"],
+    "courses": ["courses"],
+    "assignments": ["assignments"],
+    "discussions": ["discussions"],
+    "notifications": ["notifications"],
+    # 快速同步：待办作业 + 公告第 1 页，共一两次请求
+    "quick": ["assignments_quick", "notifications_quick"],
+}
+
+
+class SyncJob(Base):
+    """
+    后台同步任务表（租约队列）
+    worker 用条件 UPDATE 抢占任务并写入 lease_owner / lease_expires_at，
+    执行期间定期续租；进程崩溃后租约过期，任务会被其他 worker 重新领取。
+    多个服务器节点共用同一个数据库即可共享队列
+    """
+    __tablename__ = "sync_jobs"
+    __table_args__ = (
+        # worker 领取任务：按状态过滤、按创建时间排序
+        Index("ix_sync_jobs_status_created", "status", "created_at"),
+        # 用户查看自己的任务
+        Index("ix_sync_jobs_owner_created", "owner_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False, default="all")    # 见 JOB_KINDS
+    status = Column(String, nullable=False, default=JOB_QUEUED)
+
+    # CAS 凭证：密码用 secret_key 派生的密钥加密，任务结束后清空
+    cas_username = Column(String, nullable=False)
+    cas_password_encrypted = Column(Text, nullable=True)
+
+    progress = Column(Text, nullable=True)   # 各阶段状态 (JSON)
+    result = Column(Text, nullable=True)     # 各阶段统计 (JSON)
+    error = Column(Text, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)   # 已领取次数
+    lease_owner = Column(String, nullable=True)             # 持有租约的 worker 标识
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+# 单飞锁状态
+FLIGHT_RUNNING = "running"
+FLIGHT_DONE = "done"
+FLIGHT_FAILED = "failed"
+
+
+class SyncLock(Base):
+    """
+    同步单飞锁表：每个用户每种同步 (scope) 一行
+    抢到锁的请求执行同步并把结果写回该行；同时到达的相同请求等待并共享结果，
+    新鲜期内到达的请求直接返回上次结果。多个 worker 进程通过这一行协调
+    """
+    __tablename__ = "sync_locks"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    scope = Column(String, primary_key=True)        # courses / assignments / discussions / notifications[:full]
+    holder = Column(String, nullable=False)         # 当前执行者的随机标识
+    status = Column(String, nullable=False, default=FLIGHT_RUNNING)
+    result = Column(Text, nullable=True)            # 同步统计 (JSON)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)   # 执行者崩溃时锁在此时间后可被接管
+    finished_at = Column(DateTime, nullable=True)
+
+
+class SyncSchedule(Base):
+    """
+    定时同步计划：每个用户下一次快速同步 / 完整同步的时间
+    调度器用条件 UPDATE 推进这两个时间，多个节点同时运行调度器也只会创建一次任务
+    """
+    __tablename__ = "sync_schedules"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    next_quick_at = Column(DateTime, nullable=False, index=True)
+    next_full_at = Column(DateTime, nullable=False, index=True)
+    last_enqueued_at = Column(DateTime, nullable=True)
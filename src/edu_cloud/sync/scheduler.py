@@ -0,0 +1,157 @@
+# 定时同步调度器：按固定周期为活跃的 CAS 用户创建同步任务（快速 / 完整）
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..common.bulk import bulk_upsert, chunked
+from ..common.config import settings
+from ..common.database import SessionLocal
+from ..common.security import decrypt_secret
+from ..user.models import User
+from . import models
+from .services import SyncJobService, _utcnow
+
+logger = logging.getLogger(__name__)
+
+
+def _interval(base: timedelta) -> timedelta:
+    """带随机抖动的间隔：base × (1 ± sync_schedule_jitter)"""
+    jitter = settings.sync_schedule_jitter
+    return base * random.uniform(1 - jitter, 1 + jitter)
+
+
+class SyncScheduler:
+    """
+    定时同步调度器
+
+    - 只同步已绑定 CAS、保存了可还原密码、且最近 sync_schedule_active_days 天内登录过的用户
+    - 新用户的首次同步时间在一个周期内随机分布，之后每次间隔随机浮动，避免同步集中在同一时刻
+    - 到期用户按最近登录时间排序，最近活跃的用户优先
+    - 排队 / 执行中的任务总数不超过 sync_max_running_jobs，超出的用户留到下一轮
+    - 调度器只负责创建任务，同步由 worker 执行（复用现有 Service）
+    """
+
+    def __init__(self, tick_seconds: float = settings.sync_schedule_tick_seconds):
+        self.tick_seconds = tick_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def tick(db: Session, now: Optional[datetime] = None) -> List[int]:
+        """执行一轮调度，返回本轮创建的任务 ID"""
+        now = now or _utcnow()
+        quick_every = timedelta(minutes=settings.sync_schedule_quick_minutes)
+        full_every = timedelta(hours=settings.sync_schedule_full_hours)
+
+        users = db.query(User.id, User.cas_username, User.cas_password_secret)\
+            .filter(
+                User.is_active == True,
+                User.cas_is_bound == True,
+                User.cas_password_secret.isnot(None),
+                User.last_login_at >= now - timedelta(days=settings.sync_schedule_active_days),
+            )\
+            .order_by(User.last_login_at.desc())\
+            .all()
+        if not users:
+            return []
+        user_ids = [u.id for u in users]
+
+        # 1. 新用户：首次同步时间在一个周期内随机分布（并发插入时以先插入的为准）
+        schedules = {}
+        for chunk in chunked(user_ids):
+            schedules.update(
+                (s.owner_id, s) for s in
+                db.query(models.SyncSchedule).filter(models.SyncSchedule.owner_id.in_(chunk))
+            )
+        missing = [uid for uid in user_ids if uid not in schedules]
+        if missing:
+            bulk_upsert(db, models.SyncSchedule, [
+                dict(owner_id=uid,
+                     next_quick_at=now + quick_every * random.random(),
+                     next_full_at=now + full_every * random.random())
+                for uid in missing
+            ], index_elements=["owner_id"], update_columns=[])
+            db.commit()
+            for chunk in chunked(missing):
+                schedules.update(
+                    (s.owner_id, s) for s in
+                    db.query(models.SyncSchedule).filter(models.SyncSchedule.owner_id.in_(chunk))
+                )
+
+        # 2. 全局上限：已排队 / 执行中的任务占用名额，已有任务的用户本轮跳过
+        active_jobs = db.query(models.SyncJob.owner_id)\
+            .filter(models.SyncJob.status.in_([models.JOB_QUEUED, models.JOB_RUNNING]))\
+            .all()
+        busy = {row[0] for row in active_jobs}
+        capacity = settings.sync_max_running_jobs - len(active_jobs)
+
+        # 3. 按最近登录时间依次处理到期用户
+        created = []
+        for user in users:
+            if capacity <= 0:
+                break
+            schedule = schedules.get(user.id)
+            if schedule is None or user.id in busy:
+                continue
+            if schedule.next_full_at <= now:
+                kind = "all"
+            elif schedule.next_quick_at <= now:
+                kind = "quick"
+            else:
+                continue
+
+            try:
+                cas_password = decrypt_secret(user.cas_password_secret)
+            except Exception:
+                logger.warning(f"用户 {user.id} 保存的 CAS 密码无法解密（secret_key 可能已变更），跳过定时同步")
+                continue
+
+            # 条件 UPDATE 推进计划时间：多个节点同时调度时只有一个成功
+            values = {"next_quick_at": now + _interval(quick_every), "last_enqueued_at": now}
+            if kind == "all":
+                values["next_full_at"] = now + _interval(full_every)
+            claimed = db.query(models.SyncSchedule).filter(
+                models.SyncSchedule.owner_id == user.id,
+                models.SyncSchedule.next_quick_at == schedule.next_quick_at,
+                models.SyncSchedule.next_full_at == schedule.next_full_at,
+            ).update(values, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                continue
+
+            job = SyncJobService.enqueue(db, user.id, user.cas_username, cas_password, kind=kind)
+            created.append(job.id)
+            capacity -= 1
+
+        if created:
+            logger.info(f"定时同步：创建 {len(created)} 个任务")
+        return created
+
+    # ---------- 后台线程 ----------
+
+    def _loop(self):
+        logger.info("定时同步调度器已启动")
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                SyncScheduler.tick(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"定时同步调度出错: {str(e)}", exc_info=True)
+            finally:
+                db.close()
+            self._stop_event.wait(self.tick_seconds)
+        logger.info("定时同步调度器已停止")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="sync-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,430 @@
+# 后台同步任务：入队 -> worker 租用 -> 按阶段执行 -> 记录进度与结果
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from ..common.config import settings
+from ..common.database import SessionLocal
+from ..common.security import encrypt_secret, decrypt_secret
+from ..common.ucloud_session import UCloudSession, session_cache
+from . import models
+from .dag import Stage, StageResult, run_stages
+from .singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    # 与其他表一致，数据库中保存不带时区的 UTC 时间
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# ---------- 各阶段的执行函数 ----------
+# 签名：(db, user_id, cas_user, cas_pass, ucloud) -> 统计信息 dict
+# 与 /sync 接口共用单飞锁（scope 相同、共享的是 Service 的原始返回值）：
+# 同一用户进行中或刚完成的同类同步直接共享结果
+
+def _run_courses(db, user_id, cas_user, cas_pass, ucloud):
+    from ..course.services import CourseService
+    stats, _ = single_flight(
+        user_id, "courses",
+        lambda: CourseService.sync_courses(db, user_id, cas_user, cas_pass, ucloud=ucloud)
+    )
+    return stats
+
+
+def _run_assignments(db, user_id, cas_user, cas_pass, ucloud):
+    from ..assignment.services import AssignmentService
+    (added, updated, total), _ = single_flight(
+        user_id, "assignments",
+        lambda: AssignmentService.sync_assignments(db, user_id, cas_user, cas_pass, ucloud=ucloud)
+    )
+    return {"total_fetched": total, "new_added": added, "updated": updated}
+
+
+def _run_discussions(db, user_id, cas_user, cas_pass, ucloud):
+    from ..discussion.services import DiscussionService
+    stats, _ = single_flight(
+        user_id, "discussions",
+        lambda: DiscussionService.sync_discussions(db, cas_user, cas_pass, ucloud=ucloud)
+    )
+    return stats
+
+
+def _run_notifications(db, user_id, cas_user, cas_pass, ucloud):
+    from ..notification.services import NotificationService
+    (added, updated, total), _ = single_flight(
+        user_id, "notifications",
+        lambda: NotificationService.sync_notifications(db, user_id, cas_user, cas_pass, ucloud=ucloud)
+    )
+    return {"total_fetched": total, "new_added": added, "updated": updated}
+
+
+def _run_assignments_quick(db, user_id, cas_user, cas_pass, ucloud):
+    from ..assignment.services import AssignmentService
+    (added, updated, total), _ = single_flight(
+        user_id, "assignments:quick",
+        lambda: AssignmentService.quick_sync(db, user_id, cas_user, cas_pass, ucloud=ucloud)
+    )
+    return {"total_fetched": total, "new_added": added, "updated": updated}
+
+
+def _run_notifications_quick(db, user_id, cas_user, cas_pass, ucloud):
+    from ..notification.services import NotificationService
+    (added, updated, total), _ = single_flight(
+        user_id, "notifications:quick",
+        lambda: NotificationService.sync_notifications(db, user_id, cas_user, cas_pass, ucloud=ucloud, head_only=True)
+    )
+    return {"total_fetched": total, "new_added": added, "updated": updated}
+
+
+STAGE_RUNNERS: Dict[str, Callable[..., Any]] = {
+    "courses": _run_courses,
+    "assignments": _run_assignments,
+    "discussions": _run_discussions,
+    "notifications": _run_notifications,
+    "assignments_quick": _run_assignments_quick,
+    "notifications_quick": _run_notifications_quick,
+}
+
+# 阶段依赖：作业按课程归类、讨论区按课程列表抓取；公告不依赖其他阶段
+STAGE_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "assignments": ("courses",),
+    "discussions": ("courses",),
+}
+
+
+def build_stage(name: str, user_id: int, cas_user: str, cas_pass: str,
+                ucloud: Optional[UCloudSession]) -> Stage:
+    """
+    构造可在线程池中执行的阶段
+    Session 不能跨线程共用，每个阶段使用自己的会话（写入统一交给写线程）
+    """
+    def run():
+        stage_db = SessionLocal()
+        try:
+            return STAGE_RUNNERS[name](stage_db, user_id, cas_user, cas_pass, ucloud)
+        finally:
+            stage_db.close()
+    return Stage(name, run, STAGE_DEPENDENCIES.get(name, ()))
+
+
+class LeaseLost(Exception):
+    """租约已过期并被其他 worker 领取，当前 worker 应停止执行该任务"""
+
+
+def _keep_lease(job_id: int, worker_id: str, stop: threading.Event, lost: threading.Event):
+    """
+    任务执行期间每 sync_job_lease_seconds / 3 续租一次，避免运行时间超过租约的阶段被其他 worker 重复执行
+    续租 UPDATE 未命中（租约已被其他 worker 领取）时设置 lost 并退出
+    """
+    interval = settings.sync_job_lease_seconds / 3
+    while not stop.wait(interval):
+        db = SessionLocal()
+        try:
+            values = {"lease_expires_at": _utcnow() + timedelta(seconds=settings.sync_job_lease_seconds)}
+            if not SyncJobService._update_owned(db, job_id, worker_id, values):
+                logger.warning(f"同步任务 #{job_id} 的租约已失效，停止续租")
+                lost.set()
+                return
+        except Exception as e:
+            db.rollback()
+            logger.error(f"同步任务 #{job_id} 续租失败: {str(e)}")
+        finally:
+            db.close()
+
+
+class SyncJobService:
+    """
+    同步任务队列（sync_jobs 表）
+    领取任务用条件 UPDATE 实现：只有 UPDATE 影响 1 行的 worker 拿到租约，
+    因此多个线程、进程、服务器节点可以安全地共享同一个队列
+    """
+
+    # ---------- 入队 / 查询 ----------
+
+    @staticmethod
+    def enqueue(db: Session, user_id: int, cas_username: str, cas_password: str,
+                kind: str = "all") -> models.SyncJob:
+        """创建同步任务，返回任务对象（job.id 即任务 ID）"""
+        if kind not in models.JOB_KINDS:
+            raise ValueError(f"不支持的同步类型: {kind}")
+        stages = models.JOB_KINDS[kind]
+        job = models.SyncJob(
+            owner_id=user_id,
+            kind=kind,
+            status=models.JOB_QUEUED,
+            cas_username=cas_username,
+            cas_password_encrypted=encrypt_secret(cas_password),
+            progress=json.dumps({
+                "completed": 0,
+                "total": len(stages),
+                "stages": {name: {"status": "pending"} for name in stages},
+            }, ensure_ascii=False),
+            created_at=_utcnow(),
+            updated_at=_utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        logger.info(f"已创建同步任务 #{job.id} ({kind})，用户ID: {user_id}")
+        return job
+
+    @staticmethod
+    def get_job(db: Session, job_id: int, user_id: int) -> Optional[models.SyncJob]:
+        """获取用户自己的任务"""
+        return db.query(models.SyncJob)\
+            .filter(models.SyncJob.id == job_id, models.SyncJob.owner_id == user_id)\
+            .first()
+
+    @staticmethod
+    def to_dict(job: models.SyncJob) -> Dict[str, Any]:
+        """任务状态（不包含凭证）"""
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": json.loads(job.progress) if job.progress else None,
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "attempts": job.attempts,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    # ---------- 租约 ----------
+
+    @staticmethod
+    def _claimable(now: datetime):
+        """排队中的任务，或租约已过期（worker 崩溃 / 进程重启）且未超过重试次数的任务"""
+        return or_(
+            models.SyncJob.status == models.JOB_QUEUED,
+            and_(
+                models.SyncJob.status == models.JOB_RUNNING,
+                models.SyncJob.lease_expires_at < now,
+                models.SyncJob.attempts < settings.sync_job_max_attempts,
+            ),
+        )
+
+    @staticmethod
+    def _fail_exhausted(db: Session, now: datetime):
+        """租约过期且已达到最大重试次数的任务标记为失败"""
+        count = db.query(models.SyncJob).filter(
+            models.SyncJob.status == models.JOB_RUNNING,
+            models.SyncJob.lease_expires_at < now,
+            models.SyncJob.attempts >= settings.sync_job_max_attempts,
+        ).update({
+            "status": models.JOB_FAILED,
+            "error": "任务多次中断，已放弃",
+            "cas_password_encrypted": None,
+            "lease_owner": None,
+            "finished_at": now,
+            "updated_at": now,
+        }, synchronize_session=False)
+        if count:
+            db.commit()
+            logger.warning(f"{count} 个同步任务超过最大重试次数，已标记为失败")
+
+    @staticmethod
+    def lease(db: Session, worker_id: str) -> Optional[models.SyncJob]:
+        """
+        领取一个任务，成功时返回任务对象，队列为空返回 None
+        先查出候选任务，再用带相同条件的 UPDATE 抢占；被其他 worker 抢先时尝试下一个
+        """
+        now = _utcnow()
+        SyncJobService._fail_exhausted(db, now)
+
+        # 全局并发上限：所有节点正在执行的任务数达到上限时暂不领取（近似限制，不加锁）
+        if settings.sync_max_running_jobs and SyncJobService.running_count(db, now) >= settings.sync_max_running_jobs:
+            return None
+
+        candidates = db.query(models.SyncJob.id)\
+            .filter(SyncJobService._claimable(now))\
+            .order_by(models.SyncJob.created_at)\
+            .limit(5)\
+            .all()
+        for (job_id,) in candidates:
+            claimed = db.query(models.SyncJob).filter(
+                models.SyncJob.id == job_id,
+                SyncJobService._claimable(now),
+            ).update({
+                "status": models.JOB_RUNNING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=settings.sync_job_lease_seconds),
+                "attempts": models.SyncJob.attempts + 1,
+                "started_at": now,
+                "updated_at": now,
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return db.query(models.SyncJob)\
+                    .filter(models.SyncJob.id == job_id)\
+                    .populate_existing()\
+                    .first()
+        return None
+
+    @staticmethod
+    def running_count(db: Session, now: Optional[datetime] = None) -> int:
+        """持有有效租约的任务数（即正在访问 UCloud 的会话数）"""
+        now = now or _utcnow()
+        return db.query(models.SyncJob).filter(
+            models.SyncJob.status == models.JOB_RUNNING,
+            models.SyncJob.lease_expires_at >= now,
+        ).count()
+
+    @staticmethod
+    def _update_owned(db: Session, job_id: int, worker_id: str, values: Dict[str, Any]) -> bool:
+        """只更新仍由当前 worker 持有租约的任务，返回是否成功"""
+        values = dict(values, updated_at=_utcnow())
+        count = db.query(models.SyncJob).filter(
+            models.SyncJob.id == job_id,
+            models.SyncJob.lease_owner == worker_id,
+            models.SyncJob.status == models.JOB_RUNNING,
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return count == 1
+
+    @staticmethod
+    def heartbeat(db: Session, job_id: int, worker_id: str, progress: Optional[Dict] = None):
+        """续租并保存进度；租约已被其他 worker 领取时抛出 LeaseLost"""
+        values = {"lease_expires_at": _utcnow() + timedelta(seconds=settings.sync_job_lease_seconds)}
+        if progress is not None:
+            values["progress"] = json.dumps(progress, ensure_ascii=False, default=str)
+        if not SyncJobService._update_owned(db, job_id, worker_id, values):
+            raise LeaseLost(f"同步任务 #{job_id} 的租约已失效")
+
+    @staticmethod
+    def finish(db: Session, job_id: int, worker_id: str, status: str,
+               progress: Optional[Dict] = None, result: Optional[Dict] = None,
+               error: Optional[str] = None) -> bool:
+        """结束任务并清除加密凭证"""
+        values = {
+            "status": status,
+            "error": error,
+            "cas_password_encrypted": None,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "finished_at": _utcnow(),
+        }
+        if progress is not None:
+            values["progress"] = json.dumps(progress, ensure_ascii=False, default=str)
+        if result is not None:
+            values["result"] = json.dumps(result, ensure_ascii=False, default=str)
+        return SyncJobService._update_owned(db, job_id, worker_id, values)
+
+    # ---------- 执行 ----------
+
+    @staticmethod
+    def run_job(db: Session, job: models.SyncJob, worker_id: str) -> str:
+        """
+        执行已领取的任务，返回最终状态
+        各阶段按 STAGE_DEPENDENCIES 并发执行，progress 中记录每个阶段的耗时；
+        单个阶段失败只记录在 progress 中，不影响其他阶段
+        执行期间由后台线程定期续租；租约被其他 worker 领取后不再开始新阶段，抛出 LeaseLost
+        """
+        stop, lost = threading.Event(), threading.Event()
+        threading.Thread(target=_keep_lease, args=(job.id, worker_id, stop, lost),
+                         name=f"sync-lease-{job.id}", daemon=True).start()
+        try:
+            return SyncJobService._execute(db, job, worker_id, lost)
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _execute(db: Session, job: models.SyncJob, worker_id: str, lost: threading.Event) -> str:
+        stages = models.JOB_KINDS.get(job.kind, [])
+        progress = json.loads(job.progress) if job.progress else {}
+        progress.setdefault("stages", {name: {"status": "pending"} for name in stages})
+        progress["total"] = len(stages)
+
+        try:
+            cas_password = decrypt_secret(job.cas_password_encrypted or "")
+        except Exception:
+            SyncJobService.finish(db, job.id, worker_id, models.JOB_FAILED, progress=progress,
+                                  error="无法解密任务凭证（secret_key 可能已变更），请重新登录")
+            return models.JOB_FAILED
+
+        print(f"\n[同步任务 #{job.id}] 开始执行 ({job.kind})，worker: {worker_id}")
+        logger.info(f"同步任务 #{job.id} 开始执行 ({job.kind})，worker: {worker_id}")
+
+        # 0. 各阶段共享同一个 UCloud 会话（登录时已写入缓存，命中时无需再次认证）
+        try:
+            ucloud: Optional[UCloudSession] = session_cache.acquire(job.cas_username, cas_password)
+        except Exception as e:
+            print(f"[同步任务 #{job.id}] ✗ 获取 UCloud 会话失败，各模块将单独登录: {str(e)}")
+            logger.warning(f"获取 UCloud 会话失败，各模块将单独登录: {str(e)}")
+            ucloud = None
+
+        # 1. 按依赖关系执行各阶段：课程与公告并发，课程完成后作业与讨论区并发
+        #    阶段线程不访问 job 对象（属于调用方线程的会话），只使用取出的字段值
+        owner_id, cas_username = job.owner_id, job.cas_username
+
+        def on_start(stage: Stage):
+            if lost.is_set():
+                raise LeaseLost(f"同步任务 #{job.id} 的租约已失效")
+            progress["stages"][stage.name] = {"status": "running"}
+            progress["running"] = sorted(
+                n for n, s in progress["stages"].items() if s.get("status") == "running"
+            )
+            print(f"[同步任务 #{job.id}] 开始同步 {stage.name}...")
+            SyncJobService.heartbeat(db, job.id, worker_id, progress)
+
+        def on_finish(result: StageResult):
+            entry = {"status": result.status, "seconds": round(result.seconds, 2)}
+            if result.status == "succeeded":
+                entry["stats"] = result.result
+                print(f"[同步任务 #{job.id}] ✓ {result.name} 同步完成 ({result.seconds:.1f}s)")
+                logger.info(f"同步任务 #{job.id}: ✓ {result.name} 同步完成 ({result.seconds:.1f}s)")
+            else:
+                entry["error"] = result.error
+                print(f"[同步任务 #{job.id}] ✗ {result.name} 同步失败: {result.error}")
+                logger.error(f"同步任务 #{job.id}: ✗ {result.name} 同步失败: {result.error}")
+            progress["stages"][result.name] = entry
+            progress["running"] = sorted(
+                n for n, s in progress["stages"].items() if s.get("status") == "running"
+            )
+            progress["completed"] = sum(
+                1 for s in progress["stages"].values() if s.get("status") in ("succeeded", "failed")
+            )
+            SyncJobService.heartbeat(db, job.id, worker_id, progress)
+
+        # 重新领取的任务跳过已完成的阶段
+        todo = [build_stage(name, owner_id, cas_username, cas_password, ucloud) for name in stages
+                if progress["stages"].get(name, {}).get("status") != "succeeded"]
+        began = time.perf_counter()
+        run_stages(todo, max_workers=settings.sync_stage_max_workers, on_start=on_start, on_finish=on_finish)
+        progress["seconds"] = round(time.perf_counter() - began, 2)
+        if lost.is_set():
+            raise LeaseLost(f"同步任务 #{job.id} 的租约已失效")
+
+        progress.pop("running", None)
+        result = {name: s.get("stats") for name, s in progress["stages"].items() if s.get("status") == "succeeded"}
+        SyncJobService.finish(db, job.id, worker_id, models.JOB_SUCCEEDED, progress=progress, result=result)
+        print(f"[同步任务 #{job.id}] 执行完毕，总耗时 {progress['seconds']:.1f}s\n")
+        logger.info(f"同步任务 #{job.id} 执行完毕，总耗时 {progress['seconds']:.1f}s")
+        return models.JOB_SUCCEEDED
+
+    @staticmethod
+    def quick_sync(user_id: int, cas_username: str, cas_password: str) -> Dict[str, Any]:
+        """
+        在当前请求中执行快速同步（待办作业与公告第 1 页并发），返回各部分的统计和耗时
+        某一部分失败时记录 error，不影响另一部分
+        """
+        ucloud = session_cache.acquire(cas_username, cas_password)
+        stages = [build_stage(name, user_id, cas_username, cas_password, ucloud)
+                  for name in models.JOB_KINDS["quick"]]
+        results = run_stages(stages, max_workers=len(stages))
+        return {
+            name.replace("_quick", ""): (
+                dict(r.result, seconds=round(r.seconds, 2)) if r.status == "succeeded"
+                else {"error": r.error, "seconds": round(r.seconds, 2)}
+            )
+            for name, r in results.items()
+        }
@@ -0,0 +1,211 @@
+# 同步单飞：同一用户的相同同步请求只抓取一次，其余请求共享结果
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from ..common.config import settings
+from ..common.database import SessionLocal
+from . import models
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.5  # 等待者查询锁状态的间隔
+
+
+class SyncInProgress(TimeoutError):
+    """等待进行中的同步超过 max_wait 秒：同步仍由执行者继续，调用方稍后重新请求即可取得结果"""
+
+    def __init__(self, scope: str, started_at: datetime, expires_at: datetime):
+        super().__init__(f"{scope} 同步正在进行，请稍后刷新")
+        self.scope = scope
+        self.started_at = started_at
+        self.expires_at = expires_at
+
+
+def sync_in_progress_response(e: SyncInProgress) -> tuple:
+    """相同的同步仍在进行：202 + 锁状态（完成后 sync_fresh_seconds 内重新请求直接返回结果）"""
+    return {
+        "msg": str(e),
+        "status": models.FLIGHT_RUNNING,
+        "scope": e.scope,
+        "started_at": e.started_at.isoformat(),
+        "expires_at": e.expires_at.isoformat(),
+    }, 202
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _read(user_id: int, scope: str) -> Optional[models.SyncLock]:
+    db = SessionLocal()
+    try:
+        return db.get(models.SyncLock, (user_id, scope))
+    finally:
+        db.close()
+
+
+def _try_insert(user_id: int, scope: str, token: str) -> bool:
+    """没有锁行时插入一行并成为执行者；并发插入只有一个成功"""
+    now = _utcnow()
+    db = SessionLocal()
+    try:
+        db.add(models.SyncLock(
+            owner_id=user_id, scope=scope, holder=token, status=models.FLIGHT_RUNNING,
+            started_at=now, expires_at=now + timedelta(seconds=settings.sync_lock_ttl_seconds),
+        ))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+def _try_takeover(row: models.SyncLock, token: str) -> bool:
+    """接管已结束（过期 / 失败）或执行者已崩溃的锁：条件 UPDATE，只有一个请求成功"""
+    now = _utcnow()
+    db = SessionLocal()
+    try:
+        count = db.query(models.SyncLock).filter(
+            models.SyncLock.owner_id == row.owner_id,
+            models.SyncLock.scope == row.scope,
+            models.SyncLock.holder == row.holder,
+            models.SyncLock.status == row.status,
+        ).update({
+            "holder": token,
+            "status": models.FLIGHT_RUNNING,
+            "result": None,
+            "error": None,
+            "started_at": now,
+            "expires_at": now + timedelta(seconds=settings.sync_lock_ttl_seconds),
+            "finished_at": None,
+        }, synchronize_session=False)
+        db.commit()
+        return count == 1
+    finally:
+        db.close()
+
+
+def _release(user_id: int, scope: str, token: str, status: str,
+             result: Any = None, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        db.query(models.SyncLock).filter(
+            models.SyncLock.owner_id == user_id,
+            models.SyncLock.scope == scope,
+            models.SyncLock.holder == token,
+        ).update({
+            "status": status,
+            "result": json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            "error": error,
+            "finished_at": _utcnow(),
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"释放同步锁失败 ({user_id}, {scope}): {str(e)}")
+    finally:
+        db.close()
+
+
+def _extend(user_id: int, scope: str, token: str) -> bool:
+    """续期自己持有的锁，锁已被接管或已结束时返回 False"""
+    db = SessionLocal()
+    try:
+        count = db.query(models.SyncLock).filter(
+            models.SyncLock.owner_id == user_id,
+            models.SyncLock.scope == scope,
+            models.SyncLock.holder == token,
+            models.SyncLock.status == models.FLIGHT_RUNNING,
+        ).update({
+            "expires_at": _utcnow() + timedelta(seconds=settings.sync_lock_ttl_seconds),
+        }, synchronize_session=False)
+        db.commit()
+        return count == 1
+    finally:
+        db.close()
+
+
+def _heartbeat(user_id: int, scope: str, token: str, stop: threading.Event):
+    """执行期间每 sync_lock_heartbeat_seconds 续期一次，避免运行超过 TTL 的同步被其他请求接管"""
+    while not stop.wait(settings.sync_lock_heartbeat_seconds):
+        try:
+            if not _extend(user_id, scope, token):
+                logger.warning(f"同步锁 ({user_id}, {scope}) 已不再由本请求持有，停止续期")
+                return
+        except Exception as e:
+            logger.error(f"续期同步锁失败 ({user_id}, {scope}): {str(e)}")
+
+
+def _lead(user_id: int, scope: str, token: str, fn: Callable[[], Any]) -> Any:
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(user_id, scope, token, stop),
+                     name=f"sync-lock-{scope}", daemon=True).start()
+    try:
+        result = fn()
+    except Exception as e:
+        _release(user_id, scope, token, models.FLIGHT_FAILED, error=str(e))
+        raise
+    finally:
+        stop.set()
+    _release(user_id, scope, token, models.FLIGHT_DONE, result=result)
+    return result
+
+
+def single_flight(user_id: int, scope: str, fn: Callable[[], Any],
+                  force: bool = False, max_wait: Optional[float] = None) -> Tuple[Any, bool]:
+    """
+    按 (user_id, scope) 单飞执行 fn，返回 (结果, 是否共享了其他请求的结果)
+
+    - 没有进行中的同步：抢锁并执行 fn，结果写入锁行
+    - 有进行中的同步：等待其完成并返回它的结果（失败时抛出 RuntimeError），
+      等待超过 max_wait 秒（默认 sync_lock_ttl_seconds，/sync 接口传 sync_wait_seconds）抛出 SyncInProgress
+    - 上次同步在 sync_fresh_seconds 内成功完成：直接返回上次结果（force=True 时重新执行）
+
+    共享的结果经过 JSON 序列化，元组会变成列表
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + (settings.sync_lock_ttl_seconds if max_wait is None else max_wait)
+    waited_for = None  # 正在等待的执行者
+
+    while True:
+        row = _read(user_id, scope)
+        now = _utcnow()
+
+        if row is None:
+            if _try_insert(user_id, scope, token):
+                return _lead(user_id, scope, token, fn), False
+            continue
+
+        if row.status == models.FLIGHT_RUNNING and row.expires_at > now:
+            # 相同的同步正在进行，等待其完成
+            if waited_for != row.holder:
+                waited_for = row.holder
+                logger.info(f"用户 {user_id} 的 {scope} 同步正在进行，等待其结果")
+            if time.monotonic() > deadline:
+                raise SyncInProgress(scope, row.started_at, row.expires_at)
+            time.sleep(POLL_SECONDS)
+            continue
+
+        if row.holder == waited_for and row.status != models.FLIGHT_RUNNING:
+            # 等待的那次同步已结束
+            if row.status == models.FLIGHT_DONE:
+                return json.loads(row.result) if row.result else None, True
+            raise RuntimeError(row.error or f"{scope} 同步失败")
+
+        if (row.status == models.FLIGHT_DONE and not force and row.finished_at is not None
+                and now - row.finished_at < timedelta(seconds=settings.sync_fresh_seconds)):
+            logger.info(f"用户 {user_id} 的 {scope} 同步刚刚完成，返回上次结果")
+            return json.loads(row.result) if row.result else None, True
+
+        # 锁已过期 / 上次失败 / 结果不新鲜：接管并重新执行
+        if _try_takeover(row, token):
+            return _lead(user_id, scope, token, fn), False
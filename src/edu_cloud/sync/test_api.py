@@ -0,0 +1,115 @@
+"""
+同步接口测试（SyncJobService.quick_sync / 各阶段执行函数用假函数替换，不访问网络）
+"""
+import json
+from unittest.mock import MagicMock, patch
+
+from main import create_app
+from src.edu_cloud.common.auth import identity_cache
+from src.edu_cloud.common.cas_auth import CASUnavailable
+from src.edu_cloud.common.database import SessionLocal
+from src.edu_cloud.common.security import get_password_hash
+from src.edu_cloud.common.token_manager import revocation_cache
+from src.edu_cloud.sync import models, services
+from src.edu_cloud.sync.services import SyncJobService
+from src.edu_cloud.sync.worker import run_once
+from src.edu_cloud.user.models import User
+
+CREDENTIALS = {'school_username': '2023000000', 'school_password': 'secret'}
+
+
+class TestQuickSyncApi:
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.db = SessionLocal()
+        self.db.add(User(username='quickuser', email='quick@example.com',
+                         hashed_password=get_password_hash('testpass123'), is_active=True))
+        self.db.commit()
+
+    def teardown_method(self):
+        self.db.query(User).filter(User.username == 'quickuser').delete()
+        self.db.commit()
+        self.db.close()
+        identity_cache.clear()
+        revocation_cache.clear()
+
+    def quick_sync(self):
+        response = self.client.post('/api/user/login',
+                                    data=json.dumps({'username': 'quickuser', 'password': 'testpass123'}),
+                                    content_type='application/json')
+        headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+        return self.client.post('/api/sync/quick', data=json.dumps(CREDENTIALS),
+                                content_type='application/json', headers=headers)
+
+    def test_success(self):
+        stats = {"assignments": {"total_fetched": 2, "new_added": 1, "updated": 0, "seconds": 0.1},
+                 "notifications": {"total_fetched": 5, "new_added": 3, "updated": 0, "seconds": 0.1}}
+        with patch.object(SyncJobService, 'quick_sync', return_value=stats):
+            response = self.quick_sync()
+        assert response.status_code == 200
+        assert json.loads(response.data)['stats'] == stats
+
+    def test_stage_failure_is_not_reported_as_no_pending_work(self):
+        stats = {"assignments": {"error": "获取待办事项失败: HTTP 500", "seconds": 0.1},
+                 "notifications": {"total_fetched": 5, "new_added": 0, "updated": 0, "seconds": 0.1}}
+        with patch.object(SyncJobService, 'quick_sync', return_value=stats):
+            response = self.quick_sync()
+        assert response.status_code == 502
+        body = json.loads(response.data)
+        assert body['errors'] == {"assignments": "获取待办事项失败: HTTP 500"}
+        assert body['stats'] == stats
+
+    def test_cas_unavailable_returns_503_with_retry_after(self):
+        with patch.object(SyncJobService, 'quick_sync', side_effect=CASUnavailable("CAS 登录繁忙", retry_after=30)):
+            response = self.quick_sync()
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '30'
+
+
+class TestCasLoginSyncJob:
+
+    def setup_method(self):
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.db = SessionLocal()
+
+    def teardown_method(self):
+        user = self.db.query(User).filter(User.cas_username == '2023999999').first()
+        if user:
+            self.db.query(models.SyncJob).filter(models.SyncJob.owner_id == user.id).delete()
+            self.db.delete(user)
+            self.db.commit()
+        self.db.close()
+        identity_cache.clear()
+        revocation_cache.clear()
+
+    def test_login_enqueued_job_is_processed_by_a_worker(self):
+        with patch('src.edu_cloud.user.api.verify_cas_credentials', return_value=(True, MagicMock(), None)), \
+                patch('src.edu_cloud.user.api.session_cache.warm_async'):
+            response = self.client.post('/api/user/login/cas', content_type='application/json',
+                                        data=json.dumps({'cas_username': '2023999999', 'cas_password': 'secret'}))
+        assert response.status_code == 200
+        body = json.loads(response.data)
+        # 只说明任务已入队，不声称同步已经开始
+        assert body['sync_status'] == 'queued'
+        assert 'sync_started' not in body
+        job_id = body['sync_job_id']
+
+        runners = {name: (lambda *args: {"ok": True}) for name in models.JOB_KINDS["all"]}
+        with patch.dict(services.STAGE_RUNNERS, runners), \
+                patch.object(services.session_cache, 'acquire', return_value=None):
+            # 队列中可能还有其他测试留下的任务，按先后处理到登录任务为止
+            for _ in range(20):
+                if not run_once("test-node:1:0"):
+                    break
+
+        job = self.db.get(models.SyncJob, job_id)
+        self.db.refresh(job)
+        assert job.status == models.JOB_SUCCEEDED
+        headers = {'Authorization': f"Bearer {body['access_token']}"}
+        status = json.loads(self.client.get(f'/api/sync/jobs/{job_id}', headers=headers).data)
+        assert status['data']['status'] == models.JOB_SUCCEEDED
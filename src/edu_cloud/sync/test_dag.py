@@ -0,0 +1,73 @@
+"""
+同步阶段依赖图测试
+"""
+import threading
+import time
+
+import pytest
+
+from src.edu_cloud.sync.dag import Stage, run_stages
+
+
+def sleeper(name, log, seconds=0.2):
+    def run():
+        log.append(("start", name))
+        time.sleep(seconds)
+        log.append(("end", name))
+        return name
+    return run
+
+
+def test_independent_stages_run_concurrently_after_dependencies():
+    log = []
+    stages = [
+        Stage("courses", sleeper("courses", log)),
+        Stage("assignments", sleeper("assignments", log), ("courses",)),
+        Stage("discussions", sleeper("discussions", log), ("courses",)),
+        Stage("notifications", sleeper("notifications", log)),
+    ]
+
+    t0 = time.perf_counter()
+    results = run_stages(stages, max_workers=4)
+    elapsed = time.perf_counter() - t0
+
+    # 依次执行需要 0.8s，按依赖并发只需两轮
+    assert elapsed < 0.6
+    assert log.index(("end", "courses")) < log.index(("start", "assignments"))
+    assert log.index(("end", "courses")) < log.index(("start", "discussions"))
+    assert results["notifications"].started_at < 0.1
+    assert all(r.status == "succeeded" and r.seconds >= 0.2 for r in results.values())
+
+
+def test_failed_stage_is_isolated_and_dependents_still_run():
+    def broken():
+        raise RuntimeError("登录失败")
+
+    finished = []
+    results = run_stages(
+        [Stage("courses", broken), Stage("assignments", lambda: "ok", ("courses",))],
+        on_finish=lambda r: finished.append(r.name),
+    )
+
+    assert results["courses"].status == "failed"
+    assert results["courses"].error == "登录失败"
+    assert results["assignments"].result == "ok"
+    assert finished == ["courses", "assignments"]
+
+
+def test_dependency_outside_graph_is_satisfied_and_cycles_rejected():
+    assert run_stages([Stage("assignments", lambda: 1, ("courses",))])["assignments"].result == 1
+
+    with pytest.raises(ValueError):
+        run_stages([Stage("a", lambda: 1, ("b",)), Stage("b", lambda: 1, ("a",))])
+
+
+def test_callbacks_run_on_caller_thread():
+    caller = threading.current_thread()
+    seen = []
+    run_stages(
+        [Stage("a", lambda: 1), Stage("b", lambda: 2)],
+        on_start=lambda s: seen.append(threading.current_thread() is caller),
+        on_finish=lambda r: seen.append(threading.current_thread() is caller),
+    )
+    assert seen == [True] * 4
@@ -0,0 +1,97 @@
+"""
+定时同步调度器测试（内存数据库，只验证任务的创建，不执行同步）
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.common.security import encrypt_secret
+from src.edu_cloud.user.models import User
+from src.edu_cloud.sync import models, services
+from src.edu_cloud.sync.scheduler import SyncScheduler
+from src.edu_cloud.sync.services import SyncJobService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_user(db, user_id, last_login_minutes_ago, bound=True, secret=True):
+    now = services._utcnow()
+    db.add(User(
+        id=user_id, username=f"user{user_id}", email=f"u{user_id}@example.com", hashed_password="x",
+        cas_username=f"2023{user_id:06d}", cas_is_bound=bound,
+        cas_password_secret=encrypt_secret("secret-pass") if secret else None,
+        last_login_at=now - timedelta(minutes=last_login_minutes_ago),
+    ))
+    db.commit()
+
+
+def make_due(db, user_ids, now, full=False):
+    values = {"next_quick_at": now - timedelta(seconds=1)}
+    if full:
+        values["next_full_at"] = now - timedelta(seconds=1)
+    db.query(models.SyncSchedule).filter(models.SyncSchedule.owner_id.in_(user_ids)).update(
+        values, synchronize_session=False
+    )
+    db.commit()
+
+
+def test_first_tick_spreads_schedules_and_skips_ineligible_users(db):
+    for uid in range(1, 21):
+        add_user(db, uid, last_login_minutes_ago=uid)
+    add_user(db, 21, last_login_minutes_ago=1, bound=False)
+    add_user(db, 22, last_login_minutes_ago=1, secret=False)
+    add_user(db, 23, last_login_minutes_ago=60 * 24 * 30)
+    now = services._utcnow()
+
+    SyncScheduler.tick(db, now)
+
+    schedules = db.query(models.SyncSchedule).all()
+    assert sorted(s.owner_id for s in schedules) == list(range(1, 21))
+    quick_times = {s.next_quick_at for s in schedules}
+    assert len(quick_times) > 1
+    assert all(now <= s.next_quick_at <= now + timedelta(minutes=30) for s in schedules)
+
+
+def test_due_users_enqueued_once_with_kind(db):
+    add_user(db, 1, last_login_minutes_ago=5)
+    add_user(db, 2, last_login_minutes_ago=10)
+    now = services._utcnow()
+    SyncScheduler.tick(db, now)
+    make_due(db, [1], now)
+    make_due(db, [2], now, full=True)
+
+    created = SyncScheduler.tick(db, now)
+
+    jobs = {job.owner_id: job for job in db.query(models.SyncJob).filter(models.SyncJob.id.in_(created))}
+    assert jobs[1].kind == "quick"
+    assert jobs[2].kind == "all"
+    assert jobs[1].cas_username == "2023000001"
+    # 计划时间已推进，下一轮不会重复创建
+    assert SyncScheduler.tick(db, now) == []
+
+
+def test_capacity_prefers_recent_logins_and_skips_busy_users(db):
+    for uid in range(1, 6):
+        add_user(db, uid, last_login_minutes_ago=uid)
+    now = services._utcnow()
+    SyncScheduler.tick(db, now)
+    make_due(db, range(1, 6), now)
+    # 用户 1 已有排队中的任务，占用一个名额且本轮跳过
+    SyncJobService.enqueue(db, 1, "2023000001", "secret-pass")
+
+    with patch.object(services.settings, "sync_max_running_jobs", 3):
+        created = SyncScheduler.tick(db, now)
+
+    owners = [db.get(models.SyncJob, job_id).owner_id for job_id in created]
+    assert owners == [2, 3]
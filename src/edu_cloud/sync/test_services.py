@@ -0,0 +1,210 @@
+"""
+后台同步任务队列测试（内存数据库，阶段执行函数用假函数替换，不访问网络）
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.user.models import User
+from src.edu_cloud.sync import models
+from src.edu_cloud.sync import services, worker
+from src.edu_cloud.sync.services import LeaseLost, SyncJobService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def expire_lease(db, job_id):
+    db.query(models.SyncJob).filter(models.SyncJob.id == job_id).update({
+        "lease_expires_at": services._utcnow() - timedelta(seconds=1)
+    })
+    db.commit()
+
+
+def test_enqueue_encrypts_password_and_only_one_worker_leases(db):
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass")
+
+    assert "secret-pass" not in job.cas_password_encrypted
+    assert SyncJobService.to_dict(job)["progress"]["total"] == 4
+
+    leased = SyncJobService.lease(db, "node-a:1:0")
+    assert leased.id == job.id
+    assert leased.status == models.JOB_RUNNING
+    assert leased.attempts == 1
+    assert SyncJobService.lease(db, "node-b:1:0") is None
+
+
+def test_expired_lease_is_taken_over_and_old_worker_stops(db):
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass")
+    SyncJobService.lease(db, "node-a:1:0")
+
+    # node-a 崩溃，租约过期后由 node-b 重新领取
+    expire_lease(db, job.id)
+    leased = SyncJobService.lease(db, "node-b:1:0")
+    assert leased.lease_owner == "node-b:1:0"
+    assert leased.attempts == 2
+
+    with pytest.raises(LeaseLost):
+        SyncJobService.heartbeat(db, job.id, "node-a:1:0")
+    SyncJobService.heartbeat(db, job.id, "node-b:1:0")
+
+
+def test_job_failed_after_max_attempts(db):
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass")
+    with patch.object(services.settings, "sync_job_max_attempts", 1):
+        SyncJobService.lease(db, "node-a:1:0")
+        expire_lease(db, job.id)
+        assert SyncJobService.lease(db, "node-b:1:0") is None
+
+    db.refresh(job)
+    assert job.status == models.JOB_FAILED
+    assert job.cas_password_encrypted is None
+
+
+def test_run_job_records_progress_and_isolates_stage_failures(db):
+    calls = []
+
+    def ok(name):
+        def run(db, user_id, cas_user, cas_pass, ucloud):
+            calls.append((name, cas_user, cas_pass))
+            return {"stage": name}
+        return run
+
+    def broken(db, user_id, cas_user, cas_pass, ucloud):
+        raise RuntimeError("上游超时")
+
+    runners = {
+        "courses": ok("courses"),
+        "assignments": broken,
+        "discussions": ok("discussions"),
+        "notifications": ok("notifications"),
+    }
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass")
+    leased = SyncJobService.lease(db, "node-a:1:0")
+    with patch.dict(services.STAGE_RUNNERS, runners), \
+            patch.object(services.session_cache, "acquire", return_value=None):
+        status = SyncJobService.run_job(db, leased, "node-a:1:0")
+
+    assert status == models.JOB_SUCCEEDED
+    assert sorted(c[0] for c in calls) == ["courses", "discussions", "notifications"]
+    assert calls[0][1:] == ("2023000000", "secret-pass")
+
+    db.refresh(job)
+    data = SyncJobService.to_dict(job)
+    assert data["status"] == models.JOB_SUCCEEDED
+    assert data["progress"]["completed"] == 4
+    assert data["progress"]["stages"]["assignments"]["status"] == "failed"
+    assert data["progress"]["stages"]["assignments"]["error"] == "上游超时"
+    assert all("seconds" in s for s in data["progress"]["stages"].values())
+    assert data["result"]["courses"] == {"stage": "courses"}
+    assert "assignments" not in data["result"]
+    assert job.cas_password_encrypted is None
+    assert json.loads(job.progress)["stages"]["courses"]["status"] == "succeeded"
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    # 续租线程使用自己的会话，需要多个连接共享的文件数据库
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    session.commit()
+    with patch.object(services, "SessionLocal", factory):
+        yield session
+    session.close()
+    engine.dispose()
+
+
+def test_lease_is_renewed_while_a_long_stage_runs(file_db):
+    db = file_db
+    taken_over = []
+
+    def slow(db, user_id, cas_user, cas_pass, ucloud):
+        time.sleep(1.5)
+        # 超过最初的租约时长后，其他 worker 仍领不到这个任务
+        other = services.SessionLocal()
+        try:
+            taken_over.append(SyncJobService.lease(other, "node-b:1:0"))
+        finally:
+            other.close()
+        return {}
+
+    def fast(db, user_id, cas_user, cas_pass, ucloud):
+        return {}
+
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass", kind="quick")
+    leased = SyncJobService.lease(db, "node-a:1:0")
+    with patch.object(services.settings, "sync_job_lease_seconds", 1), \
+            patch.dict(services.STAGE_RUNNERS, {"assignments_quick": slow, "notifications_quick": fast}), \
+            patch.object(services.session_cache, "acquire", return_value=None):
+        assert SyncJobService.run_job(db, leased, "node-a:1:0") == models.JOB_SUCCEEDED
+
+    assert taken_over == [None]
+    db.refresh(job)
+    assert job.attempts == 1
+
+
+def test_run_job_stops_when_renewal_finds_lease_taken(file_db):
+    db = file_db
+    started = threading.Event()
+
+    def slow(db, user_id, cas_user, cas_pass, ucloud):
+        started.set()
+        time.sleep(0.8)
+        return {}
+
+    job = SyncJobService.enqueue(db, 1, "2023000000", "secret-pass")
+    leased = SyncJobService.lease(db, "node-a:1:0")
+
+    def steal():
+        started.wait()
+        other = services.SessionLocal()
+        other.query(models.SyncJob).filter(models.SyncJob.id == job.id).update({"lease_owner": "node-b:1:0"})
+        other.commit()
+        other.close()
+
+    thief = threading.Thread(target=steal)
+    thief.start()
+    with patch.object(services.settings, "sync_job_lease_seconds", 0.3), \
+            patch.dict(services.STAGE_RUNNERS, {name: slow for name in models.JOB_KINDS["all"]}), \
+            patch.object(services.session_cache, "acquire", return_value=None), \
+            pytest.raises(LeaseLost):
+        SyncJobService.run_job(db, leased, "node-a:1:0")
+    thief.join()
+
+    db.refresh(job)
+    # 课程阶段之后依赖它的阶段没有再开始
+    progress = json.loads(job.progress)
+    assert progress["stages"]["assignments"]["status"] == "pending"
+
+
+@pytest.mark.parametrize("embedded, single_process, started", [
+    (None, True, True),      # python main.py 单进程运行：默认启动
+    (None, False, False),    # gunicorn 等多进程部署：默认不启动
+    (False, True, False),
+    (True, False, True),
+])
+def test_embedded_workers_default_follows_process_model(embedded, single_process, started):
+    with patch.object(worker.settings, "sync_worker_embedded", embedded), \
+            patch.object(worker.settings, "sync_schedule_enabled", False), \
+            patch.object(worker, "_embedded_pool", None), \
+            patch.object(worker, "SyncWorkerPool") as pool:
+        assert (worker.start_embedded_workers(single_process=single_process) is not None) == started
+        assert pool.return_value.start.called == started
@@ -0,0 +1,156 @@
+"""
+同步单飞测试（临时文件数据库 + 多线程模拟并发请求，不访问网络）
+"""
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.edu_cloud.common.database import Base
+from src.edu_cloud.user.models import User
+from src.edu_cloud.sync import models, singleflight
+from src.edu_cloud.sync.singleflight import SyncInProgress, single_flight, sync_in_progress_response
+
+
+@pytest.fixture
+def SessionLocal(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'flight.db'}", connect_args={"timeout": 30})
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+    db = factory()
+    db.add(User(id=1, username="tester", email="t@example.com", hashed_password="x"))
+    db.commit()
+    db.close()
+    with patch.object(singleflight, "SessionLocal", factory), \
+            patch.object(singleflight, "POLL_SECONDS", 0.02):
+        yield factory
+    engine.dispose()
+
+
+def test_concurrent_requests_share_one_sync(SessionLocal):
+    calls = []
+
+    def slow_sync():
+        calls.append(1)
+        time.sleep(0.3)
+        return 3, 1, 10
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight(1, "assignments", slow_sync)))
+        for _ in range(3)
+    ]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert all(list(result) == [3, 1, 10] for result, _ in results)
+
+
+def test_fresh_result_reused_unless_forced(SessionLocal):
+    calls = []
+
+    def sync():
+        calls.append(1)
+        return {"new_courses": len(calls)}
+
+    assert single_flight(1, "courses", sync) == ({"new_courses": 1}, False)
+    assert single_flight(1, "courses", sync) == ({"new_courses": 1}, True)
+    assert single_flight(1, "courses", sync, force=True) == ({"new_courses": 2}, False)
+
+    # 超出新鲜期后重新同步
+    with patch.object(singleflight.settings, "sync_fresh_seconds", 0):
+        assert single_flight(1, "courses", sync) == ({"new_courses": 3}, False)
+
+
+def test_failure_is_shared_with_waiters_but_not_cached(SessionLocal):
+    def broken():
+        time.sleep(0.2)
+        raise ValueError("上游超时")
+
+    errors = []
+
+    def waiter():
+        try:
+            single_flight(1, "notifications", lambda: "unused")
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=lambda: pytest.raises(ValueError, single_flight, 1, "notifications", broken))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=waiter)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert errors == ["上游超时"]
+    # 失败结果不复用，下一次请求重新执行
+    assert single_flight(1, "notifications", lambda: "ok") == ("ok", False)
+
+
+def test_expired_lock_from_crashed_holder_is_taken_over(SessionLocal):
+    db = SessionLocal()
+    now = singleflight._utcnow()
+    db.add(models.SyncLock(
+        owner_id=1, scope="discussions", holder="crashed", status=models.FLIGHT_RUNNING,
+        started_at=now - timedelta(hours=1), expires_at=now - timedelta(minutes=1),
+    ))
+    db.commit()
+    db.close()
+
+    assert single_flight(1, "discussions", lambda: {"new_topics": 2}) == ({"new_topics": 2}, False)
+
+
+def test_running_lock_is_extended_past_ttl(SessionLocal):
+    calls = []
+
+    def slow_sync():
+        calls.append(1)
+        time.sleep(1.5)
+        return "done"
+
+    with patch.object(singleflight.settings, "sync_lock_ttl_seconds", 1), \
+            patch.object(singleflight.settings, "sync_lock_heartbeat_seconds", 0.1):
+        leader = threading.Thread(target=lambda: single_flight(1, "assignments", slow_sync))
+        leader.start()
+        time.sleep(1.2)
+        # 已超过最初的 TTL，但执行者仍在续期，锁不会被过期接管
+        db = SessionLocal()
+        row = db.get(models.SyncLock, (1, "assignments"))
+        db.close()
+        assert row.status == models.FLIGHT_RUNNING
+        assert row.expires_at > singleflight._utcnow()
+        leader.join()
+
+    assert len(calls) == 1
+
+
+def test_waiter_gives_up_after_max_wait_and_reuses_result_later(SessionLocal):
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: single_flight(1, "courses", lambda: release.wait(5) and {"new_courses": 1}))
+    leader.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    with pytest.raises(SyncInProgress) as info:
+        single_flight(1, "courses", lambda: "unused", max_wait=0.1)
+    # 不等到执行者结束，很快返回锁状态
+    assert time.monotonic() - start < 1
+    body, status = sync_in_progress_response(info.value)
+    assert status == 202
+    assert body["status"] == models.FLIGHT_RUNNING
+    assert body["scope"] == "courses"
+
+    release.set()
+    leader.join()
+    # 执行者完成后重新请求，直接取得刚完成的结果
+    assert single_flight(1, "courses", lambda: "unused", max_wait=0.1) == ({"new_courses": 1}, True)
@@ -0,0 +1,129 @@
+# 同步任务 worker 池：循环领取 sync_jobs 中的任务并执行
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+from typing import List, Optional
+
+from ..common.config import settings
+from ..common.database import SessionLocal
+from .services import LeaseLost, SyncJobService
+
+logger = logging.getLogger(__name__)
+
+
+def make_worker_id(index: int) -> str:
+    """worker 标识：主机名:进程号:序号（多个节点共享队列时可区分租约持有者）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def run_once(worker_id: str) -> bool:
+    """领取并执行一个任务；队列为空返回 False"""
+    db = SessionLocal()
+    try:
+        job = SyncJobService.lease(db, worker_id)
+        if job is None:
+            return False
+        try:
+            SyncJobService.run_job(db, job, worker_id)
+        except LeaseLost as e:
+            logger.warning(f"{str(e)}，停止执行")
+        return True
+    finally:
+        db.close()
+
+
+def worker_loop(index: int, stop_event, poll_seconds: float):
+    """worker 主循环：有任务就连续执行，队列为空时等待 poll_seconds"""
+    worker_id = make_worker_id(index)
+    logger.info(f"同步 worker {worker_id} 已启动")
+    while not stop_event.is_set():
+        try:
+            if run_once(worker_id):
+                continue
+        except Exception as e:
+            logger.error(f"同步 worker {worker_id} 出错: {str(e)}", exc_info=True)
+        stop_event.wait(poll_seconds)
+    logger.info(f"同步 worker {worker_id} 已停止")
+
+
+class SyncWorkerPool:
+    """
+    同步 worker 池
+
+    Args:
+        concurrency: worker 数量（同时执行的任务数）
+        mode: "thread" 在当前进程内用线程执行；"process" 每个 worker 一个子进程
+        poll_seconds: 队列为空时的轮询间隔
+    """
+
+    def __init__(self, concurrency: int = settings.sync_worker_concurrency,
+                 mode: str = settings.sync_worker_mode,
+                 poll_seconds: float = settings.sync_job_poll_seconds):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"不支持的 worker 模式: {mode}")
+        self.concurrency = concurrency
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self._workers: List = []
+        if mode == "process":
+            # spawn：子进程重新导入模块并创建自己的数据库连接
+            self._context = multiprocessing.get_context("spawn")
+            self._stop_event = self._context.Event()
+        else:
+            self._context = None
+            self._stop_event = threading.Event()
+
+    def start(self):
+        for index in range(self.concurrency):
+            args = (index, self._stop_event, self.poll_seconds)
+            if self.mode == "process":
+                worker = self._context.Process(target=worker_loop, args=args, name=f"sync-worker-{index}", daemon=True)
+            else:
+                worker = threading.Thread(target=worker_loop, args=args, name=f"sync-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"同步 worker 池已启动：{self.concurrency} 个 {self.mode} worker")
+
+    def stop(self, timeout: Optional[float] = None):
+        """通知所有 worker 在当前任务结束后退出"""
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def join(self):
+        for worker in self._workers:
+            worker.join()
+
+
+_embedded_pool: Optional[SyncWorkerPool] = None
+_embedded_scheduler = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_workers(single_process: bool = False) -> Optional[SyncWorkerPool]:
+    """
+    在 Web 进程内启动 worker 池（由 create_app / main.py 调用，重复调用只启动一次）
+    每个调用进程都会轮询队列并运行调度器，所以每台主机只应有一个进程启动
+
+    Args:
+        single_process: 调用方确认整台主机只有这一个 Web 进程（python main.py 直接运行）；
+                        sync_worker_embedded 未设置（None）时据此决定是否启动
+
+    开启 sync_schedule_enabled 时同时启动定时同步调度器
+    """
+    global _embedded_pool, _embedded_scheduler
+    enabled = settings.sync_worker_embedded
+    if not (single_process if enabled is None else enabled):
+        return None
+    with _embedded_lock:
+        if _embedded_pool is None:
+            _embedded_pool = SyncWorkerPool()
+            _embedded_pool.start()
+        if settings.sync_schedule_enabled and _embedded_scheduler is None:
+            from .scheduler import SyncScheduler
+            _embedded_scheduler = SyncScheduler()
+            _embedded_scheduler.start()
+    return _embedded_pool
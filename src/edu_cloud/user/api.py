@@ -6,13 +6,17 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from typing import Dict, Any, Optional
 import logging
 import json
-import threading
 
-from ..common.database import get_db, SessionLocal
-from ..common.security import verify_password, get_password_hash
-from ..common.auth import create_user_access_token
-from ..common.cas_auth import verify_cas_credentials, encrypt_cas_password
-from ..common.token_manager import revoke_current_token
+from ..common.database import get_db
+from ..common.request_db import get_request_db
+from ..common.security import verify_password, get_password_hash, encrypt_secret
+from ..common.config import settings
+from ..common.auth import create_user_access_token, get_current_user_from_db
+from ..common.cas_auth import (
+    verify_cas_credentials, encrypt_cas_password, cas_admission, CASUnavailable, cas_unavailable_response
+)
+from ..common.token_manager import revoke_current_token, revoke_all_user_tokens, bump_token_generation, add_user_tombstone, revocation_cache
+from ..common.ucloud_session import session_cache
 from . import models, schemas
 from datetime import timezone
 
@@ -53,6 +57,10 @@ def error_response(message: str, code: int = 400) -> tuple:
     """统一错误响应格式"""
     return {"error": message}, code
 
+def remember_cas_secret(user: models.User, cas_password: str):
+    """开启定时同步时保存可还原的 CAS 密码，供调度器创建同步任务；未开启时不保存"""
+    user.cas_password_secret = encrypt_secret(cas_password) if settings.sync_schedule_enabled else None
+
 def get_json_data():
     """安全获取JSON数据"""
     try:
@@ -77,7 +85,7 @@ def register():
         if validation_error:
             return error_response(f"Validation error: {validation_error}")
         
-        db = SessionLocal()
+        db = get_request_db()
         try:
             # 检查用户名是否已存在
             db_user = db.query(models.User).filter(models.User.username == user_data.username).first()
@@ -114,8 +122,6 @@ def register():
             db.rollback()
             logger.error(f"Database error during registration: {str(e)}")
             return error_response("Registration failed due to database error", 500)
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
@@ -134,8 +140,7 @@ def login():
         if validation_error:
             return error_response(f"Validation error: {validation_error}")
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 验证用户
             user = db.query(models.User).filter(models.User.username == login_data.username).first()
             
@@ -145,11 +150,15 @@ def login():
             if not user.is_active:
                 return error_response("Inactive user", 400)
             
+            user.last_login_at = datetime.now(timezone.utc)
+            db.commit()
+            
             # 创建访问令牌
             access_token_expires = timedelta(minutes=30)
             access_token = create_user_access_token(
                 username=user.username, 
-                expires_delta=access_token_expires
+                expires_delta=access_token_expires,
+                user=user
             )
             
             return jsonify({
@@ -157,8 +166,6 @@ def login():
                 "token_type": "bearer"
             })
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
@@ -186,12 +193,12 @@ def login_with_cas():
             cas_login_data.cas_username, 
             cas_login_data.cas_password
         )
+        cas_wait_ms = cas_admission.last_wait_ms()
         
         if not is_valid:
             return error_response(error_msg or "CAS 认证失败", 401)
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 查找是否已有用户绑定此 CAS 账户
             user = db.query(models.User).filter(
                 models.User.cas_username == cas_login_data.cas_username
@@ -200,6 +207,7 @@ def login_with_cas():
             if user:
                 # 用户已存在，更新 CAS 绑定信息（密码可能已更改）
                 user.cas_password_encrypted = encrypt_cas_password(cas_login_data.cas_password)
+                remember_cas_secret(user, cas_login_data.cas_password)
                 user.cas_is_bound = True
                 user.cas_bound_at = datetime.now(timezone.utc)
                 db.commit()
@@ -224,6 +232,7 @@ def login_with_cas():
                     cas_bound_at=datetime.now(timezone.utc),
                     is_active=True
                 )
+                remember_cas_secret(user, cas_login_data.cas_password)
                 db.add(user)
                 db.commit()
                 db.refresh(user)
@@ -231,104 +240,35 @@ def login_with_cas():
             if not user.is_active:
                 return error_response("Inactive user", 400)
             
+            user.last_login_at = datetime.now(timezone.utc)
+            db.commit()
+            
             # 创建访问令牌
             access_token_expires = timedelta(minutes=30)
             access_token = create_user_access_token(
                 username=user.username, 
-                expires_delta=access_token_expires
+                expires_delta=access_token_expires,
+                user=user
             )
             
-            # 准备启动后台同步
-            print(f"\n[CAS登录] 准备为用户 {user.username} 启动后台同步...")
-            logger.info(f"准备为用户 {user.username} 启动后台同步")
-            
-            # 在后台线程中执行全面同步（不阻塞登录响应）
-            def sync_all_data():
-                """后台同步所有数据：作业、课程、讨论区、通知"""
-                try:
-                    sync_db = SessionLocal()
-                    try:
-                        # 导入同步服务
-                        from ..assignment.services import AssignmentService
-                        from ..course.services import CourseService
-                        from ..discussion.services import DiscussionService
-                        from ..notification.services import NotificationService
-                        
-                        # 使用print确保输出可见，同时记录日志
-                        print(f"\n{'='*60}")
-                        print(f"[CAS登录自动同步] 开始为用户 {user.username} (CAS: {cas_login_data.cas_username}) 执行全面同步")
-                        print(f"{'='*60}\n")
-                        logger.info(f"开始为用户 {user.username} (CAS: {cas_login_data.cas_username}) 执行全面同步")
-                        
-                        # 1. 同步课程（基础数据，需要先同步）
-                        print("[同步] 1/4 开始同步课程...")
-                        try:
-                            CourseService.sync_courses(
-                                sync_db, user.id,
-                                cas_login_data.cas_username,
-                                cas_login_data.cas_password
-                            )
-                            print("[同步] ✓ 课程同步完成")
-                            logger.info("✓ 课程同步完成")
-                        except Exception as e:
-                            print(f"[同步] ✗ 课程同步失败: {str(e)}")
-                            logger.error(f"✗ 课程同步失败: {str(e)}", exc_info=True)
-                        
-                        # 2. 同步作业（依赖课程数据）
-                        print("[同步] 2/4 开始同步作业...")
-                        try:
-                            AssignmentService.sync_assignments(
-                                sync_db, user.id,
-                                cas_login_data.cas_username,
-                                cas_login_data.cas_password
-                            )
-                            print("[同步] ✓ 作业同步完成")
-                            logger.info("✓ 作业同步完成")
-                        except Exception as e:
-                            print(f"[同步] ✗ 作业同步失败: {str(e)}")
-                            logger.error(f"✗ 作业同步失败: {str(e)}", exc_info=True)
-                        
-                        # 3. 同步讨论区
-                        print("[同步] 3/4 开始同步讨论区...")
-                        try:
-                            DiscussionService.sync_discussions(
-                                sync_db,
-                                cas_login_data.cas_username,
-                                cas_login_data.cas_password
-                            )
-                            print("[同步] ✓ 讨论区同步完成")
-                            logger.info("✓ 讨论区同步完成")
-                        except Exception as e:
-                            print(f"[同步] ✗ 讨论区同步失败: {str(e)}")
-                            logger.error(f"✗ 讨论区同步失败: {str(e)}", exc_info=True)
-                        
-                        # 4. 同步通知
-                        print("[同步] 4/4 开始同步通知...")
-                        try:
-                            NotificationService.sync_notifications(
-                                sync_db, user.id,
-                                cas_login_data.cas_username,
-                                cas_login_data.cas_password
-                            )
-                            print("[同步] ✓ 通知同步完成")
-                            logger.info("✓ 通知同步完成")
-                        except Exception as e:
-                            print(f"[同步] ✗ 通知同步失败: {str(e)}")
-                            logger.error(f"✗ 通知同步失败: {str(e)}", exc_info=True)
-                        
-                        print(f"\n[同步] 用户 {user.username} 的全面同步完成\n")
-                        logger.info(f"用户 {user.username} 的全面同步完成")
-                    finally:
-                        sync_db.close()
-                except Exception as e:
-                    print(f"[同步] ✗ 全面同步过程中发生错误: {str(e)}")
-                    logger.error(f"全面同步过程中发生错误: {str(e)}", exc_info=True)
-            
-            # 启动后台同步线程
-            sync_thread = threading.Thread(target=sync_all_data, daemon=True)
-            sync_thread.start()
-            print(f"[CAS登录] 已启动后台同步线程，用户 {user.username} 的登录响应立即返回")
-            logger.info(f"已启动后台同步线程，用户 {user.username} 的登录响应立即返回")
+            # 复用登录时已完成 CAS 认证的 auth_object，后台换取 UCloud 会话写入缓存供同步任务使用（不阻塞登录响应）
+            session_cache.warm_async(auth_object, cas_login_data.cas_username, cas_login_data.cas_password)
+            
+            # 创建后台同步任务（由 sync worker 执行，不阻塞登录响应）
+            sync_job_id = None
+            try:
+                from ..sync.services import SyncJobService
+                sync_job = SyncJobService.enqueue(
+                    db, user.id,
+                    cas_login_data.cas_username,
+                    cas_login_data.cas_password,
+                    kind="all"
+                )
+                sync_job_id = sync_job.id
+                print(f"[CAS登录] 已为用户 {user.username} 创建同步任务 #{sync_job_id}")
+            except Exception as e:
+                db.rollback()
+                logger.error(f"创建同步任务失败: {str(e)}", exc_info=True)
             
             return jsonify({
                 "access_token": access_token, 
@@ -339,12 +279,15 @@ def login_with_cas():
                     "cas_username": user.cas_username,
                     "cas_is_bound": user.cas_is_bound
                 },
-                "sync_started": True  # 指示同步已开始
+                # 任务已入队，由 sync worker 执行；本进程没有 worker 时可能要等独立 worker 领取
+                "sync_status": "queued" if sync_job_id is not None else "not_started",
+                "sync_job_id": sync_job_id,  # 通过 GET /api/sync/jobs/<id> 查询进度
+                "cas_queue_wait_ms": cas_wait_ms  # CAS 登录排队时间
             })
             
-        finally:
-            db.close()
             
+    except CASUnavailable as e:
+        return cas_unavailable_response(e)
     except Exception as e:
         logger.error(f"CAS login error: {str(e)}")
         return error_response(f"CAS login failed: {str(e)}", 500)
@@ -370,10 +313,9 @@ def bind_cas():
         if validation_error:
             return error_response(f"Validation error: {validation_error}")
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 获取当前用户
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
@@ -398,6 +340,7 @@ def bind_cas():
             # 绑定 CAS 账户
             user.cas_username = cas_bind_data.cas_username
             user.cas_password_encrypted = encrypt_cas_password(cas_bind_data.cas_password)
+            remember_cas_secret(user, cas_bind_data.cas_password)
             user.cas_is_bound = True
             user.cas_bound_at = datetime.now(timezone.utc)
             
@@ -409,12 +352,13 @@ def bind_cas():
                 "username": user.username,
                 "cas_username": user.cas_username,
                 "cas_is_bound": user.cas_is_bound,
-                "cas_bound_at": user.cas_bound_at.isoformat() if user.cas_bound_at else None
+                "cas_bound_at": user.cas_bound_at.isoformat() if user.cas_bound_at else None,
+                "cas_queue_wait_ms": cas_admission.last_wait_ms()
             }))
             
-        finally:
-            db.close()
             
+    except CASUnavailable as e:
+        return cas_unavailable_response(e)
     except Exception as e:
         logger.error(f"Bind CAS error: {str(e)}")
         return error_response(f"Bind CAS failed: {str(e)}", 500)
@@ -430,8 +374,7 @@ def login_for_access_token():
         if not username or not password:
             return error_response("Username and password are required")
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 验证用户
             user = db.query(models.User).filter(models.User.username == username).first()
             
@@ -441,10 +384,14 @@ def login_for_access_token():
             if not user.is_active:
                 return error_response("Inactive user", 400)
             
+            user.last_login_at = datetime.now(timezone.utc)
+            db.commit()
+            
             access_token_expires = timedelta(minutes=30)
             access_token = create_user_access_token(
                 username=user.username, 
-                expires_delta=access_token_expires
+                expires_delta=access_token_expires,
+                user=user
             )
             
             return jsonify({
@@ -452,8 +399,6 @@ def login_for_access_token():
                 "token_type": "bearer"
             })
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Token generation error: {str(e)}")
@@ -468,16 +413,13 @@ def read_users_me():
         if not current_username:
             return error_response("Could not validate credentials", 401)
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
             return jsonify(success_response(user))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Get user info error: {str(e)}")
@@ -501,17 +443,17 @@ def update_user_me():
         if validation_error:
             return error_response(f"Validation error: {validation_error}")
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
             # 更新数据
             update_dict = update_data.model_dump(exclude_unset=True)
             
+            # 修改密码会撤销所有 token，必须走 /change-password（校验当前密码并返回新 token）
             if "password" in update_dict:
-                update_dict["hashed_password"] = get_password_hash(update_dict.pop("password"))
+                return error_response("Use /change-password to change the password")
             
             # 检查邮箱是否已被其他用户使用
             if "email" in update_dict and update_dict["email"]:
@@ -530,8 +472,6 @@ def update_user_me():
             
             return jsonify(success_response(user))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Update user error: {str(e)}")
@@ -545,15 +485,12 @@ def read_users():
         skip = int(request.args.get('skip', 0))
         limit = int(request.args.get('limit', 100))
         
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             users = db.query(models.User).offset(skip).limit(limit).all()
             
             users_data = [success_response(user)['data'] for user in users]
             return jsonify({"data": users_data})
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Get users error: {str(e)}")
@@ -564,16 +501,13 @@ def read_users():
 def read_user(user_id: int):
     """获取指定用户信息"""
     try:
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             user = db.query(models.User).filter(models.User.id == user_id).first()
             if user is None:
                 return error_response("User not found", 404)
             
             return jsonify(success_response(user))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Get user error: {str(e)}")
@@ -588,9 +522,8 @@ def get_cas_status():
         if not current_username:
             return error_response("Could not validate credentials", 401)
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
@@ -600,8 +533,6 @@ def get_cas_status():
                 "cas_bound_at": user.cas_bound_at.isoformat() if user.cas_bound_at else None
             }))
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Get CAS status error: {str(e)}")
@@ -627,9 +558,8 @@ def verify_cas_credentials_endpoint():
         if not cas_password:
             return error_response("CAS password is required")
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
@@ -647,16 +577,18 @@ def verify_cas_credentials_endpoint():
             
             # 如果验证成功，更新存储的密码（可能用户更改了密码）
             user.cas_password_encrypted = encrypt_cas_password(cas_password)
+            remember_cas_secret(user, cas_password)
             db.commit()
             
             return jsonify(success_response({
                 "verified": True,
-                "message": "CAS 凭证验证成功"
+                "message": "CAS 凭证验证成功",
+                "cas_queue_wait_ms": cas_admission.last_wait_ms()
             }))
             
-        finally:
-            db.close()
             
+    except CASUnavailable as e:
+        return cas_unavailable_response(e)
     except Exception as e:
         logger.error(f"Verify CAS credentials error: {str(e)}")
         return error_response(f"Verify CAS credentials failed: {str(e)}", 500)
@@ -670,18 +602,19 @@ def unbind_cas():
         if not current_username:
             return error_response("Could not validate credentials", 401)
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
             if not user.cas_is_bound:
                 return error_response("用户未绑定 CAS 账户", 400)
             
-            # 解绑 CAS
+            # 解绑 CAS，并清除服务端缓存的 UCloud 会话
+            session_cache.invalidate(user.cas_username)
             user.cas_username = None
             user.cas_password_encrypted = None
+            user.cas_password_secret = None
             user.cas_is_bound = False
             user.cas_bound_at = None
             
@@ -692,8 +625,6 @@ def unbind_cas():
                 "message": "CAS 账户解绑成功"
             })
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Unbind CAS error: {str(e)}")
@@ -708,19 +639,20 @@ def delete_user_me():
         if not current_username:
             return error_response("Could not validate credentials", 401)
         
-        db = SessionLocal()
-        try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+        with get_request_db() as db:
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
+            # 同一事务写入墓碑记录，撤销该用户已签发的所有 token
+            tombstone = add_user_tombstone(db, user.id, user.username)
+            user_id = user.id
             db.delete(user)
             db.commit()
+            revocation_cache.add_tombstone(user_id, tombstone.revoked_at, tombstone.expires_at)
             
             return jsonify({"message": "User account deleted successfully"})
             
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Delete user error: {str(e)}")
@@ -731,8 +663,7 @@ def delete_user_me():
 def logout():
     """用户登出，将当前token加入黑名单"""
     try:
-        db = SessionLocal()
-        try:
+        with get_request_db() as db:
             # 撤销当前token
             success = revoke_current_token(db)
             
@@ -745,13 +676,35 @@ def logout():
                 logger.warning("Failed to revoke token during logout")
                 return error_response("Logout failed: could not revoke token", 500)
                 
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Logout error: {str(e)}")
         return error_response(f"Logout failed: {str(e)}", 500)
 
+@user_bp.route("/logout-all", methods=["POST"])
+@jwt_required()
+def logout_all():
+    """退出所有设备：撤销当前用户已签发的所有 token（token_generation 加 1）"""
+    try:
+        current_username = get_jwt_identity()
+        if not current_username:
+            return error_response("Could not validate credentials", 401)
+        
+        with get_request_db() as db:
+            generation = revoke_all_user_tokens(db, current_username)
+            if not generation:
+                return error_response("Logout failed: could not revoke tokens", 500)
+            
+            return jsonify({
+                "message": "Successfully logged out from all devices",
+                "instruction": "All tokens have been revoked. Please log in again."
+            })
+            
+            
+    except Exception as e:
+        logger.error(f"Logout all error: {str(e)}")
+        return error_response(f"Logout failed: {str(e)}", 500)
+
 @user_bp.route("/me", methods=["PATCH"])
 @jwt_required()
 def patch_user_me():
@@ -770,17 +723,18 @@ def patch_user_me():
         if validation_error:
             return error_response(f"Validation error: {validation_error}")
         
-        db = SessionLocal()
+        db = get_request_db()
         try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
             # 更新数据
             update_dict = update_data.model_dump(exclude_unset=True)
             
+            # 修改密码会撤销所有 token，必须走 /change-password（校验当前密码并返回新 token）
             if "password" in update_dict:
-                update_dict["hashed_password"] = get_password_hash(update_dict.pop("password"))
+                return error_response("Use /change-password to change the password")
             
             # 检查邮箱是否已被其他用户使用
             if "email" in update_dict and update_dict["email"]:
@@ -807,8 +761,6 @@ def patch_user_me():
             db.rollback()
             logger.error(f"Database error: {str(e)}")
             return error_response("Database operation failed", 500)
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Patch user error: {str(e)}")
@@ -836,9 +788,9 @@ def change_password():
         if len(new_password) < 6:
             return error_response("New password must be at least 6 characters long")
         
-        db = SessionLocal()
+        db = get_request_db()
         try:
-            user = db.query(models.User).filter(models.User.username == current_username).first()
+            user = get_current_user_from_db(db)
             if not user:
                 return error_response("User not found", 404)
             
@@ -846,20 +798,31 @@ def change_password():
             if not verify_password(current_password, user.hashed_password):
                 return error_response("Current password is incorrect", 401)
             
-            # 更新密码
+            # 更新密码，并在同一事务中撤销该用户之前签发的所有 token（其他设备需要重新登录）
             user.hashed_password = get_password_hash(new_password)
+            bump_token_generation(user)
             db.commit()
+            generation = user.token_generation
+            revocation_cache.set_generation(user.username, generation)
+            
+            # 当前客户端换用新 token 继续使用
+            access_token = create_user_access_token(
+                username=user.username,
+                expires_delta=timedelta(minutes=30),
+                token_generation=generation,
+                user=user
+            )
             
             return jsonify({
-                "message": "Password changed successfully"
+                "message": "Password changed successfully",
+                "access_token": access_token,
+                "token_type": "bearer"
             })
             
         except SQLAlchemyError as e:
             db.rollback()
             logger.error(f"Database error in change_password: {str(e)}")
             return error_response("Password change failed", 500)
-        finally:
-            db.close()
             
     except Exception as e:
         logger.error(f"Change password error: {str(e)}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index, Text
 from datetime import datetime, timezone
 from ..common.database import Base
 
@@ -20,6 +20,16 @@ class User(Base):
     cas_password_encrypted = Column(String, nullable=True)  # 加密的 CAS 密码
     cas_bound_at = Column(DateTime, nullable=True)  # CAS 绑定时间
     cas_is_bound = Column(Boolean, default=False)  # 是否已绑定 CAS
+    # 可还原的 CAS 密码（secret_key 派生密钥加密），仅开启定时同步时保存
+    cas_password_secret = Column(Text, nullable=True)
+    
+    # 最近一次登录时间（定时同步优先同步最近活跃的用户）
+    last_login_at = Column(DateTime, nullable=True)
+    
+    # token 代数：写入 JWT 的 token_generation 声明，加 1 即撤销该用户之前签发的所有 token
+    token_generation = Column(Integer, default=0, server_default="0", nullable=False)
+    # token 代数最近一次变化的时间（撤销缓存按它增量加载代数变化）
+    token_generation_updated_at = Column(DateTime, nullable=True, index=True)
     
     def is_admin(self) -> bool:
         """检查用户是否为管理员"""
@@ -34,7 +44,7 @@ class TokenBlacklist(Base):
     jti = Column(String, unique=True, nullable=False, index=True)  # JWT ID (JTI)
     token_type = Column(String, nullable=False)  # token类型，如 "access" 或 "refresh"
     username = Column(String, nullable=False, index=True)  # 用户名
-    revoked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)  # 撤销时间
+    revoked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)  # 撤销时间
     expires_at = Column(DateTime, nullable=False, index=True)  # token过期时间
     
     # 创建复合索引以提高查询性能
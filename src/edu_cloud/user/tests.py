@@ -6,12 +6,14 @@ import pytest
 import json
 from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
+from sqlalchemy.exc import SQLAlchemyError
 
 from main import create_app
 from src.edu_cloud.user.models import User
 from src.edu_cloud.user.schemas import UserCreate, UserLogin, UserUpdate
 from src.edu_cloud.common.database import SessionLocal
 from src.edu_cloud.common.security import get_password_hash
+from src.edu_cloud.common.token_manager import revocation_cache
 
 
 class TestUserAPI:
@@ -43,6 +45,8 @@ class TestUserAPI:
         self.db_session.query(User).delete()
         self.db_session.commit()
         self.db_session.close()
+        # 下一个测试会重建同名用户，清除本进程缓存的 token 代数
+        revocation_cache.clear()
     
     def test_register_success(self):
         """Test successful user registration"""
@@ -242,6 +246,99 @@ class TestUserAPI:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert 'Password changed successfully' in data['message']
+        
+        # 旧 token 已失效，响应中的新 token 可继续使用
+        response = self.client.get('/api/user/me', headers=headers)
+        assert response.status_code == 401
+        response = self.client.get('/api/user/me',
+                                   headers={'Authorization': f"Bearer {data['access_token']}"})
+        assert response.status_code == 200
+    
+    def test_update_user_rejects_password(self):
+        """Test that PUT/PATCH /me refuse to change the password"""
+        login_data = {
+            'username': 'testuser',
+            'password': 'testpass123'
+        }
+        login_response = self.client.post('/api/user/login',
+                                     data=json.dumps(login_data),
+                                     content_type='application/json')
+        headers = {'Authorization': f"Bearer {json.loads(login_response.data)['access_token']}"}
+        
+        for method in (self.client.put, self.client.patch):
+            response = method('/api/user/me',
+                              data=json.dumps({'password': 'newpassword123'}),
+                              content_type='application/json',
+                              headers=headers)
+            assert response.status_code == 400
+            assert '/change-password' in json.loads(response.data)['error']
+        
+        # 密码没变，当前 token 仍然有效
+        assert self.client.get('/api/user/me', headers=headers).status_code == 200
+        response = self.client.post('/api/user/login',
+                                    data=json.dumps(login_data),
+                                    content_type='application/json')
+        assert response.status_code == 200
+    
+    def test_change_password_is_atomic(self):
+        """Test that a failed password change neither changes the password nor revokes tokens"""
+        login_data = {
+            'username': 'testuser',
+            'password': 'testpass123'
+        }
+        login_response = self.client.post('/api/user/login',
+                                     data=json.dumps(login_data),
+                                     content_type='application/json')
+        headers = {'Authorization': f"Bearer {json.loads(login_response.data)['access_token']}"}
+        password_data = {
+            'current_password': 'testpass123',
+            'new_password': 'newpassword123'
+        }
+        
+        with patch('src.edu_cloud.user.api.bump_token_generation', side_effect=SQLAlchemyError('db down')):
+            response = self.client.post('/api/user/change-password',
+                                        data=json.dumps(password_data),
+                                        content_type='application/json',
+                                        headers=headers)
+        assert response.status_code == 500
+        assert self.client.get('/api/user/me', headers=headers).status_code == 200
+        
+        response = self.client.post('/api/user/change-password',
+                                    data=json.dumps(password_data),
+                                    content_type='application/json',
+                                    headers=headers)
+        assert response.status_code == 200
+        self.db_session.expire_all()
+        user = self.db_session.query(User).filter(User.username == 'testuser').one()
+        assert user.token_generation == 1
+    
+    def test_logout_all_revokes_every_token(self):
+        """Test logging out from all devices"""
+        login_data = {
+            'username': 'testuser',
+            'password': 'testpass123'
+        }
+        tokens = [
+            json.loads(self.client.post('/api/user/login',
+                                        data=json.dumps(login_data),
+                                        content_type='application/json').data)['access_token']
+            for _ in range(2)
+        ]
+        
+        response = self.client.post('/api/user/logout-all',
+                                    headers={'Authorization': f'Bearer {tokens[0]}'})
+        assert response.status_code == 200
+        
+        for token in tokens:
+            response = self.client.get('/api/user/me', headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 401
+        
+        # 重新登录得到的新 token 有效
+        token = json.loads(self.client.post('/api/user/login',
+                                            data=json.dumps(login_data),
+                                            content_type='application/json').data)['access_token']
+        response = self.client.get('/api/user/me', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
     
     def test_change_password_wrong_current(self):
         """Test password change with wrong current password"""
@@ -331,6 +428,8 @@ class TestUserAPI:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert 'User account deleted successfully' in data['message']
+        # 删除后该用户已签发的 token 不再可用（墓碑撤销，或当秒签发的由身份查询拒绝）
+        assert self.client.get('/api/assignment/', headers=headers).status_code in (401, 404)
     
     def test_error_response_format(self):
         """Test that error responses have consistent format"""